@@ -0,0 +1,237 @@
+# scripts/artifact_store.py
+import os
+import sys
+import json
+import glob
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import urllib.request
+try:
+    import fcntl
+except ImportError:  # Windows 無 fcntl，僅單一行程寫入清單
+    fcntl = None
+from utils import load_config, ensure_directory, get_taiwan_time, log_message
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'artifacts')
+DEFAULT_MANIFEST = os.path.join('docs', 'podcast', 'artifacts.json')
+DEFAULT_MAX_MB = 2048
+DOWNLOAD_TIMEOUT = 60
+MANIFEST_VERSION = 1
+B2_BASE = "https://f005.backblazeb2.com/file/daily-light"
+
+def sha1_of_file(path, block_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def audio_duration(path):
+    """以音框數計算時長（不依賴 mutagen）；無法解析時回傳 None"""
+    from mp3_tools import MP3File
+    try:
+        return round(MP3File.load(path).duration, 3)
+    except (ValueError, OSError):
+        return None
+
+class ArtifactStore:
+    """產生的音檔以 SHA-1 存放於本機快取（.cache/artifacts）並上傳 B2，儲存庫只保留小型清單
+    （雜湊、大小、時長、URL）；docs/podcast 下的音檔改為指向快取物件的硬連結，不再提交"""
+
+    def __init__(self, config=None):
+        artifact_config = (config or load_config()).get('artifacts', {})
+        self.enabled = os.environ.get('ARTIFACT_STORE', '1' if artifact_config.get('enabled', False) else '0') == '1'
+        self.cache_dir = os.environ.get('ARTIFACT_CACHE_DIR', artifact_config.get('cache_dir', DEFAULT_CACHE_DIR))
+        self.manifest_path = artifact_config.get('manifest', DEFAULT_MANIFEST)
+        # 快取只是 B2 的本機副本（Actions cache 會一直累積），超過上限時依 LRU 淘汰，需要時再由 B2 下載
+        self.max_bytes = int(float(artifact_config.get('max_mb', DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.timeout = float(artifact_config.get('download_timeout', DOWNLOAD_TIMEOUT))
+        self._lock = threading.Lock()
+        # 本行程登錄過的項目；儲存時只合併這些，不覆寫其他行程（backfill 的並行 worker）寫入的項目
+        self._recorded = set()
+        self.entries = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('artifacts', {})
+        except (OSError, ValueError) as e:
+            log_message(f"讀取音檔清單失敗，將重新建立: {str(e)}", "WARNING")
+            return {}
+
+    @staticmethod
+    def key(date_str, name):
+        return f"{date_str}/{name}"
+
+    def get(self, date_str, name):
+        return self.entries.get(self.key(date_str, name))
+
+    def object_path(self, sha1):
+        return os.path.join(self.cache_dir, sha1[:2], f"{sha1}.mp3")
+
+    def ingest(self, path, sha1):
+        """將檔案放入內容定址快取，並把原路徑換成指向快取物件的硬連結"""
+        target = self.object_path(sha1)
+        if os.path.exists(target):
+            os.utime(target)
+        else:
+            ensure_directory(os.path.dirname(target))
+            shutil.copyfile(path, f"{target}.part")
+            os.replace(f"{target}.part", target)
+        try:
+            if not os.path.samefile(path, target):
+                os.link(target, f"{path}.link")
+                os.replace(f"{path}.link", path)
+        except OSError:
+            # 跨檔案系統或不支援硬連結時保留原檔
+            pass
+        self.evict()
+        return target
+
+    def record(self, date_str, name, path, url, sha1=None, size=None):
+        """登錄已上傳的音檔，回傳清單項目；內容未變時不更動清單"""
+        sha1 = sha1 or sha1_of_file(path)
+        size = size if size is not None else os.path.getsize(path)
+        self.ingest(path, sha1)
+        key = self.key(date_str, name)
+        with self._lock:
+            existing = self.entries.get(key)
+            if existing and existing['sha1'] == sha1 and existing['url'] == url:
+                return existing
+            entry = {
+                'sha1': sha1,
+                'size': size,
+                'duration': audio_duration(path),
+                'url': url,
+                'updated': get_taiwan_time().isoformat(timespec='seconds'),
+            }
+            self.entries[key] = entry
+            self._recorded.add(key)
+            self.save()
+        log_message(f"已登錄音檔 {key}（{size / 1024:.1f} KB，{entry['duration']}s）")
+        return entry
+
+    def save(self):
+        """在檔案鎖內重新讀取磁碟上的清單，併入本行程登錄的項目後以暫存檔原子替換"""
+        manifest_dir = os.path.dirname(self.manifest_path)
+        ensure_directory(manifest_dir)
+        with open(f"{self.manifest_path}.lock", 'w') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = self._load()
+            entries.update({key: self.entries[key] for key in self._recorded})
+            self.entries = entries
+            fd, tmp_path = tempfile.mkstemp(dir=manifest_dir or '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': MANIFEST_VERSION, 'artifacts': dict(sorted(entries.items()))},
+                              f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.manifest_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    def fetch(self, date_str, name, output_path=None):
+        """由快取（不存在時由清單中的 URL 下載並驗證 SHA-1）還原音檔，回傳路徑或 None"""
+        entry = self.get(date_str, name)
+        if not entry:
+            log_message(f"清單中沒有 {self.key(date_str, name)}", "WARNING")
+            return None
+        output_path = output_path or os.path.join('docs', 'podcast', date_str, name)
+        target = self.object_path(entry['sha1'])
+        if os.path.exists(target):
+            os.utime(target)  # 以 mtime 記錄最近使用時間
+        else:
+            self.download(entry['url'], entry['sha1'], target)
+            self.evict()
+        ensure_directory(os.path.dirname(output_path))
+        if not (os.path.exists(output_path) and os.path.samefile(target, output_path)):
+            # 先寫暫存檔再替換，避免覆寫到指向其他快取物件的硬連結
+            shutil.copyfile(target, f"{output_path}.part")
+            os.replace(f"{output_path}.part", output_path)
+        return output_path
+
+    def download(self, url, sha1, target):
+        """下載至暫存檔並驗證 SHA-1 後才放入快取；連線停滯超過 timeout 秒時拋出例外"""
+        ensure_directory(os.path.dirname(target))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f, urllib.request.urlopen(url, timeout=self.timeout) as response:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+            if sha1_of_file(tmp_path) != sha1:
+                raise ValueError(f"{url} 的內容與清單雜湊不符")
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        """快取超過 max_mb 時刪除最久未用的物件（docs/podcast 下的硬連結與 B2 上的檔案不受影響）"""
+        entries = []
+        total = 0
+        for path in glob.glob(os.path.join(self.cache_dir, '*', '*.mp3')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            log_message(f"音檔快取淘汰 {removed} 個物件，目前 {total / 1024 / 1024:.1f} MB")
+
+def import_existing(store, base_url, folder_prefix=''):
+    """將 docs/podcast 下既有的音檔登錄至清單（URL 依 B2 的路徑規則推算），回傳登錄數"""
+    imported = 0
+    for path in sorted(glob.glob(os.path.join('docs', 'podcast', '*', '*.mp3'))):
+        date_str = os.path.basename(os.path.dirname(path))
+        name = os.path.basename(path)
+        remote_path = '/'.join(p for p in (folder_prefix.strip('/'), date_str, name) if p)
+        store.record(date_str, name, path, f"{base_url.rstrip('/')}/{remote_path}")
+        imported += 1
+    return imported
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="儲存庫外的音檔存放區（內容定址快取 + B2，儲存庫只留清單）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help="登錄 docs/podcast 下既有的音檔")
+    import_parser.add_argument('--base-url', default=os.environ.get('B2_BUCKET_URL') or B2_BASE)
+    import_parser.add_argument('--prefix', default=os.environ.get('B2_FOLDER_PREFIX', ''))
+    fetch_parser = subparsers.add_parser('fetch', help="由快取或 B2 還原音檔")
+    fetch_parser.add_argument('date')
+    fetch_parser.add_argument('name', nargs='?', default='morning.mp3')
+    args = parser.parse_args()
+
+    try:
+        store = ArtifactStore()
+        if args.command == 'import':
+            count = import_existing(store, args.base_url, args.prefix)
+            log_message(f"已登錄 {count} 個音檔至 {store.manifest_path}")
+        else:
+            path = store.fetch(args.date, args.name)
+            if not path:
+                sys.exit(1)
+            log_message(f"已還原 {path}")
+        sys.exit(0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# scripts/audio_postprocess.py
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from utils import load_config, parse_date_args, ensure_directory, log_message
+from mp3_tools import MP3File, GAIN_STEP_DB, splice, write_atomic
+from instrumentation import span
+from variants import load_variants
+from speech_marks import rerender
+
+DEFAULT_TARGET_LUFS = -16.0
+DEFAULT_MAX_GAIN_STEPS = 8
+ASSET_CACHE_DIR = os.path.join('.cache', 'audio')
+LOUDNESS_PATTERN = re.compile(r'I:\s+(-?\d+(?:\.\d+)?) LUFS')
+SESSIONS = ('morning', 'evening')
+
+def sha1_of_file(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+class AudioPostProcessor:
+    """TTS 之後的音訊後製：以 global_gain 調整響度、以音框拼接片頭片尾並重寫 Xing/Info 標頭，全程不重新編碼"""
+
+    def __init__(self, config=None):
+        self.config = config or load_config()
+        audio_config = self.config.get('audio', {})
+        self.variants = load_variants(self.config)
+        self.enabled = os.environ.get('AUDIO_POSTPROCESS', '1' if audio_config.get('enabled', True) else '0') == '1'
+        self.intro = audio_config.get('intro') or None
+        self.outro = audio_config.get('outro') or None
+        self.target_lufs = float(audio_config.get('target_lufs', DEFAULT_TARGET_LUFS))
+        self.max_gain_steps = int(audio_config.get('max_gain_steps', DEFAULT_MAX_GAIN_STEPS))
+        self.workers = int(audio_config.get('workers', os.cpu_count() or 1))
+        self.ffmpeg = shutil.which('ffmpeg')
+        self._assets = {}
+
+    def measure_loudness(self, path):
+        """以 ffmpeg ebur128 量測整體響度（LUFS），只解碼不重新編碼；無 ffmpeg 時回傳 None"""
+        if not self.ffmpeg:
+            return None
+        result = subprocess.run([self.ffmpeg, '-nostats', '-hide_banner', '-i', path,
+                                 '-filter_complex', 'ebur128', '-f', 'null', '-'],
+                                capture_output=True, text=True, errors='replace')
+        matches = LOUDNESS_PATTERN.findall(result.stderr)
+        return float(matches[-1]) if matches else None
+
+    def load_asset(self, path, like):
+        """讀取片頭片尾；格式與節目不同時以 ffmpeg 轉成相同取樣率／聲道（每個素材只轉一次並快取）"""
+        if not path:
+            return None
+        if not os.path.exists(path):
+            log_message(f"找不到音訊素材 {path}，略過", "WARNING")
+            return None
+        key = (path, like.version, like.sample_rate, like.channels)
+        if key not in self._assets:
+            asset = MP3File.load(path)
+            if not asset.header.compatible(like):
+                asset = self.conform(path, like)
+            self._assets[key] = asset
+        # 拼接時可能修改第一個音框，每次使用獨立副本
+        asset = self._assets[key]
+        return MP3File(bytes(asset.data)) if asset else None
+
+    def conform(self, path, like):
+        if not self.ffmpeg:
+            log_message(f"{path} 格式與節目不同且未安裝 ffmpeg，略過", "WARNING")
+            return None
+        digest = hashlib.sha1(f"{sha1_of_file(path)}-{like.sample_rate}-{like.channels}-{like.bitrate}".encode()).hexdigest()
+        cached = os.path.join(ASSET_CACHE_DIR, f"{digest}.mp3")
+        if not os.path.exists(cached):
+            ensure_directory(ASSET_CACHE_DIR)
+            subprocess.run([self.ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-i', path,
+                            '-ar', str(like.sample_rate), '-ac', str(like.channels), '-b:a', f"{like.bitrate}k",
+                            '-write_xing', '0', '-id3v2_version', '0', f"{cached}.part.mp3"], check=True)
+            os.replace(f"{cached}.part.mp3", cached)
+            log_message(f"已轉換音訊素材 {path} → {like.sample_rate} Hz／{like.channels} 聲道")
+        return MP3File.load(cached)
+
+    def process(self, date_str, session, variant=None):
+        """處理單一集（variant 為語音變體，音檔位於其目錄）；已處理過（檔案雜湊與紀錄相同）時跳過，回傳處理紀錄或 None"""
+        podcast_dir = variant.audio_dir(date_str) if variant else os.path.join('docs', 'podcast', date_str)
+        audio_path = os.path.join(podcast_dir, f'{session}.mp3')
+        record_path = os.path.join(podcast_dir, f'audio_{session}.json')
+        if not os.path.exists(audio_path):
+            return None
+        source_sha1 = sha1_of_file(audio_path)
+        if os.path.exists(record_path):
+            with open(record_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if record.get('output_sha1') == source_sha1:
+                return record
+
+        started = time.perf_counter()
+        episode = MP3File.load(audio_path)
+        loudness = self.measure_loudness(audio_path)
+        steps = 0
+        if loudness is not None:
+            steps = round((self.target_lufs - loudness) / GAIN_STEP_DB)
+            steps = max(-self.max_gain_steps, min(self.max_gain_steps, steps))
+        clipped = episode.apply_gain(steps)
+
+        intro = self.load_asset(self.intro, episode.header)
+        outro = self.load_asset(self.outro, episode.header)
+        parts = [p for p in (intro, episode, outro) if p is not None]
+        write_atomic(audio_path, splice(parts))
+
+        record = {
+            'source_sha1': source_sha1,
+            'output_sha1': sha1_of_file(audio_path),
+            'loudness': loudness,
+            'gain_steps': steps,
+            'clipped_granules': clipped,
+            'intro': self.intro if intro else None,
+            'outro': self.outro if outro else None,
+            'duration': round(sum(p.duration for p in parts), 3),
+        }
+        with open(record_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=1)
+        # 片頭使節目內容往後移，字幕與章節依片頭長度平移
+        rerender(audio_path, intro.duration if intro else 0.0, self.config)
+        loudness_text = f"{loudness:.1f} LUFS" if loudness is not None else "未量測"
+        log_message(f"{date_str} {session} 後製完成: 響度 {loudness_text}，增益 {steps * GAIN_STEP_DB:+.1f} dB，"
+                    f"長度 {record['duration']:.1f}s（{(time.perf_counter() - started) * 1000:.0f} ms）")
+        return record
+
+    def process_date(self, date_str, sessions=SESSIONS):
+        """處理單日晨、晚兩集（所有語音變體）；停用時直接回傳 True"""
+        if not self.enabled:
+            return True
+        ok = True
+        for variant in self.variants:
+            for session in sessions:
+                try:
+                    with span('audio.process', session=session):
+                        self.process(date_str, session, variant)
+                except Exception as e:
+                    log_message(f"{date_str} {variant.name} {session} 音訊後製失敗: {str(e)}", "ERROR")
+                    ok = False
+        return ok
+
+def _process_date(date_str):
+    return date_str, AudioPostProcessor().process_date(date_str)
+
+def process_dates(dates, workers=None):
+    """以行程池跨集數並行後製，回傳失敗的日期"""
+    processor = AudioPostProcessor()
+    if not processor.enabled:
+        log_message("音訊後製已停用")
+        return []
+    if not processor.ffmpeg:
+        log_message("未安裝 ffmpeg，僅拼接與重寫標頭，不調整響度", "WARNING")
+    workers = workers or processor.workers
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for date_str, ok in executor.map(_process_date, dates):
+            if not ok:
+                failed.append(date_str)
+    return failed
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="MP3 音訊後製（響度、片頭片尾、Xing 標頭）")
+    parser.add_argument('--from', dest='date_from', help="起始日期 MMDD")
+    parser.add_argument('--to', dest='date_to', help="結束日期 MMDD（含）")
+    parser.add_argument('--dates', help="以逗號分隔的 MMDD 清單")
+    parser.add_argument('--workers', type=int, default=None, help="工作行程數")
+    args = parser.parse_args()
+
+    try:
+        dates = parse_date_args(args.date_from, args.date_to, args.dates)
+        started = time.perf_counter()
+        failed = process_dates(dates, args.workers)
+        log_message(f"後製 {len(dates)} 天完成，失敗 {len(failed)} 天，耗時 {time.perf_counter() - started:.2f}s")
+        sys.exit(1 if failed else 0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# scripts/backfill.py
+import os
+import sys
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils import load_config, parse_date_args, log_message
+from instrumentation import span
+
+STAGES = ('ocr', 'tts', 'audio', 'upload')
+
+def run_ocr(date_str):
+    from ocr_image_to_text import OCRImageToText
+    return OCRImageToText(date_str).run()
+
+def run_tts(date_str):
+    from text_to_speech_edge import VariantSynthesizer
+    return asyncio.run(VariantSynthesizer(date_str).run())
+
+def run_audio(date_str):
+    from audio_postprocess import AudioPostProcessor
+    return AudioPostProcessor().process_date(date_str)
+
+# 每個工作行程只認證一次 B2，之後的日期共用同一連線
+_uploader = None
+
+def run_upload(date_str):
+    global _uploader
+    if _uploader is None:
+        from upload_to_b2 import B2Uploader
+        _uploader = B2Uploader(date_str)
+    # 目錄不存在時 run 回傳 None，視為跳過
+    return _uploader.run(date_str) is not False
+
+STAGE_RUNNERS = {'ocr': run_ocr, 'tts': run_tts, 'audio': run_audio, 'upload': run_upload}
+
+def process_date(date_str, stages):
+    """在工作行程中依序執行單日各階段，回傳該日結果；任一階段失敗即停止該日後續階段"""
+    result = {'date': date_str, 'ok': True, 'stages': {}, 'error': None}
+    started = time.perf_counter()
+    for stage in stages:
+        stage_started = time.perf_counter()
+        with span('stage', stage=stage) as stage_span:
+            stage_span.set(date=date_str)
+            try:
+                ok = bool(STAGE_RUNNERS[stage](date_str))
+            except SystemExit as e:
+                # B2Uploader 缺少認證信息時以 exit(1) 結束
+                ok = not e.code
+                result['error'] = f"{stage}: exit {e.code}"
+            except Exception as e:
+                ok = False
+                result['error'] = f"{stage}: {str(e)}"
+            if not ok:
+                stage_span.fail(result['error'])
+        result['stages'][stage] = {'ok': ok, 'seconds': round(time.perf_counter() - stage_started, 2)}
+        if not ok:
+            result['ok'] = False
+            result['error'] = result['error'] or f"{stage} 失敗"
+            break
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    return result
+
+def run_backfill(dates, stages=STAGES, workers=None, rss=True):
+    """將多個日期分散到行程池處理，單日失敗不影響其他日期"""
+    workers = workers or min(len(dates), os.cpu_count() or 1)
+    log_message(f"開始回補 {len(dates)} 天（{dates[0]} ~ {dates[-1]}），階段: {', '.join(stages)}，工作行程: {workers}")
+    started = time.perf_counter()
+    results = []
+    # 先於父行程建立 span，工作行程沿用同一個 run_id，結束時彙整為同一份指標
+    with span('backfill'), ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_date, d, stages): d for d in dates}
+        for future in as_completed(futures):
+            date_str = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'date': date_str, 'ok': False, 'stages': {}, 'error': str(e), 'seconds': 0}
+            level = "INFO" if result['ok'] else "ERROR"
+            log_message(f"{date_str}: {'成功' if result['ok'] else '失敗'} ({result['seconds']}s) {result['error'] or ''}", level)
+            results.append(result)
+
+    results.sort(key=lambda r: dates.index(r['date']))
+    succeeded = [r['date'] for r in results if r['ok']]
+    if rss and succeeded:
+        from generate_rss import generate_feeds
+        generate_feeds(succeeded)
+
+    log_message("===== 回補摘要 =====")
+    for r in results:
+        stage_info = ', '.join(f"{k}:{'✓' if v['ok'] else '✗'} {v['seconds']}s" for k, v in r['stages'].items())
+        log_message(f"{r['date']}  {'成功' if r['ok'] else '失敗'}  {stage_info}  {r['error'] or ''}")
+    log_message(f"共 {len(results)} 天，成功 {len(succeeded)}，失敗 {len(results) - len(succeeded)}，耗時 {time.perf_counter() - started:.1f}s")
+    return results
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="依日期範圍回補整條 podcast 流程")
+    parser.add_argument('--from', dest='date_from', help="起始日期 MMDD")
+    parser.add_argument('--to', dest='date_to', help="結束日期 MMDD（含）")
+    parser.add_argument('--dates', help="以逗號分隔的 MMDD 清單")
+    parser.add_argument('--stages', default=','.join(STAGES), help="要執行的階段，預設 ocr,tts,upload")
+    parser.add_argument('--workers', type=int, default=None, help="工作行程數")
+    parser.add_argument('--no-rss', action='store_true', help="完成後不重新產生 RSS")
+    args = parser.parse_args()
+
+    try:
+        dates = parse_date_args(args.date_from, args.date_to, args.dates)
+        stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+        unknown = [s for s in stages if s not in STAGE_RUNNERS]
+        if unknown:
+            raise ValueError(f"未知階段: {', '.join(unknown)}")
+        workers = args.workers or load_config().get('backfill', {}).get('workers')
+        results = run_backfill(dates, stages, workers, rss=not args.no_rss)
+        sys.exit(0 if all(r['ok'] for r in results) else 1)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# scripts/benchmark.py
+import io
+import os
+import sys
+import json
+import copy
+import glob
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+from utils import load_config, ensure_directory, log_message
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+STAGES = ('split', 'normalize', 'tts', 'audio', 'upload', 'rss')
+DEFAULT_SCALES = (1, 10, 100)
+SESSIONS = ('morning', 'evening')
+# 與前次結果相比慢於此倍數即視為退步
+REGRESSION_THRESHOLD = 1.2
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+def replicate_corpus(workspace, scale):
+    """將 docs/img 的校正稿複製 scale 份，以不同年份的 YYYYMMDD 命名，回傳日期清單"""
+    drafts = sorted(glob.glob(os.path.join(REPO_ROOT, 'docs', 'img', '[0-9][0-9][0-9][0-9].txt')))
+    img_dir = os.path.join(workspace, 'docs', 'img')
+    ensure_directory(img_dir)
+    dates = []
+    for copy_index in range(scale):
+        for draft in drafts:
+            mmdd = os.path.basename(draft)[:4]
+            date_str = f"{2000 + copy_index}{mmdd}"
+            try:
+                datetime.strptime(date_str, '%Y%m%d')
+            except ValueError:
+                continue  # 非閏年的 0229
+            shutil.copyfile(draft, os.path.join(img_dir, f"{date_str}.txt"))
+            dates.append(date_str)
+    return dates
+
+def benchmark_config(args):
+    config = copy.deepcopy(load_config())
+    tts = config.setdefault('tts', {})
+    tts['mode'] = args.tts_mode
+    tts['concurrency'] = args.concurrency
+    tts['stream_upload'] = False
+    tts['cache'] = dict(tts.get('cache', {}), enabled=False)
+    config.setdefault('ocr', {})['enabled'] = False
+    config.setdefault('audio', {}).update(intro='', outro='')
+    config['b2'] = dict(config.get('b2', {}), bucket_name='daily-light-bench', folder_prefix='')
+    return config
+
+# ===== 各階段 =====
+def stage_split(dates, config, context):
+    from ocr_image_to_text import OCRImageToText
+    for date_str in dates:
+        OCRImageToText(date_str, config=config).process_text()
+    return len(dates) * len(SESSIONS), None
+
+def stage_normalize(dates, config, context):
+    from text_normalizer import TextNormalizer
+    normalizer = TextNormalizer.from_config(config)
+    total = 0
+    for date_str in dates:
+        for session in SESSIONS:
+            with open(os.path.join('docs', 'podcast', date_str, f'{session}.txt'), 'r', encoding='utf-8') as f:
+                text = f.read()
+            total += len(text.encode('utf-8'))
+            normalizer.normalize(text)
+    return len(dates) * len(SESSIONS), total
+
+def stage_tts(dates, config, context):
+    from text_to_speech_edge import VariantSynthesizer
+
+    async def synthesize_all():
+        for date_str in dates:
+            await VariantSynthesizer(date_str, config=config).run()
+
+    asyncio.run(synthesize_all())
+    sizes = [os.path.getsize(p) for d in dates
+             for p in glob.glob(os.path.join('docs', 'podcast', d, '**', '*.mp3'), recursive=True)]
+    return len(sizes), sum(sizes)
+
+def stage_audio(dates, config, context):
+    from audio_postprocess import AudioPostProcessor
+    processor = AudioPostProcessor(config)
+    for date_str in dates:
+        processor.process_date(date_str)
+    return len(dates) * len(SESSIONS), None
+
+def stage_upload(dates, config, context):
+    from upload_to_b2 import B2Uploader
+    uploader = B2Uploader(dates[0], bucket=context['bucket'], config=config)
+    for date_str in dates:
+        uploader.run(date_str)
+        # 模擬上傳後的公開網址，供 RSS 階段使用
+        for variant in uploader.variants:
+            for session, label in (('morning', '晨間'), ('evening', '晚間')):
+                remote_path = f"{uploader.remote_prefix(date_str, variant)}/{session}.mp3"
+                with open(os.path.join(variant.audio_dir(date_str), f'{label}_url.txt'), 'w', encoding='utf-8') as f:
+                    f.write(uploader.public_url(remote_path))
+    return len(dates) * len(SESSIONS) * len(uploader.variants), uploader.bytes_uploaded
+
+def stage_rss(dates, config, context):
+    from generate_rss import generate_feeds
+    from variants import load_variants
+    generate_feeds(dates, config=config)
+    feeds = [v.feed for v in load_variants(config) if os.path.exists(v.feed)]
+    return len(dates) * len(SESSIONS), sum(os.path.getsize(f) for f in feeds) if feeds else None
+
+STAGE_RUNNERS = {
+    'split': stage_split,
+    'normalize': stage_normalize,
+    'tts': stage_tts,
+    'audio': stage_audio,
+    'upload': stage_upload,
+    'rss': stage_rss,
+}
+
+def run_scale(scale, stages, config, context, verbose=False):
+    """在暫存工作區以 scale 倍語料依序執行各階段，回傳各階段耗時與吞吐量"""
+    workspace = tempfile.mkdtemp(prefix=f'daily-light-bench-{scale}x-')
+    original_cwd = os.getcwd()
+    try:
+        dates = replicate_corpus(workspace, scale)
+        os.chdir(workspace)
+        results = {}
+        for stage in stages:
+            output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+            started = time.perf_counter()
+            with output:
+                items, size = STAGE_RUNNERS[stage](dates, config, context)
+            seconds = time.perf_counter() - started
+            results[stage] = {
+                'seconds': round(seconds, 4),
+                'items': items,
+                'items_per_second': round(items / seconds, 2) if seconds else None,
+            }
+            if size is not None:
+                results[stage]['bytes'] = size
+                results[stage]['mb_per_second'] = round(size / seconds / 1e6, 3) if seconds else None
+            log_message(f"{scale}x {stage}: {seconds:.3f}s，{items} 項")
+        return {'dates': len(dates), 'stages': results,
+                'total_seconds': round(sum(r['seconds'] for r in results.values()), 4)}
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def save_results(report):
+    ensure_directory(RESULTS_DIR)
+    path = os.path.join(RESULTS_DIR, f"{report['timestamp'].replace(':', '')}-{report['commit']}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    return path
+
+def previous_results(exclude):
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, '*.json')) if p != exclude)
+    return paths[-1] if paths else None
+
+def compare(report, baseline_path, threshold=REGRESSION_THRESHOLD):
+    """逐一比較相同倍數、相同階段的耗時，回傳退步項目清單"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    log_message(f"對照基準: {os.path.basename(baseline_path)}（{baseline.get('commit')}）")
+    if baseline.get('settings') != report['settings']:
+        log_message("基準的設定不同，比較結果僅供參考", "WARNING")
+    regressions = []
+    for scale, result in report['scales'].items():
+        old_stages = baseline.get('scales', {}).get(scale, {}).get('stages', {})
+        for stage, current in result['stages'].items():
+            old = old_stages.get(stage)
+            if not old or not old['seconds']:
+                continue
+            ratio = current['seconds'] / old['seconds']
+            mark = '退步' if ratio > threshold else ''
+            log_message(f"{scale}x {stage:<9} {old['seconds']:>9.3f}s → {current['seconds']:>9.3f}s  ×{ratio:.2f} {mark}")
+            if ratio > threshold:
+                regressions.append((scale, stage, ratio))
+    return regressions
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="離線效能基準：以本機 Edge TTS／B2 替身重播 docs 語料")
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)), help="語料倍數，以逗號分隔")
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"要量測的階段（{','.join(STAGES)}）")
+    parser.add_argument('--latency-ms', type=float, default=50, help="TTS 替身首位元組延遲（毫秒）")
+    parser.add_argument('--realtime', type=float, default=0, help="TTS 替身產生速度為即時的幾倍（0 為不節流）")
+    parser.add_argument('--stall-rate', type=float, default=0, help="TTS 替身請求停滯的機率（模擬長尾延遲）")
+    parser.add_argument('--stall-ms', type=float, default=5000, help="停滯請求額外的延遲（毫秒）")
+    parser.add_argument('--tts-mode', choices=('single', 'chunked'), default='chunked')
+    parser.add_argument('--concurrency', type=int, default=4, help="chunked 模式的並行請求數")
+    parser.add_argument('--compare', nargs='?', const='latest', help="與指定結果檔（預設為前一次）比較")
+    parser.add_argument('--no-save', action='store_true', help="不寫入 benchmarks/results")
+    parser.add_argument('--verbose', action='store_true', help="顯示各階段的原始日誌")
+    args = parser.parse_args()
+
+    try:
+        scales = [int(s) for s in args.scales.split(',') if s.strip()]
+        stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            log_message(f"未知的階段: {', '.join(sorted(unknown))}", "ERROR")
+            sys.exit(1)
+        # 依管線順序執行，後段依賴前段的輸出
+        stages = [s for s in STAGES if s in stages]
+
+        from fake_services import FakeEdgeTTSServer
+        from upload_to_b2 import create_simulator_bucket
+        config = benchmark_config(args)
+        settings = {'latency_ms': args.latency_ms, 'realtime': args.realtime,
+                    'stall_rate': args.stall_rate, 'stall_ms': args.stall_ms,
+                    'tts_mode': args.tts_mode, 'concurrency': args.concurrency}
+        report = {
+            'commit': git_revision(),
+            'timestamp': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'settings': settings,
+            'scales': {},
+        }
+        sample_mp3 = os.path.join(REPO_ROOT, 'docs', 'podcast', '0808', 'morning.mp3')
+        # 指標照常記錄（與排程執行相同的負擔），但寫在暫存目錄，不受各倍數工作區切換影響
+        metrics_dir = tempfile.mkdtemp(prefix='daily-light-bench-metrics-')
+        os.environ.setdefault('METRICS_DIR', metrics_dir)
+        with FakeEdgeTTSServer(latency_ms=args.latency_ms, realtime=args.realtime, sample_mp3=sample_mp3,
+                               stall_rate=args.stall_rate, stall_ms=args.stall_ms, seed=0):
+            for scale in scales:
+                context = {'bucket': create_simulator_bucket(config['b2']['bucket_name'])}
+                report['scales'][str(scale)] = run_scale(scale, stages, config, context, args.verbose)
+
+        path = None if args.no_save else save_results(report)
+        if path:
+            log_message(f"結果已寫入 {os.path.relpath(path, REPO_ROOT)}")
+        if args.compare:
+            baseline = previous_results(path) if args.compare == 'latest' else args.compare
+            if not baseline:
+                log_message("沒有可比較的先前結果", "WARNING")
+            elif compare(report, baseline):
+                sys.exit(1)
+        sys.exit(0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
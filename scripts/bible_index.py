@@ -0,0 +1,322 @@
+# scripts/bible_index.py
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import struct
+from collections import namedtuple
+from utils import log_message
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config')
+HB5_FILE = os.path.join(CONFIG_DIR, 'hb5.txt')
+MAPPING_FILE = os.path.join(CONFIG_DIR, 'mapping.txt')
+INDEX_FILE = os.path.join(CONFIG_DIR, 'hb5.idx')
+
+# hb5.txt 含 Big5 擴充字，需以 big5hkscs 解碼
+HB5_ENCODING = 'big5hkscs'
+MAGIC = b'HB5I'
+VERSION = 1
+# magic, version, book_count, chapter_count, verse_slots, meta_length
+HEADER = struct.Struct('<4sHHIII')
+# 書卷：首章序號、章數
+BOOK_ENTRY = struct.Struct('<IHxx')
+# 章：首節槽位、節數
+CHAPTER_ENTRY = struct.Struct('<IHxx')
+OFFSET = struct.Struct('<I')
+
+VERSE_LINE = re.compile(r'^(\w{3}) (\d+):(\d+) ?(.*)$')
+
+Reference = namedtuple('Reference', ['book', 'chapter', 'verse', 'end_verse', 'text'])
+
+# ===== 中文數字 =====
+DIGITS = {'〇': 0, '零': 0, '○': 0, '一': 1, '二': 2, '兩': 2, '三': 3, '四': 4, '五': 5,
+          '六': 6, '七': 7, '八': 8, '九': 9}
+TENS = {'十': 10, '廿': 20, '卅': 30, '卌': 40}
+NUMERAL_CHARS = ''.join(DIGITS) + ''.join(TENS) + '百'
+
+# 書名之後的章節；阿拉伯數字的章後必須有「:」或「章」，否則「約三16」會被讀成約參一章6節
+REFERENCE_TAIL = (rf'\s*(?:(?P<chapter>[{NUMERAL_CHARS}]+)\s*[:：章]?|(?P<arabic_chapter>\d+)\s*[:：章])'
+                  rf'\s*(?P<verse>\d+)(?:\s*[-–—~～]\s*(?P<end>\d+))?')
+
+# 容易誤判的出處（書名以較短書名開頭者），build 後逐一檢查
+KNOWN_REFERENCES = [
+    ('約三16', ('Jhn', 3, 16, None)),
+    ('約一五11', ('1Jn', 5, 11, None)),
+    ('約十八3-11', ('Jhn', 18, 3, 11)),
+    ('箴四18', ('Pro', 4, 18, None)),
+    ('賽五七15- 16', ('Isa', 57, 15, 16)),
+]
+
+def parse_chinese_numeral(text):
+    """解析經文章節常見的中文數字：十八→18、廿九→29、一百零五→105，以及逐位寫法 一四七→147、五七→57"""
+    text = text.strip()
+    if not text:
+        raise ValueError("空白數字")
+    if text.isdigit():
+        return int(text)
+    if any(ch not in DIGITS and ch not in TENS and ch != '百' for ch in text):
+        raise ValueError(f"無法解析的數字: {text}")
+
+    # 無位值字時為逐位寫法
+    if not any(ch in TENS or ch == '百' for ch in text):
+        return int(''.join(str(DIGITS[ch]) for ch in text))
+
+    value = 0
+    pending = None
+    for ch in text:
+        if ch in DIGITS:
+            pending = DIGITS[ch]
+        elif ch == '百':
+            value += (1 if pending is None else pending) * 100
+            pending = None
+        elif ch == '十':
+            value += (1 if pending is None else pending) * 10
+            pending = None
+        else:
+            value += TENS[ch]
+            pending = None
+    if pending:
+        value += pending
+    return value
+
+# ===== 編譯 =====
+def load_book_mapping(mapping_path=MAPPING_FILE):
+    """讀取 中文縮寫 → 英文縮寫 對照表"""
+    mapping = []
+    with open(mapping_path, 'r', encoding='utf-8-sig') as f:
+        for line in f.read().splitlines()[1:]:
+            parts = line.strip().split('\t')
+            if len(parts) == 2 and parts[0] and parts[1]:
+                mapping.append((parts[0].strip(), parts[1].strip()))
+    return mapping
+
+def compile_index(source_path=HB5_FILE, mapping_path=MAPPING_FILE, output_path=INDEX_FILE):
+    """將 hb5.txt 編譯為 UTF-8 經文區塊加 (書卷, 章, 節) → 位移 的直接定址表"""
+    started = time.perf_counter()
+    with open(source_path, 'rb') as f:
+        text = f.read().decode(HB5_ENCODING)
+
+    books = []        # [(code, {chapter: {verse: text}})]
+    book_lookup = {}
+    for line in text.splitlines():
+        match = VERSE_LINE.match(line)
+        if not match:
+            continue
+        code, chapter, verse, content = match.group(1), int(match.group(2)), int(match.group(3)), match.group(4)
+        if code not in book_lookup:
+            book_lookup[code] = len(books)
+            books.append((code, {}))
+        books[book_lookup[code]][1].setdefault(chapter, {})[verse] = content.strip('　 ')
+
+    names = {}
+    for zh, code in load_book_mapping(mapping_path):
+        names.setdefault(code, []).append(zh)
+    missing = [code for code, _ in books if code not in names]
+    if missing:
+        log_message(f"對照表缺少書卷: {', '.join(missing)}", "WARNING")
+
+    book_table = []
+    chapter_table = []
+    offsets = []
+    blob = bytearray()
+    for _, chapters in books:
+        book_table.append(BOOK_ENTRY.pack(len(chapter_table), max(chapters)))
+        for chapter in range(1, max(chapters) + 1):
+            verses = chapters.get(chapter, {})
+            verse_count = max(verses) if verses else 0
+            chapter_table.append(CHAPTER_ENTRY.pack(len(offsets), verse_count))
+            for verse in range(1, verse_count + 1):
+                # 缺漏的節以零長度表示
+                offsets.append(len(blob))
+                blob += verses.get(verse, '').encode('utf-8')
+    offsets.append(len(blob))
+
+    meta = json.dumps({'books': [[code, names.get(code, [])] for code, _ in books]},
+                      ensure_ascii=False).encode('utf-8')
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(books), len(chapter_table), len(offsets) - 1, len(meta)))
+        f.write(meta)
+        f.write(b''.join(book_table))
+        f.write(b''.join(chapter_table))
+        f.write(b''.join(OFFSET.pack(o) for o in offsets))
+        f.write(blob)
+    os.replace(tmp_path, output_path)
+    log_message(f"經文索引已編譯: {output_path}（{len(books)} 卷、{len(offsets) - 1} 節、"
+                f"{os.path.getsize(output_path) / 1024 / 1024:.1f} MB，{time.perf_counter() - started:.2f}s）")
+    return output_path
+
+# ===== 查詢 =====
+class BibleIndex:
+    """以 mmap 開啟編譯後的索引，查詢經文為 O(1) 且不需在啟動時解碼整份經文"""
+
+    def __init__(self, index_path=INDEX_FILE):
+        if not os.path.exists(index_path):
+            compile_index(output_path=index_path)
+        self._file = open(index_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.book_count, chapter_count, verse_slots, meta_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不支援的經文索引格式: {index_path}")
+
+        meta = json.loads(self._mm[HEADER.size:HEADER.size + meta_length].decode('utf-8'))
+        self.books = [code for code, _ in meta['books']]
+        self.book_ids = {code: i for i, code in enumerate(self.books)}
+        for i, (_, zh_names) in enumerate(meta['books']):
+            for zh in zh_names:
+                self.book_ids[zh] = i
+
+        self._book_base = HEADER.size + meta_length
+        self._chapter_base = self._book_base + self.book_count * BOOK_ENTRY.size
+        self._offset_base = self._chapter_base + chapter_count * CHAPTER_ENTRY.size
+        self._blob_base = self._offset_base + (verse_slots + 1) * OFFSET.size
+
+        # 依名稱長度由長到短比對，避免「約」搶先匹配「約一」
+        zh_names = sorted((n for _, names in meta['books'] for n in names), key=len, reverse=True)
+        self._reference_pattern = re.compile(rf'(?P<book>{"|".join(map(re.escape, zh_names))}){REFERENCE_TAIL}')
+        self._tail_pattern = re.compile(REFERENCE_TAIL)
+        # 以較短書名開頭的書名（約三 → 約）：解析出的章節不存在時改以較短書名重新解析
+        self._shorter_names = {}
+        for name in zh_names:
+            prefixes = [n for n in zh_names if n != name and name.startswith(n)]
+            if prefixes:
+                self._shorter_names[name] = max(prefixes, key=len)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _book_id(self, book):
+        if isinstance(book, int):
+            return book if 0 <= book < self.book_count else None
+        return self.book_ids.get(book)
+
+    def verse(self, book, chapter, verse):
+        """回傳單節經文，不存在時回傳 None"""
+        book_id = self._book_id(book)
+        if book_id is None:
+            return None
+        first_chapter, chapter_count = BOOK_ENTRY.unpack_from(self._mm, self._book_base + book_id * BOOK_ENTRY.size)
+        if not 1 <= chapter <= chapter_count:
+            return None
+        first_slot, verse_count = CHAPTER_ENTRY.unpack_from(
+            self._mm, self._chapter_base + (first_chapter + chapter - 1) * CHAPTER_ENTRY.size)
+        if not 1 <= verse <= verse_count:
+            return None
+        start, end = struct.unpack_from('<II', self._mm, self._offset_base + (first_slot + verse - 1) * OFFSET.size)
+        if start == end:
+            return None
+        return self._mm[self._blob_base + start:self._blob_base + end].decode('utf-8')
+
+    def passage(self, book, chapter, verse, end_verse=None):
+        """回傳一段經文（含起訖節），任何一節不存在時回傳 None"""
+        verses = []
+        for v in range(verse, (end_verse or verse) + 1):
+            content = self.verse(book, chapter, v)
+            if content is None:
+                return None
+            verses.append(content)
+        return ''.join(verses)
+
+    def parse_reference(self, text):
+        """解析單一經文出處，如 箴四18、賽五七15- 16、約十八3-11"""
+        match = self._reference_pattern.search(text)
+        if not match:
+            return None
+        return self._to_reference(match)
+
+    def _to_reference(self, match):
+        book = match.group('book')
+        reference = self._build_reference(book, match, match.group(0))
+        shorter = self._shorter_names.get(book)
+        if shorter and (reference is None or self.resolve(reference) is None):
+            tail = self._tail_pattern.match(match.string, match.start('book') + len(shorter))
+            retry = tail and self._build_reference(shorter, tail, shorter + tail.group(0))
+            if retry and self.resolve(retry) is not None:
+                return retry
+        return reference
+
+    def _build_reference(self, book, match, text):
+        try:
+            chapter = parse_chinese_numeral(match.group('chapter') or match.group('arabic_chapter'))
+        except ValueError:
+            return None
+        verse = int(match.group('verse'))
+        end_verse = int(match.group('end')) if match.group('end') else None
+        if end_verse is not None and end_verse < verse:
+            end_verse = None
+        return Reference(self.books[self.book_ids[book]], chapter, verse, end_verse, text)
+
+    def find_references(self, text):
+        """找出全形或半形括號內的所有經文出處"""
+        references = []
+        for bracket in re.finditer(r'[（(]([^（）()]*)[）)]', text):
+            for match in self._reference_pattern.finditer(bracket.group(1)):
+                reference = self._to_reference(match)
+                if reference:
+                    references.append(reference)
+        return references
+
+    def resolve(self, reference):
+        return self.passage(reference.book, reference.chapter, reference.verse, reference.end_verse)
+
+    def check_known(self):
+        """檢查 KNOWN_REFERENCES 的解析結果，回傳不符的出處"""
+        failed = []
+        for text, expected in KNOWN_REFERENCES:
+            reference = self.parse_reference(text)
+            if reference is None or tuple(reference[:4]) != expected:
+                failed.append(text)
+                log_message(f"出處解析錯誤: {text} → {reference[:4] if reference else None}，應為 {expected}", "ERROR")
+        return failed
+
+def main():
+    """主函數：build 編譯索引；lookup 查詢出處；check 檢查文字稿內的所有出處"""
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'lookup', 'check'):
+        print("用法: python scripts/bible_index.py build | lookup 箴四18 ... | check docs/img/MMDD.txt ...")
+        sys.exit(1)
+
+    try:
+        command, args = sys.argv[1], sys.argv[2:]
+        if command == 'build':
+            compile_index()
+            with BibleIndex() as index:
+                sys.exit(1 if index.check_known() else 0)
+
+        started = time.perf_counter()
+        index = BibleIndex()
+        unresolved = 0
+        total = 0
+        if command == 'lookup':
+            references = [index.parse_reference(arg) for arg in args]
+            pairs = [(arg, ref) for arg, ref in zip(args, references)]
+        else:
+            pairs = []
+            for path in args:
+                with open(path, 'r', encoding='utf-8') as f:
+                    pairs.extend((path, ref) for ref in index.find_references(f.read()))
+        for source, reference in pairs:
+            total += 1
+            content = index.resolve(reference) if reference else None
+            if content is None:
+                unresolved += 1
+                log_message(f"{source}: 無法解析 {reference.text if reference else source}", "WARNING")
+            else:
+                print(f"{reference.text}\t{reference.book} {reference.chapter}:{reference.verse}"
+                      f"{'-' + str(reference.end_verse) if reference.end_verse else ''}\t{content}")
+        log_message(f"共 {total} 處出處，無法解析 {unresolved} 處，耗時 {(time.perf_counter() - started) * 1000:.1f} ms")
+        sys.exit(1 if unresolved else 0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
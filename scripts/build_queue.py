@@ -0,0 +1,352 @@
+# scripts/build_queue.py
+import os
+import re
+import sys
+import time
+import asyncio
+import hashlib
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta
+from utils import TAIWAN_TZ, load_config, ensure_directory, get_taiwan_time, log_message
+from episode_manifest import SESSION_HOURS, EpisodeManifest, episode_key
+from instrumentation import span
+
+DEFAULT_QUEUE_PATH = os.path.join('docs', 'podcast', 'build_queue.sqlite')
+IMG_DIR = os.path.join('docs', 'img')
+# 校正稿 MMDD.txt（或 YYYYMMDD.txt）是建置的必要輸入，頁面影像為選用
+DRAFT_PATTERN = re.compile(r'^(\d{4}(?:\d{4})?)\.txt$')
+DEFAULT_HORIZON_DAYS = 60
+DEFAULT_MAX_ATTEMPTS = 3
+# 已發布超過這麼多天的工作自佇列移除
+KEEP_DAYS = 30
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    target TEXT PRIMARY KEY,             -- 節目日期 YYYY-MM-DD（同一個 MMDD 每年各為一個工作）
+    date TEXT NOT NULL,                  -- 資料夾日期 MMDD
+    source TEXT NOT NULL,                -- 校正稿與頁面影像的 SHA-1，變更時重新建置
+    state TEXT NOT NULL,                 -- queued / building / built / failed / published
+    priority INTEGER NOT NULL,           -- 距今日的天數，0 為今日
+    attempts INTEGER NOT NULL DEFAULT 0,
+    published TEXT NOT NULL DEFAULT '',  -- 已加入 Feed 的時段，以逗號分隔
+    error TEXT,
+    updated TEXT NOT NULL,
+    built_at TEXT,
+    published_at TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, priority);
+"""
+
+def source_digest(date_str, img_dir=IMG_DIR):
+    """校正稿與頁面影像內容的 SHA-1"""
+    from ocr_engine import find_page_image
+    digest = hashlib.sha1()
+    for path in (os.path.join(img_dir, f'{date_str}.txt'), find_page_image(date_str, img_dir)):
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+def target_date(date_str, today):
+    """MMDD 對應今日或之後最近的一天（跨年時為明年）；YYYYMMDD 直接採用；日期無效時回傳 None"""
+    try:
+        if len(date_str) == 8:
+            return datetime.strptime(date_str, '%Y%m%d').date()
+        target = datetime.strptime(f"{today.year}{date_str}", '%Y%m%d').date()
+        if target < today:
+            target = datetime.strptime(f"{today.year + 1}{date_str}", '%Y%m%d').date()
+        return target
+    except ValueError:
+        return None
+
+def is_future(date_str, config=None, today=None):
+    """節目日期是否在今日之後：MMDD 須落在 horizon_days 內（更遠者視為已播出的日期），YYYYMMDD 直接比較；
+    未來的日期只能預先建置，不可執行 rss 階段，否則 scheduled_pub_date 會把它當成去年的集數立即發布"""
+    today = today or get_taiwan_time().date()
+    target = target_date(date_str, today)
+    if target is None or target <= today:
+        return False
+    if len(date_str) == 8:
+        return True
+    horizon = int((config or load_config()).get('queue', {}).get('horizon_days', DEFAULT_HORIZON_DAYS))
+    return (target - today).days <= horizon
+
+def session_time(target, session):
+    """時段的預定發布時間（台灣時間）"""
+    return TAIWAN_TZ.localize(datetime.combine(target, datetime.min.time()).replace(hour=SESSION_HOURS[session]))
+
+def held_dates(config=None):
+    """已預先建置、尚未全部發布的資料夾日期；generate_rss --rescan 不應提前登錄這些集數"""
+    queue_config = (config or load_config()).get('queue', {})
+    path = os.environ.get('BUILD_QUEUE_PATH', queue_config.get('path', DEFAULT_QUEUE_PATH))
+    if not os.path.exists(path):
+        return set()
+    db = sqlite3.connect(path, timeout=30)
+    try:
+        today = get_taiwan_time().date().isoformat()
+        rows = db.execute("SELECT date FROM jobs WHERE state != 'published' AND target >= ?", (today,)).fetchall()
+    finally:
+        db.close()
+    return {row[0] for row in rows}
+
+class BuildQueue:
+    """持久化的預先建置佇列（SQLite）：校正稿已就緒的未來日期提前執行 OCR → TTS → 上傳，
+    到了預定時間只需將已上傳的集數登錄至集數清單並重建 Feed，不再受 Edge TTS 或 B2 當下的狀況影響"""
+
+    def __init__(self, config=None, path=None, img_dir=IMG_DIR, shared=None):
+        self.config = config or load_config()
+        queue_config = self.config.get('queue', {})
+        self.path = path or os.environ.get('BUILD_QUEUE_PATH', queue_config.get('path', DEFAULT_QUEUE_PATH))
+        self.img_dir = img_dir
+        # 預先建置的最遠天數；更早的校正稿視為已播出（明年的同一天不提前建置）
+        self.horizon = int(queue_config.get('horizon_days', DEFAULT_HORIZON_DAYS))
+        self.max_attempts = int(queue_config.get('max_attempts', DEFAULT_MAX_ATTEMPTS))
+        ensure_directory(os.path.dirname(self.path))
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        with self.db:
+            self.db.executescript(SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        # 與日期無關的常駐資源（B2 連線、OCR 引擎、後製器）；由 watch 模式傳入時由其負責關閉
+        self._owns_shared = shared is None
+        self.shared = shared if shared is not None else {}
+
+    def close(self):
+        engine = self.shared.get('ocr_engine')
+        if self._owns_shared and engine is not None:
+            engine.close()
+        self.db.close()
+
+    @staticmethod
+    def _now():
+        return get_taiwan_time().isoformat(timespec='seconds')
+
+    # ===== 排入工作 =====
+    def enqueue(self, target, date_str, source, priority):
+        """同一天只有一個工作；校正稿或影像變更時重設為 queued（已發布者於下次發布時更新集數），回傳是否排入"""
+        row = self.db.execute("SELECT source FROM jobs WHERE target = ?", (target.isoformat(),)).fetchone()
+        with self.db:
+            if row is None:
+                self.db.execute("INSERT INTO jobs (target, date, source, state, priority, updated) "
+                                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                                (target.isoformat(), date_str, source, priority, self._now()))
+                return True
+            if row['source'] != source:
+                self.db.execute("UPDATE jobs SET source = ?, state = 'queued', attempts = 0, published = '', "
+                                "error = NULL, updated = ? WHERE target = ?",
+                                (source, self._now(), target.isoformat()))
+                return True
+        return False
+
+    def enqueue_date(self, date_str, today=None):
+        """排入單一日期（watch 模式偵測到未來日期的校正稿時），回傳是否排入"""
+        today = today or get_taiwan_time().date()
+        target = target_date(date_str, today)
+        if target is None:
+            raise ValueError(f"無效日期: {date_str}")
+        return self.enqueue(target, date_str, source_digest(date_str, self.img_dir), (target - today).days)
+
+    def scan(self, today=None):
+        """排入 docs/img 下今日起 horizon 天內有校正稿的日期，並依今日重新計算所有工作的優先序"""
+        today = today or get_taiwan_time().date()
+        queued = 0
+        with span('queue.scan') as scan_span:
+            for name in sorted(os.listdir(self.img_dir)):
+                match = DRAFT_PATTERN.match(name)
+                if not match:
+                    continue
+                date_str = match.group(1)
+                target = target_date(date_str, today)
+                if target is None or not 0 <= (target - today).days <= self.horizon:
+                    continue
+                queued += self.enqueue_date(date_str, today)
+            with self.db:
+                self.db.execute("UPDATE jobs SET priority = CAST(julianday(target) - julianday(?) AS INTEGER)",
+                                (today.isoformat(),))
+                self.db.execute("DELETE FROM jobs WHERE state = 'published' AND target < ?",
+                                ((today - timedelta(days=KEEP_DAYS)).isoformat(),))
+                # 上次建置中斷（行程被終止）的工作重新排入
+                self.db.execute("UPDATE jobs SET state = 'queued' WHERE state = 'building'")
+            scan_span.set(queued=queued)
+        log_message(f"建置佇列：新排入或重新排入 {queued} 個日期")
+        return queued
+
+    # ===== 建置 =====
+    def next_job(self, exclude=(), dates=None):
+        """今日優先，其次為已過期未建置的日期（越近越先），再依序往後建置未來的日期；dates 限定資料夾日期"""
+        placeholders = ','.join('?' * len(exclude))
+        only = f"AND date IN ({','.join('?' * len(dates))}) " if dates is not None else ''
+        return self.db.execute(
+            "SELECT * FROM jobs WHERE state IN ('queued', 'failed') AND attempts < ? "
+            f"AND target NOT IN ({placeholders}) {only}ORDER BY priority != 0, priority > 0, ABS(priority) LIMIT 1",
+            (self.max_attempts, *exclude, *(dates or ()))).fetchone()
+
+    def mark(self, target, state, error=None):
+        with self.db:
+            if state == 'building':
+                self.db.execute("UPDATE jobs SET state = ?, attempts = attempts + 1, error = NULL, updated = ? "
+                                "WHERE target = ?", (state, self._now(), target))
+            elif state == 'built':
+                self.db.execute("UPDATE jobs SET state = ?, built_at = ?, updated = ? WHERE target = ?",
+                                (state, self._now(), self._now(), target))
+            else:
+                self.db.execute("UPDATE jobs SET state = ?, error = ?, updated = ? WHERE target = ?",
+                                (state, error, self._now(), target))
+
+    def warm_up(self, skip):
+        if self.config.get('ocr', {}).get('enabled', True) and 'ocr' not in skip and 'ocr_engine' not in self.shared:
+            from ocr_engine import OCREngine
+            try:
+                self.shared['ocr_engine'] = OCREngine(config=self.config)
+            except (ImportError, ValueError) as e:
+                log_message(f"OCR 引擎無法載入，僅處理校正稿: {str(e)}", "WARNING")
+
+    async def build(self, limit=None, skip=(), dates=None):
+        """依優先序建置（不含 RSS 階段），B2 連線、OCR 引擎與後製器跨日期共用，回傳 (成功數, 失敗數)；
+        dates 指定時只建置這些資料夾日期"""
+        from pipeline import Pipeline
+        skip = set(skip) | {'rss'}
+        self.warm_up(skip)
+        built = failed = 0
+        tried = []
+        while limit is None or built + failed < limit:
+            # 失敗的日期留待下次執行再重試，不在同一次執行中反覆嘗試
+            job = self.next_job(tried, dates)
+            if job is None:
+                break
+            tried.append(job['target'])
+            self.mark(job['target'], 'building')
+            log_message(f"預先建置 {job['date']}（{job['target']}，第 {job['attempts'] + 1} 次）")
+            with span('queue.build', date=job['date']) as build_span:
+                error = None
+                try:
+                    ok = await Pipeline(job['date'], skip=skip, config=self.config, shared=self.shared).run()
+                except Exception as e:
+                    ok, error = False, str(e)
+                if not ok:
+                    build_span.fail(error or "pipeline 部分階段失敗")
+            if ok:
+                self.mark(job['target'], 'built')
+                built += 1
+            else:
+                self.mark(job['target'], 'failed', error or "pipeline 部分階段失敗")
+                failed += 1
+        log_message(f"預先建置完成：成功 {built} 個，失敗 {failed} 個")
+        return built, failed
+
+    # ===== 發布 =====
+    def due(self, now=None):
+        """已建置且到了預定時間、尚未加入 Feed 的時段，回傳 {(時段, ...): [工作, ...]}"""
+        now = now or get_taiwan_time()
+        groups = {}
+        rows = self.db.execute("SELECT * FROM jobs WHERE state IN ('built', 'published') AND target <= ? "
+                               "ORDER BY target", (now.date().isoformat(),)).fetchall()
+        for job in rows:
+            published = set(filter(None, job['published'].split(',')))
+            target = date.fromisoformat(job['target'])
+            sessions = tuple(s for s in SESSION_HOURS if s not in published and session_time(target, s) <= now)
+            if sessions:
+                groups.setdefault(sessions, []).append(job)
+        return groups
+
+    def registered(self, date_str, sessions):
+        """所有語音變體的集數清單都已登錄的時段"""
+        from variants import load_variants
+        manifests = [EpisodeManifest(v.episode_manifest) for v in load_variants(self.config)]
+        return [s for s in sessions if all(m.get(episode_key(date_str, s)) for m in manifests)]
+
+    def publish(self, now=None):
+        """到時發布：只更新集數清單與 Feed（音檔已上傳，相關集數沿用清單中的結果，已滿的封存頁不重新產生），
+        確認集數已登錄的時段才標記為已發布，回傳是否成功"""
+        from generate_rss import generate_feeds
+        started = time.perf_counter()
+        groups = self.due(now)
+        if not groups:
+            log_message("沒有到達發布時間的已建置集數")
+            return True
+        success = True
+        published = 0
+        with span('queue.publish') as publish_span:
+            for sessions, jobs in groups.items():
+                dates = [job['date'] for job in jobs]
+                if generate_feeds(dates, False, self.config, sessions, all_pages=False) is False:
+                    success = False
+                    continue
+                with self.db:
+                    for job in jobs:
+                        added = self.registered(job['date'], sessions)
+                        if len(added) < len(sessions):
+                            # 找不到音檔或清單為空（generate_feeds 回傳 None）時不標記，下次發布再試
+                            log_message(f"{job['date']} 的 {', '.join(s for s in sessions if s not in added)} "
+                                        f"未登錄至集數清單，暫不標記為已發布", "WARNING")
+                            success = False
+                        if not added:
+                            continue
+                        published += len(added)
+                        done = set(filter(None, job['published'].split(','))) | set(added)
+                        state = 'published' if done >= set(SESSION_HOURS) else 'built'
+                        self.db.execute("UPDATE jobs SET published = ?, state = ?, published_at = ?, updated = ? "
+                                        "WHERE target = ?", (','.join(s for s in SESSION_HOURS if s in done), state,
+                                                             self._now(), self._now(), job['target']))
+            publish_span.set(episodes=published)
+            if not success:
+                publish_span.fail("Feed 產生失敗")
+        log_message(f"已發布 {published} 集，耗時 {time.perf_counter() - started:.2f}s")
+        return success
+
+    def status(self):
+        rows = self.db.execute("SELECT * FROM jobs ORDER BY target").fetchall()
+        for job in rows:
+            log_message(f"{job['target']} {job['date']} {job['state']:<9} 嘗試 {job['attempts']} 次"
+                        f"  已發布 [{job['published']}]" + (f"  錯誤: {job['error']}" if job['error'] else ''))
+        return rows
+
+async def run(queue, limit=None, skip=()):
+    """先發布已建置的集數，再預先建置（今日優先），最後發布剛建置完成且已到時間的集數"""
+    queue.scan()
+    published = queue.publish()
+    _, failed = await queue.build(limit, skip)
+    return queue.publish() and published and not failed
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="預先建置有校正稿的未來日期，到預定時間只更新集數清單與 RSS")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('scan', help="排入 docs/img 下有校正稿的日期")
+    for name, help_text in (('build', "依優先序建置佇列中的日期"), ('run', "發布、建置、再發布（排程使用）")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--limit', type=int, help="本次最多建置的日期數")
+        sub.add_argument('--skip', default='', help="略過的 pipeline 階段，以逗號分隔")
+    subparsers.add_parser('publish', help="將已建置且到達發布時間的集數加入 Feed")
+    subparsers.add_parser('status', help="列出佇列中的工作")
+    args = parser.parse_args()
+
+    try:
+        queue = BuildQueue()
+        try:
+            if args.command == 'scan':
+                queue.scan()
+                success = True
+            elif args.command == 'publish':
+                success = queue.publish()
+            elif args.command == 'status':
+                queue.status()
+                success = True
+            else:
+                skip = [s.strip() for s in args.skip.split(',') if s.strip()]
+                if args.command == 'build':
+                    queue.scan()
+                    success = asyncio.run(queue.build(args.limit, skip))[1] == 0
+                else:
+                    success = asyncio.run(run(queue, args.limit, skip))
+        finally:
+            queue.close()
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# scripts/episode_manifest.py
+import os
+import json
+from datetime import datetime
+import pytz
+from utils import ensure_directory, get_taiwan_time, log_message
+
+MANIFEST_FILE = os.path.join('docs', 'rss', 'episodes.json')
+MANIFEST_VERSION = 1
+
+# 各時段的預定發布時間（台灣時間）
+SESSION_HOURS = {'morning': 6, 'evening': 18}
+
+def episode_key(date_str, session):
+    return f"{date_str}/{session}"
+
+def scheduled_pub_date(date_str, session, now=None):
+    """依資料夾日期（MMDD 或 YYYYMMDD）與時段推算發布時間；MMDD 落在未來時視為去年"""
+    tz = pytz.timezone('Asia/Taipei')
+    now = now or get_taiwan_time()
+    hour = SESSION_HOURS.get(session, 6)
+    if len(date_str) == 8:
+        naive = datetime.strptime(date_str, '%Y%m%d')
+    else:
+        naive = datetime.strptime(f"{now.year}{date_str}", '%Y%m%d')
+    pub_date = tz.localize(naive.replace(hour=hour))
+    if len(date_str) == 4 and pub_date.date() > now.date():
+        pub_date = tz.localize(naive.replace(year=now.year - 1, hour=hour))
+    return min(pub_date, now)
+
+class EpisodeManifest:
+    """docs/rss/ 下的集數清單，保存每集 id、URL、大小、時長、發布時間與摘要，供 RSS 增量產生"""
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.entries = data.get('episodes', {})
+            except (OSError, ValueError) as e:
+                log_message(f"讀取集數清單失敗，將重新建立: {str(e)}", "WARNING")
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def upsert(self, key, entry):
+        if self.entries.get(key) != entry:
+            self.entries[key] = entry
+            self.dirty = True
+
+    def remove(self, key):
+        if self.entries.pop(key, None) is not None:
+            self.dirty = True
+
+    def episodes(self, newest_first=True):
+        return sorted(self.entries.values(), key=lambda e: (e['pub_date'], e['key']), reverse=newest_first)
+
+    def save(self):
+        if not self.dirty:
+            return False
+        ensure_directory(os.path.dirname(self.path))
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'episodes': dict(sorted(self.entries.items()))},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+        return True
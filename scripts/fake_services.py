@@ -0,0 +1,156 @@
+# scripts/fake_services.py
+import os
+import re
+import json
+import uuid
+import random
+import asyncio
+import multiprocessing
+from utils import log_message
+
+DEFAULT_SAMPLE_MP3 = os.path.join('docs', 'podcast', '0808', 'morning.mp3')
+# 每則二進位訊息約含的音框數（實際服務每則約 4 KB）
+FRAMES_PER_MESSAGE = 28
+# 100 ns 為單位
+TICKS_PER_SECOND = 10_000_000
+SSML_TEXT = re.compile(r'<prosody[^>]*>(.*)</prosody>', re.S)
+UNIT_PATTERN = re.compile(r'[^。！？，；、\n]+[。！？，；、]*')
+
+def _text_message(request_id, path, body):
+    return (f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\n"
+            f"Path:{path}\r\n\r\n{body}")
+
+def _audio_message(request_id, data):
+    headers = f"X-RequestId:{request_id}\r\n" + ("Content-Type:audio/mpeg\r\n" if data else "") + "Path:audio\r\n"
+    encoded = headers.encode('utf-8')
+    return len(encoded).to_bytes(2, 'big') + encoded + data
+
+class FakeEdgeTTS:
+    """以 aiohttp 模擬 Edge TTS 的 websocket 協定：依文字長度回傳預錄 MP3 音框，延遲與產生速度可調"""
+
+    def __init__(self, latency_ms=50, realtime=0.0, chars_per_second=4.5, sample_mp3=DEFAULT_SAMPLE_MP3,
+                 stall_rate=0.0, stall_ms=5000, seed=None):
+        from mp3_tools import MP3File
+        self.latency = latency_ms / 1000
+        # >0 時依「音訊長度 / realtime」節流，模擬服務端的生成速度
+        self.realtime = realtime
+        self.chars_per_second = chars_per_second
+        # 以 stall_rate 的機率讓請求延遲 stall_ms 才開始回應，模擬長尾延遲
+        self.stall_rate = stall_rate
+        self.stall = stall_ms / 1000
+        self.random = random.Random(seed)
+        sample = MP3File.load(sample_mp3)
+        self.frames = [bytes(sample.frame_bytes(i)) for i in range(len(sample.frames))]
+        self.frame_seconds = sample.header.samples / sample.header.sample_rate
+        self.requests = 0
+
+    async def handle(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        try:
+            await self.serve(ws)
+        except ConnectionResetError:
+            # 用戶端取消（例如備援請求勝出）後關閉連線
+            pass
+        return ws
+
+    async def serve(self, ws):
+        from aiohttp import WSMsgType
+        word_boundary = False
+        frame_index = 0
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            headers, _, body = message.data.partition('\r\n\r\n')
+            if 'Path:speech.config' in headers:
+                word_boundary = '"wordBoundaryEnabled":"true"' in body
+                continue
+            if 'Path:ssml' not in headers:
+                continue
+
+            self.requests += 1
+            request_id = uuid.uuid4().hex
+            match = SSML_TEXT.search(body)
+            text = match.group(1).strip() if match else ''
+            stalled = self.stall_rate and self.random.random() < self.stall_rate
+            await asyncio.sleep(self.latency + (self.stall if stalled else 0))
+            await ws.send_str(_text_message(request_id, 'turn.start', '{}'))
+            await ws.send_str(_text_message(request_id, 'response', '{}'))
+
+            offset = 0
+            units = UNIT_PATTERN.findall(text) or [text]
+            for unit in units:
+                seconds = max(self.frame_seconds, len(unit) / self.chars_per_second)
+                frame_count = max(1, round(seconds / self.frame_seconds))
+                duration = int(frame_count * self.frame_seconds * TICKS_PER_SECOND)
+                metadata = {'Metadata': [{'Type': 'WordBoundary' if word_boundary else 'SentenceBoundary',
+                                          'Data': {'Offset': offset, 'Duration': duration,
+                                                   'text': {'Text': unit, 'Length': len(unit)}}}]}
+                await ws.send_str(_text_message(request_id, 'audio.metadata', json.dumps(metadata, ensure_ascii=False)))
+                for start in range(0, frame_count, FRAMES_PER_MESSAGE):
+                    count = min(FRAMES_PER_MESSAGE, frame_count - start)
+                    chunk = b''.join(self.frames[(frame_index + i) % len(self.frames)] for i in range(count))
+                    frame_index += count
+                    await ws.send_bytes(_audio_message(request_id, chunk))
+                    if self.realtime > 0:
+                        await asyncio.sleep(count * self.frame_seconds / self.realtime)
+                offset += duration
+            await ws.send_bytes(_audio_message(request_id, b''))
+            await ws.send_str(_text_message(request_id, 'turn.end', '{}'))
+
+def _serve(port_queue, options):
+    from aiohttp import web
+    fake = FakeEdgeTTS(**options)
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', fake.handle)
+
+    async def start():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port_queue.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(start())
+
+class FakeEdgeTTSServer:
+    """在獨立行程中執行 FakeEdgeTTS，並將 edge_tts 的 WSS_URL 指向本機"""
+
+    def __init__(self, **options):
+        self.options = options
+        self.process = None
+        self.url = None
+        self._original_url = None
+
+    def start(self):
+        port_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_serve, args=(port_queue, self.options), daemon=True)
+        self.process.start()
+        port = port_queue.get(timeout=30)
+        self.url = f"ws://127.0.0.1:{port}/consumer/speech/synthesize/readaloud/edge/v1?TrustedClientToken=fake"
+
+        from edge_tts import communicate
+        self._original_url = communicate.WSS_URL
+        communicate.WSS_URL = self.url
+        # aiohttp 會讀取代理設定，本機連線需排除
+        os.environ['NO_PROXY'] = ','.join(filter(None, [os.environ.get('NO_PROXY'), '127.0.0.1']))
+        log_message(f"本機 Edge TTS 替身已啟動: {self.url}")
+        return self
+
+    def stop(self):
+        if self._original_url is not None:
+            from edge_tts import communicate
+            communicate.WSS_URL = self._original_url
+            self._original_url = None
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
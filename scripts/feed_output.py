@@ -0,0 +1,155 @@
+# scripts/feed_output.py
+import os
+import json
+import gzip
+import hashlib
+import datetime
+from email.utils import format_datetime
+from lxml import etree
+from feedgen.ext.base import BaseExtension, BaseEntryExtension
+from utils import load_config, ensure_directory, log_message
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+HISTORY_NS = 'http://purl.org/syndication/history/1.0'
+HEADERS_FILE = os.path.join('docs', 'rss', 'headers.json')
+ARCHIVE_DIR = 'archive'
+DEFAULT_RECENT_EPISODES = 60
+DEFAULT_ARCHIVE_PAGE_SIZE = 100
+
+class ArchiveExtension(BaseExtension):
+    """RFC 5005 封存分頁：頻道內的 atom:link（current／prev-archive／next-archive）與封存頁的 fh:archive 標記"""
+
+    def __init__(self):
+        self.links = {}
+        self.is_archive = False
+
+    def extend_ns(self):
+        return {'fh': HISTORY_NS}
+
+    def extend_rss(self, feed):
+        channel = feed[0]
+        for rel, href in self.links.items():
+            etree.SubElement(channel, f'{{{ATOM_NS}}}link', href=href, rel=rel)
+        if self.is_archive:
+            etree.SubElement(channel, f'{{{HISTORY_NS}}}archive')
+        return feed
+
+class ArchiveEntryExtension(BaseEntryExtension):
+    pass
+
+def paginate(episodes, recent, page_size):
+    """episodes 由新到舊；回傳 (主 Feed 的最新 recent 集, 由舊到新的封存頁)。封存頁從最舊的集數起算，
+    已滿的頁收錄的集數固定，只有最新一頁會隨集數移出主 Feed 而增加；各集的相關集數於首次發布時固定
+    （見 generate_rss.store_related），因此已滿的頁除了新增下一頁時多一個 next-archive 連結外不再改寫"""
+    current = episodes[:recent]
+    older = list(reversed(episodes[recent:]))
+    return current, [older[i:i + page_size] for i in range(0, len(older), page_size)]
+
+def archive_path(feed_path, number):
+    """docs/rss/podcast_light.xml 的第 n 頁封存為 docs/rss/archive/podcast_light-n.xml"""
+    name = os.path.splitext(os.path.basename(feed_path))[0]
+    return os.path.join(os.path.dirname(feed_path), ARCHIVE_DIR, f"{name}-{number}.xml")
+
+def _etag(data):
+    return f'"{hashlib.sha1(data).hexdigest()[:20]}"'
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+class FeedWriter:
+    """寫出 Feed 檔：內容未變更時不重寫；同時產生預先壓縮的 .gz（mtime 固定為 0，輸出可重現）與 .br（已安裝 brotli 時），
+    並於 headers.json 記錄每個檔案的 ETag、Last-Modified 與各編碼的大小，供 CDN 或靜態主機設定條件式請求"""
+
+    def __init__(self, config=None):
+        rss_config = (config or load_config()).get('rss', {})
+        self.recent = max(1, int(rss_config.get('recent_episodes', DEFAULT_RECENT_EPISODES)))
+        self.page_size = max(1, int(rss_config.get('archive_page_size', DEFAULT_ARCHIVE_PAGE_SIZE)))
+        self.precompress = rss_config.get('precompress', True)
+        self.headers_path = rss_config.get('headers_file', HEADERS_FILE)
+        self.brotli = _brotli() if self.precompress else None
+        self.headers = {}
+        self.written = 0
+        self.unchanged = 0
+        self.bytes_written = 0
+        self._dirty = False
+        if os.path.exists(self.headers_path):
+            try:
+                with open(self.headers_path, 'r', encoding='utf-8') as f:
+                    self.headers = json.load(f)
+            except (OSError, ValueError):
+                self.headers = {}
+
+    @staticmethod
+    def key(path):
+        return path.replace(os.sep, '/')
+
+    def encodings(self, data):
+        """回傳 {副檔名: 壓縮後內容}"""
+        if not self.precompress:
+            return {}
+        encoded = {'gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if self.brotli:
+            encoded['br'] = self.brotli.compress(data, quality=11)
+        return encoded
+
+    def unchanged_on_disk(self, path, data):
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb') as f:
+            if f.read() != data:
+                return False
+        suffixes = ['gz'] + (['br'] if self.brotli else []) if self.precompress else []
+        return all(os.path.exists(f"{path}.{s}") for s in suffixes) and self.key(path) in self.headers
+
+    def write(self, path, data):
+        """內容與現有檔案相同時不寫入，回傳是否寫入"""
+        if self.unchanged_on_disk(path, data):
+            self.unchanged += 1
+            return False
+        ensure_directory(os.path.dirname(path))
+        _write_atomic(path, data)
+        header = {
+            'etag': _etag(data),
+            'last_modified': format_datetime(datetime.datetime.now(datetime.timezone.utc), usegmt=True),
+            'size': len(data),
+        }
+        for suffix, encoded in self.encodings(data).items():
+            _write_atomic(f"{path}.{suffix}", encoded)
+            header[suffix] = {'etag': _etag(encoded), 'size': len(encoded)}
+            self.bytes_written += len(encoded)
+        self.headers[self.key(path)] = header
+        self.bytes_written += len(data)
+        self.written += 1
+        self._dirty = True
+        return True
+
+    def prune(self, feed_path, pages):
+        """移除超出目前頁數的封存頁（調整 recent_episodes 或 archive_page_size 後）"""
+        number = pages + 1
+        while os.path.exists(archive_path(feed_path, number)):
+            path = archive_path(feed_path, number)
+            for suffix in ('', '.gz', '.br'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            self.headers.pop(self.key(path), None)
+            self._dirty = True
+            number += 1
+
+    def save(self):
+        log_message(f"Feed 輸出：寫入 {self.written} 個、內容未變更 {self.unchanged} 個")
+        if not self._dirty:
+            return
+        ensure_directory(os.path.dirname(self.headers_path))
+        _write_atomic(self.headers_path, json.dumps(dict(sorted(self.headers.items())), ensure_ascii=False,
+                                                    indent=1).encode('utf-8'))
+        self._dirty = False
@@ -1,14 +1,19 @@
 import os
 import sys
 import datetime
-import pytz
 from mutagen.mp3 import MP3
 from feedgen.feed import FeedGenerator
-from utils import load_config, get_date_string, ensure_directory, get_taiwan_time, log_message
+from utils import load_config, get_date_string, log_message
+from episode_manifest import EpisodeManifest, episode_key, scheduled_pub_date
+from transcript_index import TranscriptIndex, update_index
+from instrumentation import span
+from artifact_store import ArtifactStore
+from variants import default_variant, load_variants
+from feed_output import FeedWriter, ArchiveExtension, ArchiveEntryExtension, paginate, archive_path
+from speech_marks import PodcastIndexExtension, PodcastIndexEntryExtension, TRANSCRIPT_TYPES, output_paths
 
 # ===== 基本常數設定 =====
 SITE_URL = "https://timhun.github.io/daily-light"
-B2_BASE = "https://f005.backblazeb2.com/file/daily-light"
 COVER_URL = f"{SITE_URL}/docs/img/cover.jpg"
 RSS_FILE = os.path.join('docs', 'rss', 'podcast_light.xml')
 
@@ -16,90 +21,260 @@ FIXED_DESCRIPTION = """每日一則靈修亮光，用聲音溫柔照亮新的一
 \n\n🔔 訂閱以接收每日晨間與晚間更新，探索經文與反思。
 \n\n📮 主持人：幫幫便，聯繫：tim.oneway@gmail.com"""
 
+def feed_url(path):
+    """docs 下的檔案對應的 GitHub Pages 網址"""
+    return f"{SITE_URL}/{os.path.relpath(path, 'docs').replace(os.sep, '/')}"
+
 # ===== 初始化 Feed =====
-fg = FeedGenerator()
-fg.load_extension("podcast")
-fg.id(SITE_URL)
-fg.title("幫幫便說每日亮光")
-fg.author({"name": "幫幫便", "email": "tim.oneway@gmail.com"})
-fg.link(href=SITE_URL, rel="alternate")
-fg.language("zh-TW")
-fg.description(FIXED_DESCRIPTION)
-fg.logo(COVER_URL)
-fg.link(href=f"{SITE_URL}/rss/podcast_light.xml", rel="self")
-fg.podcast.itunes_category("Religion & Spirituality", "Christianity")
-fg.podcast.itunes_image(COVER_URL)
-fg.podcast.itunes_explicit("no")
-fg.podcast.itunes_author("幫幫便")
-fg.podcast.itunes_owner(name="幫幫便", email="tim.oneway@gmail.com")
-
-# ===== 找出最新資料夾 =====
-episodes_dir = os.path.join('docs', 'podcast')
-matching_folders = sorted([
-    f for f in os.listdir(episodes_dir)
-    if os.path.isdir(os.path.join(episodes_dir, f)) and f == get_date_string()
-], reverse=True)
-
-if not matching_folders:
-    log_message(f"⚠️ 找不到當日 podcast 資料夾 {get_date_string()}，RSS 未產生", "WARNING")
-    sys.exit(0)
-
-latest_folder = matching_folders[0]
-base_path = os.path.join(episodes_dir, latest_folder)
+def create_feed(variant=None, self_url=None):
+    feed_path = variant.feed if variant else RSS_FILE
+    fg = FeedGenerator()
+    fg.load_extension("podcast")
+    fg.register_extension("archive", ArchiveExtension, ArchiveEntryExtension)
+    fg.register_extension("podcastindex", PodcastIndexExtension, PodcastIndexEntryExtension)
+    fg.id(SITE_URL if not variant or variant.primary else feed_url(feed_path))
+    fg.title((variant.title if variant else None) or "幫幫便說每日亮光")
+    fg.author({"name": "幫幫便", "email": "tim.oneway@gmail.com"})
+    fg.link(href=SITE_URL, rel="alternate")
+    fg.language("zh-TW")
+    fg.description(FIXED_DESCRIPTION)
+    fg.logo(COVER_URL)
+    fg.link(href=self_url or feed_url(feed_path), rel="self")
+    fg.podcast.itunes_category("Religion & Spirituality", "Christianity")
+    fg.podcast.itunes_image(COVER_URL)
+    fg.podcast.itunes_explicit("no")
+    fg.podcast.itunes_author("幫幫便")
+    fg.podcast.itunes_owner(name="幫幫便", email="tim.oneway@gmail.com")
+    return fg
 
 # ===== 處理 morning 和 evening 項目 =====
-audio_files = [('morning.mp3', '晨間'), ('evening.mp3', '晚間')]
-for audio_file, session in audio_files:
-    audio_path = os.path.join(base_path, audio_file)
-    archive_url_file = os.path.join(base_path, f"{session.lower()}_url.txt")
-
-    if os.path.exists(audio_path) and os.path.exists(archive_url_file):
-        with open(archive_url_file, "r") as f:
-            audio_url = f.read().strip()
-
-        try:
-            mp3 = MP3(audio_path)
-            duration = int(mp3.info.length)
-        except Exception as e:
-            log_message(f"⚠️ 讀取 {audio_file} 時長失敗：{e}", "WARNING")
-            duration = None
-
-        tz = pytz.timezone("Asia/Taipei")
-        pub_date = tz.localize(datetime.datetime.now()).strftime("%a, %d %b %Y %H:%M:%S GMT")  # 使用當前日期
-        title = f"每日亮光 - {get_date_string()} {session}"
+def update_manifest(manifest, date_str, artifacts=None, variant=None, sessions=None):
+    """將指定日期資料夾的晨間、晚間音檔（variant 的音檔目錄）登錄至集數清單；音檔存放區清單中已有者直接採用其
+    URL、大小與時長（不需要本機音檔），否則讀取本機音檔；音檔未變更者不重新讀取時長，回傳新增或更新的項目數。
+    sessions 指定時只登錄這些時段（預先建置的集數到發布時間才加入）"""
+    base_path = os.path.join('docs', 'podcast', date_str)
+    if not os.path.isdir(base_path):
+        log_message(f"⚠️ 找不到 podcast 資料夾 {date_str}", "WARNING")
+        return 0
+    audio_dir = variant.audio_dir(date_str) if variant else base_path
+
+    updated = 0
+    audio_files = [('morning.mp3', 'morning', '晨間'), ('evening.mp3', 'evening', '晚間')]
+    for audio_file, session_key, session in audio_files:
+        if sessions is not None and session_key not in sessions:
+            continue
+        audio_name = variant.audio_name(session_key) if variant else audio_file
+        audio_path = os.path.join(audio_dir, audio_file)
+        archive_url_file = os.path.join(audio_dir, f"{session.lower()}_url.txt")
+
+        artifact = artifacts.get(date_str, audio_name) if artifacts else None
+        if artifact:
+            audio_url, size = artifact['url'], artifact['size']
+        elif os.path.exists(audio_path) and os.path.exists(archive_url_file):
+            with open(archive_url_file, "r") as f:
+                audio_url = f.read().strip()
+            size = os.stat(audio_path).st_size
+        else:
+            continue
 
         # 摘要處理 (假設 summary.txt 存在)
+        summary_text = None
         summary_path = os.path.join(base_path, f"{session.lower()}_summary.txt")
         if os.path.exists(summary_path):
             with open(summary_path, "r", encoding="utf-8") as f:
                 summary_text = f.read().strip()
-            full_description = f"{FIXED_DESCRIPTION}\n\n🎯 今日{session}摘要：{summary_text}"
+
+        # 合成時產生的字幕與章節（提交至儲存庫，由 GitHub Pages 提供）
+        marks_files = output_paths(audio_path)
+        transcripts = {TRANSCRIPT_TYPES[os.path.splitext(p)[1]]: feed_url(p)
+                       for p in (marks_files['vtt'], marks_files['srt']) if os.path.exists(p)}
+        chapters = feed_url(marks_files['chapters']) if os.path.exists(marks_files['chapters']) else None
+
+        key = episode_key(date_str, session_key)
+        existing = manifest.get(key)
+        # 以 URL 與檔案大小判斷音檔是否變更（CI checkout 會重設 mtime，不可依賴）
+        if (existing and existing['url'] == audio_url and existing['size'] == size
+                and existing.get('summary') == summary_text
+                and existing.get('transcripts', {}) == transcripts and existing.get('chapters') == chapters):
+            continue
+
+        if artifact:
+            duration = int(artifact['duration']) if artifact.get('duration') is not None else None
         else:
-            full_description = FIXED_DESCRIPTION
-
-        # === Feed Entry ===
-        fe = fg.add_entry()
-        fe.id(audio_url)
-        fe.title(title)
-        fe.description(full_description)
-        fe.content(full_description, type="CDATA")
-        fe.enclosure(audio_url, str(os.path.getsize(audio_path)), "audio/mpeg")
-        fe.pubDate(pub_date)
-        if duration:
-            fe.podcast.itunes_duration(str(datetime.timedelta(seconds=duration)))
+            try:
+                with span('mp3.probe'):
+                    mp3 = MP3(audio_path)
+                duration = int(mp3.info.length)
+            except Exception as e:
+                log_message(f"⚠️ 讀取 {audio_file} 時長失敗：{e}", "WARNING")
+                duration = None
+
+        pub_date = existing['pub_date'] if existing else scheduled_pub_date(date_str, session_key).isoformat()
+        entry = {
+            'key': key,
+            'id': audio_url,
+            'date': date_str,
+            'session': session_key,
+            'title': f"每日亮光 - {date_str} {session}",
+            'url': audio_url,
+            'size': size,
+            'duration': duration,
+            'pub_date': pub_date,
+            'summary': summary_text,
+            'transcripts': transcripts,
+            'chapters': chapters,
+        }
+        if existing and 'related' in existing:
+            # 相關集數於首次發布時固定，之後不隨新集數改變，已滿的封存頁內容因此不變
+            entry['related'] = existing['related']
+        manifest.upsert(key, entry)
+        updated += 1
+    return updated
+
+def related_episodes(manifest, keys, limit=3):
+    """以文字稿索引為指定的集數找出內容相近、且已在清單中的其他集數，回傳 {key: [標題...]}；
+    索引無法更新時回傳 None（下次再補算）"""
+    if not keys:
+        return {}
+    if update_index() is None:
+        return None
+    related = {}
+    with TranscriptIndex() as index:
+        for key in keys:
+            episode = manifest.get(key)
+            doc_key = f"podcast/{episode['date']}/{episode['session']}"
+            titles = []
+            for other, _ in index.related(doc_key, limit=limit * 2):
+                info = index.meta['docs'][other]
+                match = manifest.get(episode_key(info['date'], info['session']))
+                if match and len(titles) < limit:
+                    titles.append(match['title'])
+            related[key] = titles
+    return related
+
+def store_related(manifest):
+    """相關集數存於集數清單，只為新增（尚無 related 欄位）的集數計算一次後固定，每次產生 Feed 不必重算全部"""
+    pending = [key for key, entry in manifest.entries.items() if 'related' not in entry]
+    with span('rss.related') as related_span:
+        related = related_episodes(manifest, pending)
+        related_span.set(episodes=len(pending))
+    for key, titles in (related or {}).items():
+        manifest.upsert(key, dict(manifest.get(key), related=titles))
+
+def add_entry(fg, episode):
+    session = '晨間' if episode['session'] == 'morning' else '晚間'
+    if episode.get('summary'):
+        full_description = f"{FIXED_DESCRIPTION}\n\n🎯 今日{session}摘要：{episode['summary']}"
+    else:
+        full_description = FIXED_DESCRIPTION
+    if episode.get('related'):
+        full_description += "\n\n📚 相關集數：" + "、".join(episode['related'])
+
+    # === Feed Entry ===
+    fe = fg.add_entry()
+    fe.id(episode['id'])
+    fe.title(episode['title'])
+    fe.description(full_description)
+    fe.content(full_description, type="CDATA")
+    fe.enclosure(episode['url'], str(episode['size']), "audio/mpeg")
+    fe.pubDate(datetime.datetime.fromisoformat(episode['pub_date']))
+    if episode.get('duration'):
+        fe.podcast.itunes_duration(str(datetime.timedelta(seconds=episode['duration'])))
+    for mime_type, url in (episode.get('transcripts') or {}).items():
+        fe.podcastindex.transcript(url, mime_type)
+    if episode.get('chapters'):
+        fe.podcastindex.chapters(episode['chapters'])
+    return fe
+
+def build_feed(episodes, variant=None, links=None, archive=False, self_url=None):
+    """由集數（由新到舊）產生 Feed；links 為 RFC 5005 的封存頁連結，archive 表示此為封存頁"""
+    fg = create_feed(variant, self_url)
+    fg.archive.links.update(links or {})
+    fg.archive.is_archive = archive
+    # feedgen 預設將新項目插入最前，故由舊到新加入
+    for episode in reversed(episodes):
+        add_entry(fg, episode)
+    # lastBuildDate 取最新一集的發布時間而非產生時間，內容未變時輸出的位元組相同
+    if episodes:
+        fg.lastBuildDate(datetime.datetime.fromisoformat(episodes[0]['pub_date']))
+    return fg
 
 # ===== 輸出 RSS =====
-ensure_directory(os.path.dirname(RSS_FILE))
-try:
-    fg.rss_file(RSS_FILE)
-    log_message(f"✅ 已產生 RSS Feed：{RSS_FILE}")
-except Exception as e:
-    log_message(f"❌ RSS 寫入失敗: {str(e)}", "ERROR")
-    sys.exit(1)
+def write_feeds(manifest, variant, writer, all_pages=True):
+    """主 Feed 只含最新的集數，較舊的集數依 RFC 5005 分為封存頁；內容未變更的檔案不重寫。
+    all_pages 為 False 時只產生主 Feed、最新兩頁與尚不存在的封存頁（已滿的頁內容固定，到時發布時不必重新產生）"""
+    current, pages = paginate(manifest.episodes(newest_first=True), writer.recent, writer.page_size)
+    page_paths = [archive_path(variant.feed, n) for n in range(1, len(pages) + 1)]
+    try:
+        with span('rss.write') as write_span:
+            links = {'prev-archive': feed_url(page_paths[-1])} if pages else {}
+            writer.write(variant.feed, build_feed(current, variant, links).rss_str())
+            for n, (page, path) in enumerate(zip(pages, page_paths)):
+                if not all_pages and n < len(pages) - 2 and os.path.exists(path):
+                    continue
+                links = {'current': feed_url(variant.feed)}
+                if n > 0:
+                    links['prev-archive'] = feed_url(page_paths[n - 1])
+                if n + 1 < len(pages):
+                    links['next-archive'] = feed_url(page_paths[n + 1])
+                page_feed = build_feed(list(reversed(page)), variant, links, True, feed_url(path))
+                writer.write(path, page_feed.rss_str())
+            writer.prune(variant.feed, len(pages))
+            writer.save()
+            write_span.set(bytes=writer.bytes_written, pages=len(pages))
+        log_message(f"✅ 已產生 RSS Feed：{variant.feed}（最新 {len(current)} 集，封存 {len(pages)} 頁）")
+        return True
+    except Exception as e:
+        log_message(f"❌ RSS 寫入失敗: {str(e)}", "ERROR")
+        return False
+
+def scan_dates(date_strs=None, rescan=False, config=None):
+    episodes_dir = os.path.join('docs', 'podcast')
+    if rescan:
+        from build_queue import held_dates
+        # 預先建置、尚未到發布時間的日期由建置佇列發布
+        held = held_dates(config)
+        date_strs = sorted(d for d in os.listdir(episodes_dir)
+                           if os.path.isdir(os.path.join(episodes_dir, d)) and d not in held)
+    return date_strs or [get_date_string()]
+
+def generate_rss(date_strs=None, rescan=False, variant=None, artifacts=None, sessions=None, all_pages=True,
+                 config=None):
+    """登錄指定日期（預設為今日）的新音檔後，由集數清單重建完整 RSS；rescan 時掃描所有資料夾"""
+    config = config or load_config()
+    date_strs = scan_dates(date_strs, rescan, config)
+    variant = variant or default_variant(config)
+
+    manifest = EpisodeManifest(variant.episode_manifest)
+    artifacts = artifacts or ArtifactStore(config)
+    updated = sum(update_manifest(manifest, d, artifacts, variant, sessions) for d in date_strs)
+    log_message(f"{variant.name} 集數清單：新增或更新 {updated} 集，共 {len(manifest.entries)} 集")
+
+    if not manifest.entries:
+        log_message(f"⚠️ {variant.name} 集數清單為空，RSS 未產生", "WARNING")
+        return None
+
+    store_related(manifest)
+    manifest.save()
+    return write_feeds(manifest, variant, FeedWriter(config), all_pages)
+
+def generate_feeds(date_strs=None, rescan=False, config=None, sessions=None, all_pages=True):
+    """一次產生所有語音變體的 Feed（共用日期掃描與音檔清單）；任一失敗回傳 False，全部為空回傳 None"""
+    config = config or load_config()
+    date_strs = scan_dates(date_strs, rescan, config)
+    artifacts = ArtifactStore(config)
+    results = [generate_rss(date_strs, variant=v, artifacts=artifacts, sessions=sessions, all_pages=all_pages,
+                            config=config)
+               for v in load_variants(config)]
+    if False in results:
+        return False
+    return True if True in results else None
 
 def main():
     """主函數"""
     try:
+        if generate_feeds(rescan='--rescan' in sys.argv[1:]) is False:
+            sys.exit(1)
         log_message("生成 RSS Feed 完成")
         sys.exit(0)
     except Exception as e:
@@ -107,4 +282,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,255 @@
+# scripts/instrumentation.py
+import os
+import json
+import time
+import uuid
+import atexit
+import asyncio
+import threading
+import functools
+import contextvars
+from utils import load_config, ensure_directory, log_message
+
+DEFAULT_METRICS_DIR = os.path.join('.cache', 'metrics')
+EVENTS_FILE = 'events.jsonl'
+TEXTFILE = 'podcast.prom'
+DEFAULT_MAX_MB = 50
+METRIC_PREFIX = 'daily_light'
+
+_current_span = contextvars.ContextVar('instrumentation_span', default=None)
+_recorder = None
+
+class _NoopSpan:
+    """停用時所有 span 共用的空物件，進出不做任何事"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+    def fail(self, error=None):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """一段計時區間；labels 為低基數分類（寫入 Prometheus），fields 為本次事件的附加資料（如 bytes）"""
+    __slots__ = ('recorder', 'name', 'labels', 'fields', 'id', 'parent', 'started', 'wall', 'error', '_token')
+
+    def __init__(self, recorder, name, labels):
+        self.recorder = recorder
+        self.name = name
+        self.labels = labels
+        self.fields = {}
+        self.error = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def fail(self, error=None):
+        """未拋出例外但結果為失敗時標記錯誤"""
+        self.error = str(error) if error else 'failed'
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent = parent.id if parent else None
+        self.id = uuid.uuid4().hex[:12]
+        self._token = _current_span.set(self)
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # 在不同 context 結束（例如跨 task），只需清除
+            _current_span.set(None)
+        if exc_type is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.recorder.record_span(self, seconds)
+        return False
+
+class Recorder:
+    """將事件逐行附加至 JSONL；結束時把本次執行（含子行程）的事件彙整為 Prometheus textfile"""
+
+    def __init__(self, directory, enabled=True, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.enabled = enabled
+        self.events_path = os.path.join(directory, EVENTS_FILE)
+        self.textfile_path = os.path.join(directory, TEXTFILE)
+        # 子行程沿用父行程的 run_id，結束時一併彙整
+        self.run_id = os.environ.get('METRICS_RUN_ID') or uuid.uuid4().hex[:12]
+        self.owner = 'METRICS_RUN_ID' not in os.environ
+        self.started = time.time()
+        self._owner_pid = os.getpid()
+        self._pid = None
+        self._file = None
+        self._lock = None
+        self._start_offset = 0
+        if enabled:
+            os.environ['METRICS_RUN_ID'] = self.run_id
+            ensure_directory(directory)
+            if self.owner and os.path.exists(self.events_path) and os.path.getsize(self.events_path) > max_bytes:
+                os.replace(self.events_path, f"{self.events_path}.1")
+            self._start_offset = os.path.getsize(self.events_path) if os.path.exists(self.events_path) else 0
+            if self.owner:
+                atexit.register(self.close)
+
+    def _write(self, event):
+        if self._pid != os.getpid():
+            # fork 後重新開檔與建立鎖，避免沿用父行程的狀態
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._file = open(self.events_path, 'a', encoding='utf-8', buffering=1)
+        line = json.dumps(event, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def record_span(self, span, seconds):
+        event = {'type': 'span', 'run': self.run_id, 'ts': round(span.wall, 3), 'name': span.name,
+                 'seconds': round(seconds, 6), 'id': span.id, 'parent': span.parent}
+        if span.labels:
+            event['labels'] = span.labels
+        if span.fields:
+            event['fields'] = span.fields
+        if span.error:
+            event['error'] = span.error
+        self._write(event)
+
+    def record_count(self, name, value, labels):
+        event = {'type': 'counter', 'run': self.run_id, 'ts': round(time.time(), 3), 'name': name, 'value': value}
+        if labels:
+            event['labels'] = labels
+        self._write(event)
+
+    def run_events(self):
+        """讀取本次執行寫入的事件（從啟動時的檔案位置開始）"""
+        if not os.path.exists(self.events_path):
+            return []
+        events = []
+        with open(self.events_path, 'r', encoding='utf-8') as f:
+            f.seek(self._start_offset)
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get('run') == self.run_id:
+                    events.append(event)
+        return events
+
+    def write_textfile(self):
+        spans = {}
+        counters = {}
+        for event in self.run_events():
+            key = (event['name'], tuple(sorted(event.get('labels', {}).items())))
+            if event['type'] == 'counter':
+                counters[key] = counters.get(key, 0) + event['value']
+                continue
+            stats = spans.setdefault(key, [0, 0.0, 0, 0])
+            stats[0] += 1
+            stats[1] += event['seconds']
+            stats[2] += 1 if 'error' in event else 0
+            stats[3] += event.get('fields', {}).get('bytes') or 0
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_span_seconds Time spent in instrumented spans.",
+            f"# TYPE {METRIC_PREFIX}_span_seconds summary",
+        ]
+        for (name, labels), (calls, seconds, _, _) in sorted(spans.items()):
+            lines.append(f"{METRIC_PREFIX}_span_seconds_sum{_labels(name, labels)} {seconds:.6f}")
+            lines.append(f"{METRIC_PREFIX}_span_seconds_count{_labels(name, labels)} {calls}")
+        lines += [f"# HELP {METRIC_PREFIX}_span_errors_total Spans that raised or were marked failed.",
+                  f"# TYPE {METRIC_PREFIX}_span_errors_total counter"]
+        lines += [f"{METRIC_PREFIX}_span_errors_total{_labels(name, labels)} {stats[2]}"
+                  for (name, labels), stats in sorted(spans.items())]
+        lines += [f"# HELP {METRIC_PREFIX}_span_bytes_total Bytes reported by spans.",
+                  f"# TYPE {METRIC_PREFIX}_span_bytes_total counter"]
+        lines += [f"{METRIC_PREFIX}_span_bytes_total{_labels(name, labels)} {stats[3]}"
+                  for (name, labels), stats in sorted(spans.items()) if stats[3]]
+        lines += [f"# HELP {METRIC_PREFIX}_events_total Counted events (cache hits, retries, skipped uploads).",
+                  f"# TYPE {METRIC_PREFIX}_events_total counter"]
+        lines += [f"{METRIC_PREFIX}_events_total{_labels(name, labels, 'event')} {value}"
+                  for (name, labels), value in sorted(counters.items())]
+        lines += [f"# HELP {METRIC_PREFIX}_run_timestamp_seconds Start time of the last run.",
+                  f"# TYPE {METRIC_PREFIX}_run_timestamp_seconds gauge",
+                  f"{METRIC_PREFIX}_run_timestamp_seconds {self.started:.0f}",
+                  f"# HELP {METRIC_PREFIX}_run_duration_seconds Wall time of the last run.",
+                  f"# TYPE {METRIC_PREFIX}_run_duration_seconds gauge",
+                  f"{METRIC_PREFIX}_run_duration_seconds {time.time() - self.started:.3f}"]
+
+        # node_exporter 的 textfile collector 要求原子替換
+        tmp_path = f"{self.textfile_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.textfile_path)
+        return self.textfile_path
+
+    def close(self):
+        if self._file is not None and self._pid == os.getpid():
+            self._file.close()
+            self._file = None
+            self._pid = None
+        if self.owner and os.getpid() == self._owner_pid:
+            try:
+                self.write_textfile()
+            except Exception as e:
+                log_message(f"寫入指標檔失敗: {str(e)}", "WARNING")
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(name, labels, kind='span'):
+    pairs = [(kind, name)] + list(labels)
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+def get_recorder():
+    """依環境變量 METRICS（1/0）與 METRICS_DIR，或 config 的 metrics 區塊建立全域記錄器"""
+    global _recorder
+    if _recorder is None:
+        try:
+            metrics_config = load_config().get('metrics', {})
+        except Exception:
+            metrics_config = {}
+        enabled = os.environ.get('METRICS', '1' if metrics_config.get('enabled', False) else '0') == '1'
+        directory = os.environ.get('METRICS_DIR', metrics_config.get('dir', DEFAULT_METRICS_DIR))
+        max_bytes = int(float(metrics_config.get('max_mb', DEFAULT_MAX_MB)) * 1024 * 1024)
+        _recorder = Recorder(directory, enabled, max_bytes)
+    return _recorder
+
+def span(name, **labels):
+    """計時區間的 context manager；停用時回傳共用的空物件"""
+    recorder = _recorder or get_recorder()
+    if not recorder.enabled:
+        return NOOP_SPAN
+    return Span(recorder, name, labels)
+
+def count(name, value=1, **labels):
+    recorder = _recorder or get_recorder()
+    if recorder.enabled:
+        recorder.record_count(name, value, labels)
+
+def timed(name=None, **labels):
+    """將函數（含 async）整體包在 span 中的裝飾器"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,255 @@
+# scripts/mp3_tools.py
+import os
+import struct
+
+# Layer III 位元率表（kbps），索引 0 為 free format
+BITRATES = {
+    'mpeg1': (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    'mpeg2': (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+# global_gain 每一級代表 1.5 dB
+GAIN_STEP_DB = 1.5
+XING_FLAGS = 0x0007  # frames、bytes、TOC
+
+class FrameHeader:
+    """MPEG Layer III 音框標頭，只解析拼接與調整增益需要的欄位"""
+    __slots__ = ('raw', 'version', 'mpeg1', 'protected', 'bitrate', 'sample_rate', 'padding',
+                 'channels', 'size', 'samples', 'side_info_size')
+
+    def __init__(self, raw):
+        self.raw = raw
+        if raw >> 21 != 0x7FF:
+            raise ValueError("缺少同步字")
+        self.version = (raw >> 19) & 3
+        if self.version == 1 or (raw >> 17) & 3 != 1:
+            raise ValueError("僅支援 MPEG Layer III")
+        self.mpeg1 = self.version == 3
+        self.protected = not (raw >> 16) & 1
+        bitrate_index = (raw >> 12) & 15
+        sample_rate_index = (raw >> 10) & 3
+        if bitrate_index in (0, 15) or sample_rate_index == 3:
+            raise ValueError("無效的位元率或取樣率")
+        self.bitrate = BITRATES['mpeg1' if self.mpeg1 else 'mpeg2'][bitrate_index]
+        self.sample_rate = SAMPLE_RATES[self.version][sample_rate_index]
+        self.padding = (raw >> 9) & 1
+        self.channels = 1 if (raw >> 6) & 3 == 3 else 2
+        self.samples = 1152 if self.mpeg1 else 576
+        self.size = (144 if self.mpeg1 else 72) * self.bitrate * 1000 // self.sample_rate + self.padding
+        if self.mpeg1:
+            self.side_info_size = 17 if self.channels == 1 else 32
+        else:
+            self.side_info_size = 9 if self.channels == 1 else 17
+
+    @property
+    def data_offset(self):
+        """旁資訊（side info）在音框內的起點"""
+        return 6 if self.protected else 4
+
+    def gain_bit_offsets(self):
+        """各 granule／聲道 global_gain 欄位相對於旁資訊起點的位元位置"""
+        if self.mpeg1:
+            # main_data_begin 9 + private_bits + 每聲道 scfsi 4，之後每個 granule/聲道 59 位元
+            base = 9 + (5 if self.channels == 1 else 3) + 4 * self.channels
+            return [base + i * 59 + 21 for i in range(2 * self.channels)]
+        # MPEG-2/2.5 只有一個 granule：main_data_begin 8 + private_bits，每聲道 63 位元
+        base = 8 + (1 if self.channels == 1 else 2)
+        return [base + ch * 63 + 21 for ch in range(self.channels)]
+
+    def compatible(self, other):
+        return (self.version, self.sample_rate, self.channels) == (other.version, other.sample_rate, other.channels)
+
+def _id3v2_size(data):
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+    # footer 旗標
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+class MP3File:
+    """MP3 音框清單；略過 ID3v2/ID3v1 標籤，並移除既有的 Xing/Info/VBRI 標頭音框"""
+
+    def __init__(self, data):
+        self.data = data if isinstance(data, bytearray) else bytearray(data)
+        self.frames = []     # [(offset, FrameHeader)]
+        self._parse()
+        if not self.frames:
+            raise ValueError("找不到任何 MP3 音框")
+        self.header = self.frames[0][1]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def _parse(self):
+        data = self.data
+        end = len(data)
+        if end >= 128 and data[end - 128:end - 125] == b'TAG':
+            end -= 128
+        pos = _id3v2_size(data)
+        headers = {}
+        while pos + 4 <= end:
+            raw = struct.unpack_from('>I', data, pos)[0]
+            header = headers.get(raw)
+            if header is None:
+                try:
+                    header = headers[raw] = FrameHeader(raw)
+                except ValueError:
+                    header = headers[raw] = False
+            if header and pos + header.size <= end:
+                self.frames.append((pos, header))
+                pos += header.size
+            else:
+                # 失去同步時往後搜尋下一個 0xFF
+                next_sync = data.find(b'\xff', pos + 1, end)
+                if next_sync < 0:
+                    break
+                pos = next_sync
+
+        if self.frames and self._is_info_frame(*self.frames[0]):
+            self.frames.pop(0)
+
+    def _is_info_frame(self, offset, header):
+        tag_offset = offset + header.data_offset + header.side_info_size
+        if bytes(self.data[tag_offset:tag_offset + 4]) in (b'Xing', b'Info'):
+            return True
+        return bytes(self.data[offset + 36:offset + 40]) == b'VBRI'
+
+    def frame_bytes(self, index):
+        offset, header = self.frames[index]
+        return self.data[offset:offset + header.size]
+
+    @property
+    def duration(self):
+        return len(self.frames) * self.header.samples / self.header.sample_rate
+
+    def main_data_begin(self, index):
+        offset, header = self.frames[index]
+        start = offset + header.data_offset
+        if header.mpeg1:
+            return (self.data[start] << 1) | (self.data[start + 1] >> 7)
+        return self.data[start]
+
+    def global_gains(self):
+        """回傳所有非靜音 granule 的 global_gain"""
+        gains = []
+        for offset, header in self.frames:
+            start = (offset + header.data_offset) * 8
+            for bit in header.gain_bit_offsets():
+                gain = _read_bits(self.data, start + bit, 8)
+                # part2_3_length 為 0 的 granule 沒有音訊資料
+                if _read_bits(self.data, start + bit - 21, 12):
+                    gains.append(gain)
+        return gains
+
+    def apply_gain(self, steps):
+        """mp3gain 作法：直接增減每個 granule 的 global_gain（每級 1.5 dB），不需重新編碼；回傳被截斷的 granule 數"""
+        if not steps:
+            return 0
+        clipped = 0
+        for offset, header in self.frames:
+            start = (offset + header.data_offset) * 8
+            for bit in header.gain_bit_offsets():
+                gain = _read_bits(self.data, start + bit, 8) + steps
+                if gain < 0 or gain > 255:
+                    clipped += 1
+                    gain = min(255, max(0, gain))
+                _write_bits(self.data, start + bit, 8, gain)
+            if header.protected:
+                _update_crc(self.data, offset, header)
+        return clipped
+
+    def silence_frame(self, index):
+        """將音框的 part2_3_length 與 global_gain 歸零，使其解碼為靜音（用於拼接點位元儲存槽不連續時）"""
+        offset, header = self.frames[index]
+        start = (offset + header.data_offset) * 8
+        main_data_bits = 9 if header.mpeg1 else 8
+        _write_bits(self.data, start, main_data_bits, 0)
+        for bit in header.gain_bit_offsets():
+            _write_bits(self.data, start + bit - 21, 12, 0)
+            _write_bits(self.data, start + bit, 8, 0)
+        if header.protected:
+            _update_crc(self.data, offset, header)
+
+# ===== 位元操作 =====
+def _read_bits(data, bit_offset, count):
+    byte = bit_offset >> 3
+    chunk = int.from_bytes(data[byte:byte + 3], 'big')
+    shift = 24 - (bit_offset & 7) - count
+    return (chunk >> shift) & ((1 << count) - 1)
+
+def _write_bits(data, bit_offset, count, value):
+    byte = bit_offset >> 3
+    chunk = int.from_bytes(data[byte:byte + 3], 'big')
+    shift = 24 - (bit_offset & 7) - count
+    mask = ((1 << count) - 1) << shift
+    chunk = (chunk & ~mask) | ((value << shift) & mask)
+    data[byte:byte + 3] = chunk.to_bytes(3, 'big')
+
+def _crc16(data, crc=0xFFFF):
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005 if crc & 0x8000 else crc << 1) & 0xFFFF
+    return crc
+
+def _update_crc(data, offset, header):
+    """CRC 涵蓋標頭後兩個位元組與旁資訊"""
+    crc = _crc16(data[offset + 2:offset + 4])
+    crc = _crc16(data[offset + 6:offset + 6 + header.side_info_size], crc)
+    data[offset + 4:offset + 6] = crc.to_bytes(2, 'big')
+
+# ===== 拼接與 Xing 標頭 =====
+def build_info_frame(template, frame_offsets, stream_bytes, cbr):
+    """以 template 的版本／取樣率／聲道建立 Xing（VBR）或 Info（CBR）標頭音框；frame_offsets 為各音框在音訊資料中的位移"""
+    needed = 4 + template.side_info_size + 4 + 4 + 4 + 4 + 100
+    table = BITRATES['mpeg1' if template.mpeg1 else 'mpeg2']
+    # 沿用原始位元率；容量不足時改用足以容納的最小位元率
+    for bitrate in [template.bitrate] + [b for b in table[1:] if b > template.bitrate]:
+        raw = (template.raw & ~((15 << 12) | (1 << 9))) | (1 << 16) | (table.index(bitrate) << 12)
+        header = FrameHeader(raw)
+        if header.size >= needed:
+            break
+
+    frame_count = len(frame_offsets)
+    total = stream_bytes + header.size
+    # TOC：播放進度每 1% 對應的檔案位置（以 1/256 為單位），位移需包含標頭音框本身
+    toc = bytes(min(255, (header.size + frame_offsets[min(frame_count - 1, i * frame_count // 100)]) * 256 // total)
+                for i in range(100))
+    frame = bytearray(header.size)
+    struct.pack_into('>I', frame, 0, header.raw)
+    tag_offset = 4 + header.side_info_size
+    frame[tag_offset:tag_offset + 4] = b'Info' if cbr else b'Xing'
+    struct.pack_into('>III', frame, tag_offset + 4, XING_FLAGS, frame_count, total)
+    frame[tag_offset + 16:tag_offset + 116] = toc
+    return bytes(frame)
+
+def splice(files):
+    """依序串接多個 MP3File 的音框（不重新編碼），回傳含 Xing/Info 標頭的完整位元組"""
+    template = files[0].header
+    for mp3 in files[1:]:
+        if not mp3.header.compatible(template):
+            raise ValueError(f"音檔格式不一致: {mp3.header.sample_rate} Hz／{mp3.header.channels} 聲道，"
+                             f"需為 {template.sample_rate} Hz／{template.channels} 聲道")
+
+    chunks = []
+    offsets = []
+    bitrates = set()
+    position = 0
+    for mp3 in files:
+        # 每個檔案的第一個音框若引用前一檔案的位元儲存槽，解碼會出現雜音，改為靜音
+        if mp3.main_data_begin(0):
+            mp3.silence_frame(0)
+        for offset, header in mp3.frames:
+            offsets.append(position)
+            bitrates.add(header.bitrate)
+            chunks.append(mp3.data[offset:offset + header.size])
+            position += header.size
+    return build_info_frame(template, offsets, position, cbr=len(bitrates) == 1) + b''.join(chunks)
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
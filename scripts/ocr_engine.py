@@ -0,0 +1,232 @@
+# scripts/ocr_engine.py
+import os
+import json
+import hashlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from utils import load_config, ensure_directory, log_message
+
+DEFAULT_ENGINE = 'paddle'
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'ocr')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+ENGINE_MODULES = {'paddle': 'paddleocr', 'cnocr': 'cnocr', 'tesseract': 'pytesseract'}
+# 版面分析時的工作解析度（長邊像素），辨識時仍由原圖裁切
+ANALYSIS_SIZE = 2000
+
+# ===== 版面分析 =====
+def load_page(image_path):
+    """讀取並依 EXIF 轉正，回傳灰階 numpy 陣列"""
+    import numpy as np
+    from PIL import Image, ImageOps
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img).convert('L')
+        return np.asarray(img)
+
+def ink_mask(gray):
+    """以局部背景亮度做自適應二值化，避免翻拍照片的光線漸層被當成文字"""
+    import numpy as np
+    from PIL import Image, ImageFilter
+    background = Image.fromarray(gray).filter(ImageFilter.BoxBlur(max(8, min(gray.shape) // 40)))
+    return gray.astype(np.float32) < np.asarray(background, dtype=np.float32) * 0.75
+
+def find_runs(profile, threshold, min_gap, min_length):
+    """回傳 profile 高於門檻的連續區段 [(start, end)]，間隔小於 min_gap 者合併"""
+    runs = []
+    start = None
+    for i, value in enumerate(profile):
+        if value > threshold and start is None:
+            start = i
+        elif value <= threshold and start is not None:
+            runs.append([start, i])
+            start = None
+    if start is not None:
+        runs.append([start, len(profile)])
+
+    merged = []
+    for run in runs:
+        if merged and run[0] - merged[-1][1] < min_gap:
+            merged[-1][1] = run[1]
+        else:
+            merged.append(run)
+    return [(s, e) for s, e in merged if e - s >= min_length]
+
+def split_halves(mask):
+    """在頁面中段找最寬的空白橫帶，切成上半（晨）與下半（晚）"""
+    height = mask.shape[0]
+    rows = mask.mean(axis=1)
+    low, high = int(height * 0.3), int(height * 0.7)
+    best, best_len, start = height // 2, 0, None
+    for y in range(low, high):
+        if rows[y] < 0.01:
+            start = y if start is None else start
+            if y - start + 1 > best_len:
+                best_len, best = y - start + 1, (start + y) // 2
+        else:
+            start = None
+    return best
+
+def split_columns(mask):
+    """垂直投影切出直書欄位，依閱讀順序（由右至左）回傳 [(x0, x1, y0, y1)]"""
+    import numpy as np
+    height, width = mask.shape
+    profile = np.convolve(mask.mean(axis=0), np.ones(3) / 3, mode='same')
+    runs = find_runs(profile, 0.01, max(2, width // 300), max(3, width // 150))
+    if not runs:
+        return []
+    # 過寬的區段多為頁緣陰影或裝訂處
+    median_width = sorted(e - s for s, e in runs)[len(runs) // 2]
+    columns = []
+    for x0, x1 in runs:
+        if x1 - x0 > median_width * 2.5 or x0 == 0 or x1 == width:
+            continue
+        ink_rows = np.nonzero(mask[:, x0:x1].any(axis=1))[0]
+        if len(ink_rows) == 0:
+            continue
+        # 幾乎全黑的細長區段是裝訂線陰影，不是文字
+        if mask[ink_rows[0]:ink_rows[-1] + 1, x0:x1].mean() > 0.6:
+            continue
+        columns.append((x0, x1, int(ink_rows[0]), int(ink_rows[-1]) + 1))
+    return sorted(columns, key=lambda c: -c[0])
+
+def analyze_page(gray):
+    """回傳 {'morning': [欄位影像...], 'evening': [...]}，欄位影像為原解析度灰階陣列"""
+    import numpy as np
+    from PIL import Image
+    height, width = gray.shape
+    scale = min(1.0, ANALYSIS_SIZE / max(height, width))
+    small = gray if scale == 1.0 else np.asarray(
+        Image.fromarray(gray).resize((int(width * scale), int(height * scale))))
+    mask = ink_mask(small)
+    middle = split_halves(mask)
+    pad = max(2, int(4 / scale))
+
+    halves = {}
+    for session, (top, bottom) in (('morning', (0, middle)), ('evening', (middle, mask.shape[0]))):
+        crops = []
+        for x0, x1, y0, y1 in split_columns(mask[top:bottom]):
+            X0, X1 = max(0, int(x0 / scale) - pad), min(width, int(x1 / scale) + pad)
+            Y0, Y1 = max(0, int((y0 + top) / scale) - pad), min(height, int((y1 + top) / scale) + pad)
+            crops.append(gray[Y0:Y1, X0:X1].copy())
+        halves[session] = crops
+    return halves
+
+def reflow_column(column):
+    """將直書欄位依字元切開後橫向排列，讓橫書辨識模型看到正立的字"""
+    import numpy as np
+    mask = ink_mask(column) if column.size else column
+    rows = mask.mean(axis=1)
+    glyphs = find_runs(rows, 0.0, max(1, column.shape[1] // 12), 1)
+    if len(glyphs) <= 1:
+        return column
+    size = column.shape[1]
+    canvas = np.full((size, size * len(glyphs) + size // 2 * (len(glyphs) - 1)), 255, dtype=np.uint8)
+    x = 0
+    for y0, y1 in glyphs:
+        glyph = column[y0:min(y1, y0 + size)]
+        offset = (size - glyph.shape[0]) // 2
+        canvas[offset:offset + glyph.shape[0], x:x + size] = glyph
+        x += size + size // 2
+    return canvas
+
+# ===== 辨識（每個工作行程只載入一次模型） =====
+_recognizer = None
+
+def _init_worker(engine):
+    global _recognizer
+    if engine == 'paddle':
+        from paddleocr import PaddleOCR
+        model = PaddleOCR(lang='chinese_cht', use_angle_cls=False, show_log=False)
+
+        def recognize(column):
+            result = model.ocr(reflow_column(column), det=False, cls=False)
+            text, score = result[0][0] if result and result[0] else ('', 0.0)
+            return text, float(score)
+    elif engine == 'cnocr':
+        from cnocr import CnOcr
+        model = CnOcr(rec_model_name='chinese_cht_PP-OCRv3')
+
+        def recognize(column):
+            result = model.ocr_for_single_line(reflow_column(column))
+            return result['text'], float(result['score'])
+    elif engine == 'tesseract':
+        import pytesseract
+
+        def recognize(column):
+            # chi_tra_vert 可直接辨識直書欄位
+            data = pytesseract.image_to_data(column, lang='chi_tra_vert', config='--psm 5',
+                                             output_type=pytesseract.Output.DICT)
+            words = [(w, float(c)) for w, c in zip(data['text'], data['conf']) if w.strip() and float(c) >= 0]
+            text = ''.join(w for w, _ in words)
+            score = sum(c for _, c in words) / len(words) / 100 if words else 0.0
+            return text, score
+    else:
+        raise ValueError(f"未知的 OCR 引擎: {engine}")
+    _recognizer = recognize
+
+def _recognize_column(column):
+    return _recognizer(column)
+
+class OCREngine:
+    """直書頁面 OCR：版面分析切欄後以行程池並行辨識，結果依影像雜湊快取"""
+
+    def __init__(self, engine=None, workers=None, cache_dir=None, config=None):
+        ocr_config = (config or load_config()).get('ocr', {})
+        self.engine = engine or os.environ.get('OCR_ENGINE', ocr_config.get('engine', DEFAULT_ENGINE))
+        self.workers = workers or int(ocr_config.get('workers', os.cpu_count() or 1))
+        self.cache_dir = cache_dir or ocr_config.get('cache_dir', DEFAULT_CACHE_DIR)
+        self._pool = None
+        module = ENGINE_MODULES.get(self.engine)
+        if module is None:
+            raise ValueError(f"未知的 OCR 引擎: {self.engine}")
+        if importlib.util.find_spec(module) is None:
+            raise ImportError(f"OCR 引擎 {self.engine} 需要安裝 {module}")
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.engine,))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _cache_path(self, image_path):
+        sha256 = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(block)
+        return os.path.join(self.cache_dir, f"{self.engine}-{sha256.hexdigest()}.json")
+
+    def recognize_page(self, image_path):
+        """回傳 {'morning': 文字, 'evening': 文字, 'confidence': {...}, 'columns': 欄數}"""
+        cache_path = self._cache_path(image_path)
+        if os.path.exists(cache_path):
+            log_message(f"OCR 快取命中: {image_path}")
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        log_message(f"開始 OCR（{self.engine}，{self.workers} 個工作行程）: {image_path}")
+        halves = analyze_page(load_page(image_path))
+        pool = self._get_pool()
+        result = {'morning': '', 'evening': '', 'confidence': {}, 'columns': 0}
+        for session, columns in halves.items():
+            recognized = list(pool.map(_recognize_column, columns))
+            result[session] = '\n'.join(text for text, _ in recognized if text)
+            scores = [score for text, score in recognized if text]
+            result['confidence'][session] = round(sum(scores) / len(scores), 4) if scores else 0.0
+            result['columns'] += len(columns)
+
+        ensure_directory(self.cache_dir)
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False)
+        log_message(f"OCR 完成: {result['columns']} 欄，信心度 {result['confidence']}")
+        return result
+
+def find_page_image(date_str, img_dir=os.path.join('docs', 'img')):
+    """尋找 docs/img/MMDD.jpg（或 .png）"""
+    for ext in IMAGE_EXTENSIONS:
+        path = os.path.join(img_dir, f"{date_str}{ext}")
+        if os.path.exists(path) and os.path.getsize(path) > 1024:
+            return path
+    return None
@@ -2,19 +2,92 @@ import os
 import re
 import sys
 from utils import load_config, get_date_string, ensure_directory, get_taiwan_time, log_message
+from ocr_engine import OCREngine, find_page_image
+from text_align import align_session
+from instrumentation import span
 
 class OCRImageToText:
-    def __init__(self):
-        self.config = load_config()
-        self.output_dir = os.path.join('docs', 'podcast', get_date_string())
+    def __init__(self, date_str=None, config=None, engine=None):
+        self.config = config or load_config()
+        self.date_str = date_str or get_date_string()
+        self.output_dir = os.path.join('docs', 'podcast', self.date_str)
         ensure_directory(self.output_dir)
-        self.input_text_path = os.path.join('docs', 'img', f'{get_date_string()}.txt')
+        self.input_text_path = os.path.join('docs', 'img', f'{self.date_str}.txt')
+        self.image_path = find_page_image(self.date_str)
+        self.ocr_enabled = self.config.get('ocr', {}).get('enabled', True)
+        # 可由呼叫端傳入常駐的 OCREngine，避免重複載入模型
+        self.engine = engine
+
+    def run_ocr(self):
+        """辨識 docs/img/MMDD.jpg，將晨、晚兩段 OCR 結果寫入 ocr_morning.txt / ocr_evening.txt"""
+        if not self.image_path or not self.ocr_enabled:
+            return None
+        engine = self.engine
+        try:
+            if engine is None:
+                engine = OCREngine(config=self.config)
+            with span('ocr.recognize'):
+                result = engine.recognize_page(self.image_path)
+        except Exception as e:
+            log_message(f"OCR 辨識失敗: {str(e)}", "WARNING")
+            return None
+        finally:
+            if self.engine is None and engine is not None:
+                engine.close()
+
+        for session in ('morning', 'evening'):
+            with open(os.path.join(self.output_dir, f'ocr_{session}.txt'), 'w', encoding='utf-8') as f:
+                f.write(result[session])
+        return result
+
+    def write_sessions(self, morning_text, evening_text):
+        """保存晨間、晚間分段文件，內容為空時寫入'今日無內容'"""
+        if not morning_text:
+            log_message("未找到晨間內容，寫入'今日無內容'", "WARNING")
+            morning_text = "今日無內容"
+        else:
+            log_message(f"晨間內容: {morning_text[:50]}...")
 
-    def process_text(self):
-        """處理校正稿並分割為晨間和晚間內容，基於空行"""
+        if not evening_text:
+            log_message("未找到晚間內容，寫入'今日無內容'", "WARNING")
+            evening_text = "今日無內容"
+        else:
+            log_message(f"晚間內容: {evening_text[:50]}...")
+
+        morning_file = os.path.join(self.output_dir, 'morning.txt')
+        evening_file = os.path.join(self.output_dir, 'evening.txt')
+        with open(morning_file, 'w', encoding='utf-8') as f:
+            f.write(morning_text)
+        with open(evening_file, 'w', encoding='utf-8') as f:
+            f.write(evening_text)
+
+    def align_with_ocr(self, session, draft):
+        """將 OCR 結果對齊校正稿，差異處以校正稿為準，並寫出 align_{session}.json/.txt 報告"""
+        if not draft:
+            return draft
+        try:
+            result = align_session(self.output_dir, self.date_str, session, draft)
+        except Exception as e:
+            log_message(f"{session} 對齊失敗: {str(e)}", "WARNING")
+            return draft
+        if result is None:
+            return draft
+        low = sum(1 for s in result['segments'] if s['confidence'] < 0.8)
+        log_message(f"{session} OCR 與校正稿相似度 {result['similarity']:.1%}，"
+                    f"差異 {len(result['differences'])} 處，低信心句子 {low} 句")
+        for missing in result['possibly_missing']:
+            log_message(f"{session} 校正稿可能漏打: {missing[:30]}...", "WARNING")
+        return result['corrected']
+
+    def process_text(self, ocr_result=None):
+        """處理校正稿並分割為晨間和晚間內容，基於空行；沒有校正稿時改用 OCR 結果"""
         try:
             log_message(f"開始處理校正稿: {self.input_text_path}")
             if not os.path.exists(self.input_text_path):
+                if ocr_result:
+                    log_message(f"校正稿 {self.input_text_path} 不存在，改用 OCR 結果", "WARNING")
+                    self.write_sessions(ocr_result['morning'].strip(), ocr_result['evening'].strip())
+                    return True
                 log_message(f"校正稿 {self.input_text_path} 不存在", "ERROR")
                 return False
 
@@ -43,27 +116,12 @@ class OCRImageToText:
 
             morning_text = '\n'.join(morning_text).strip()
             evening_text = '\n'.join(evening_text).strip()
-
-            if not morning_text:
-                log_message("未找到晨間內容，寫入'今日無內容'", "WARNING")
-                morning_text = "今日無內容"
-            else:
-                log_message(f"晨間內容: {morning_text[:50]}...")
-
-            if not evening_text:
-                log_message("未找到晚間內容，寫入'今日無內容'", "WARNING")
-                evening_text = "今日無內容"
-            else:
-                log_message(f"晚間內容: {evening_text[:50]}...")
+            if ocr_result:
+                morning_text = self.align_with_ocr('morning', morning_text)
+                evening_text = self.align_with_ocr('evening', evening_text)
 
             # 保存分段文件
-            morning_file = os.path.join(self.output_dir, 'morning.txt')
-            evening_file = os.path.join(self.output_dir, 'evening.txt')
-            with open(morning_file, 'w', encoding='utf-8') as f:
-                f.write(morning_text)
-            with open(evening_file, 'w', encoding='utf-8') as f:
-                f.write(evening_text)
-
+            self.write_sessions(morning_text, evening_text)
             return True
 
         except Exception as e:
@@ -73,8 +131,9 @@ class OCRImageToText:
     def run(self):
         """主運行邏輯"""
         try:
+            ocr_result = self.run_ocr()
             log_message("開始處理校正稿...")
-            success = self.process_text()
+            success = self.process_text(ocr_result)
             if success:
                 log_message("校正稿處理完成")
             else:
@@ -0,0 +1,204 @@
+# scripts/pipeline.py
+import os
+import sys
+import time
+import asyncio
+import argparse
+from utils import load_config, get_date_string, log_message
+from instrumentation import span
+
+class Stage:
+    def __init__(self, name, func, deps=(), require_success=True):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        # False 時只要相依階段結束（不論成敗）即執行，例如 RSS
+        self.require_success = require_success
+        self.status = 'pending'
+        self.started = None
+        self.seconds = None
+
+class Pipeline:
+    """單一行程內以 DAG 執行 OCR → TTS → B2 → RSS：設定只載入一次、共用一個 B2 連線，
+    相依已滿足的階段立即開始（晨間上傳不必等晚間合成），各套件於階段內才載入"""
+
+    def __init__(self, date_str=None, skip=(), config=None, shared=None):
+        self.config = config or load_config()
+        self.date_str = date_str or get_date_string()
+        self.skip = set(skip)
+        if 'b2' in self.skip:
+            self.skip.update({'upload_text', 'upload_morning', 'upload_evening'})
+        from build_queue import is_future
+        if 'rss' not in self.skip and is_future(self.date_str, self.config):
+            # 未來日期只預先建置，到預定時間由 build_queue.py publish 加入 Feed
+            log_message(f"{self.date_str} 尚未到發布日期，略過 rss 階段", "WARNING")
+            self.skip.add('rss')
+        self.state = {}
+        # 與日期無關、可跨次執行保留的資源（B2 連線、OCR 引擎、後製器），watch 模式下由常駐行程傳入
+        self.shared = shared if shared is not None else {}
+        self.stages = {}
+        self._tasks = {}
+        self._t0 = None
+        self.stream_upload = os.environ.get(
+            'TTS_STREAM_UPLOAD', '1' if self.config.get('tts', {}).get('stream_upload') else '0') == '1'
+        self.build()
+
+    def add(self, name, func, deps=(), require_success=True):
+        self.stages[name] = Stage(name, func, deps, require_success)
+
+    def build(self):
+        tts_deps = ('ocr', 'b2') if self.stream_upload else ('ocr',)
+        self.add('ocr', self.run_ocr)
+        self.add('b2', self.connect_b2)
+        self.add('tts_morning', lambda: self.run_tts('morning'), tts_deps)
+        self.add('tts_evening', lambda: self.run_tts('evening'), tts_deps)
+        self.add('upload_text', self.upload_text, ('ocr', 'b2'))
+        self.add('audio_morning', lambda: self.postprocess('morning'), ('tts_morning',))
+        self.add('audio_evening', lambda: self.postprocess('evening'), ('tts_evening',))
+        self.add('upload_morning', lambda: self.upload_audio('morning'), ('audio_morning', 'b2'))
+        self.add('upload_evening', lambda: self.upload_audio('evening'), ('audio_evening', 'b2'))
+        self.add('rss', self.run_rss, ('upload_morning', 'upload_evening'), require_success=False)
+
+    # ===== 各階段 =====
+    async def run_ocr(self):
+        from ocr_image_to_text import OCRImageToText
+        ocr = OCRImageToText(self.date_str, config=self.config, engine=self.shared.get('ocr_engine'))
+        return await asyncio.to_thread(ocr.run)
+
+    async def connect_b2(self):
+        from upload_to_b2 import B2Uploader
+        uploader = self.shared.get('uploader')
+        if uploader is None:
+            try:
+                uploader = await asyncio.to_thread(B2Uploader, self.date_str, None, self.config)
+            except SystemExit:
+                return False
+            self.shared['uploader'] = uploader
+        self.state['uploader'] = uploader
+        self.state['remote_files'] = await asyncio.to_thread(uploader.list_remote, self.date_str)
+        return True
+
+    def get_tts(self):
+        if 'tts' not in self.state:
+            from text_to_speech_edge import VariantSynthesizer
+            # 所有語音變體共用一次文字正規化與同一個並行上限
+            self.state['tts'] = VariantSynthesizer(self.date_str, uploader=self.state.get('uploader'), config=self.config)
+        return self.state['tts']
+
+    async def run_tts(self, session):
+        return await self.get_tts().synthesize_session(session)
+
+    def get_postprocessor(self):
+        if 'audio' not in self.shared:
+            from audio_postprocess import AudioPostProcessor
+            self.shared['audio'] = AudioPostProcessor(self.config)
+        return self.shared['audio']
+
+    async def postprocess(self, session):
+        processor = self.get_postprocessor()
+        return await asyncio.to_thread(processor.process_date, self.date_str, (session,))
+
+    async def remote_files(self, variant=None):
+        """預設變體的遠端列表於連線時取得，其他變體在首次上傳時列舉"""
+        if variant is None or variant.primary:
+            return self.state['remote_files']
+        key = f'remote_files_{variant.name}'
+        if key not in self.state:
+            self.state[key] = await asyncio.to_thread(self.state['uploader'].list_remote, self.date_str, variant)
+        return self.state[key]
+
+    async def upload_files(self, names):
+        uploader = self.state['uploader']
+        results = await asyncio.gather(*(
+            asyncio.to_thread(uploader.upload_file, name, name, self.date_str, self.state['remote_files'])
+            for name in names
+        ))
+        return all(results)
+
+    async def upload_text(self):
+        return await self.upload_files(['morning.txt', 'evening.txt'])
+
+    async def upload_audio(self, session):
+        uploader = self.state['uploader']
+        variants = self.get_postprocessor().variants
+        if self.stream_upload and not self.get_postprocessor().enabled:
+            # 已於合成時串流上傳；後製改寫過的音檔則需重新上傳
+            for variant in variants:
+                await asyncio.to_thread(uploader.record_artifact, self.date_str, variant.audio_name(session), variant)
+            return True
+        remote_files = [await self.remote_files(variant) for variant in variants]
+        results = await asyncio.gather(*(
+            asyncio.to_thread(uploader.upload_file, variant.audio_name(session), f'{session}.mp3', self.date_str,
+                              remote, variant)
+            for variant, remote in zip(variants, remote_files)
+        ))
+        return all(results)
+
+    async def run_rss(self):
+        from generate_rss import generate_feeds
+        return await asyncio.to_thread(generate_feeds, [self.date_str], False, self.config) is not False
+
+    # ===== 排程 =====
+    async def _run_stage(self, stage):
+        dep_stages = [self.stages[d] for d in stage.deps if d in self.stages]
+        await asyncio.gather(*(self._tasks[d.name] for d in dep_stages))
+        if stage.name in self.skip:
+            stage.status = 'skipped'
+            return
+        if stage.require_success and any(d.status not in ('ok', 'skipped') for d in dep_stages):
+            stage.status = 'blocked'
+            log_message(f"階段 {stage.name} 因相依階段未成功而略過", "WARNING")
+            return
+
+        stage.started = time.perf_counter()
+        with span('stage', stage=stage.name) as stage_span:
+            error = None
+            try:
+                ok = await stage.func()
+            except Exception as e:
+                log_message(f"階段 {stage.name} 失敗: {str(e)}", "ERROR")
+                ok, error = False, e
+            if not ok:
+                stage_span.fail(error)
+        stage.seconds = time.perf_counter() - stage.started
+        stage.status = 'ok' if ok else 'failed'
+
+    async def run(self):
+        self._t0 = time.perf_counter()
+        log_message(f"開始執行 pipeline（{self.date_str}）...")
+        with span('pipeline'):
+            for name, stage in self.stages.items():
+                self._tasks[name] = asyncio.ensure_future(self._run_stage(stage))
+            await asyncio.gather(*self._tasks.values())
+        if 'tts' in self.state:
+            self.state['tts'].log_stats()
+        self.report()
+        return all(s.status in ('ok', 'skipped') for s in self.stages.values())
+
+    def report(self):
+        log_message("===== 各階段耗時 =====")
+        for stage in self.stages.values():
+            if stage.seconds is None:
+                log_message(f"{stage.name:<15} {stage.status}")
+            else:
+                offset = stage.started - self._t0
+                log_message(f"{stage.name:<15} {stage.status:<7} 開始 +{offset:6.2f}s  耗時 {stage.seconds:6.2f}s")
+        log_message(f"總耗時 {time.perf_counter() - self._t0:.2f}s")
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="在單一行程內執行完整 podcast 流程")
+    parser.add_argument('--date', help="處理日期 MMDD，預設今日")
+    parser.add_argument('--skip', default='', help="略過的階段，以逗號分隔（如 rss,upload_text）")
+    args = parser.parse_args()
+
+    try:
+        pipeline = Pipeline(args.date, skip=[s.strip() for s in args.skip.split(',') if s.strip()])
+        success = asyncio.run(pipeline.run())
+        sys.exit(0 if success else 1)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# scripts/speech_marks.py
+import os
+import re
+import json
+from lxml import etree
+from feedgen.ext.base import BaseExtension, BaseEntryExtension
+from utils import load_config, log_message
+
+TICKS_PER_SECOND = 10_000_000
+PODCAST_NS = 'https://podcastindex.org/namespace/1.0'
+MARKS_VERSION = 1
+CHAPTERS_VERSION = '1.2.0'
+DEFAULT_MAX_CUE_CHARS = 24
+DEFAULT_MAX_CUE_SECONDS = 6.0
+# 字幕於句讀處斷開
+CUE_BREAKS = set('。！？；：，、\n')
+# 經文出處：段落末尾括號內的文字，例如（箴四18）
+REFERENCE_PATTERN = re.compile(r'[（(]([^（）()]{1,24})[）)]')
+# 以段落開頭的前幾個字對應朗讀文字中的位置
+CHAPTER_PROBE_CHARS = 8
+# 第一段經文在此秒數內開始時併入時段標題，不另立章節
+HEADER_MIN_SECONDS = 1.0
+SESSION_TITLES = {'morning': '晨間', 'evening': '晚間'}
+TRANSCRIPT_TYPES = {'.vtt': 'text/vtt', '.srt': 'application/srt'}
+
+class SpeechMarks:
+    """合成時由 stream() 收集的 WordBoundary 時間（秒，相對於 TTS 音訊開頭）與各段經文在朗讀文字中的位置"""
+
+    def __init__(self, text='', words=None, chapters=None):
+        self.text = text
+        self.words = words if words is not None else []  # [開始, 結束, 字詞]
+        self.chapters = chapters if chapters is not None else []  # [文字位置, 出處]
+
+    def add_boundaries(self, boundaries, offset=0.0):
+        """加入一次請求的邊界事件；分段合成時 offset 為前面各段音訊的總長度"""
+        for boundary in boundaries:
+            start = offset + boundary['offset'] / TICKS_PER_SECOND
+            end = start + boundary['duration'] / TICKS_PER_SECOND
+            self.words.append([round(start, 3), round(end, 3), boundary['text']])
+
+    def to_dict(self):
+        return {'version': MARKS_VERSION, 'text': self.text, 'words': self.words, 'chapters': self.chapters}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('text', ''), data.get('words', []), data.get('chapters', []))
+
+    def save(self, path):
+        tmp_path = f"{path}.part"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def align(self):
+        """依序在朗讀文字中找出每個字詞的 (起, 迄) 位置；找不到者以前一字詞的結尾代替"""
+        spans = []
+        cursor = 0
+        for _, _, word in self.words:
+            position = self.text.find(word, cursor) if word else -1
+            if position < 0:
+                spans.append((cursor, cursor))
+                continue
+            spans.append((position, position + len(word)))
+            cursor = position + len(word)
+        return spans
+
+    def cues(self, offset=0.0, max_chars=DEFAULT_MAX_CUE_CHARS, max_seconds=DEFAULT_MAX_CUE_SECONDS):
+        """將字詞合併為字幕，遇句讀、超過字數或秒數上限時斷開，回傳 [(開始, 結束, 文字)]"""
+        spans = self.align()
+        cues = []
+        first = None
+        for i, (start, end, word) in enumerate(self.words):
+            if first is None:
+                first = i
+            last = i + 1 == len(self.words)
+            gap = '' if last else self.text[spans[i][1]:spans[i + 1][0]]
+            if (last or CUE_BREAKS.intersection(gap) or spans[i][1] - spans[first][0] >= max_chars
+                    or end - self.words[first][0] >= max_seconds):
+                text = self.text[spans[first][0]:spans[i][1]] or ''.join(w[2] for w in self.words[first:i + 1])
+                text = ' '.join(text.split())
+                if text:
+                    cues.append((self.words[first][0] + offset, end + offset, text))
+                first = None
+        return cues
+
+    def chapter_times(self, offset=0.0, session=None):
+        """章節起點：時段標題（晨間／晚間）與每段經文第一個字的時間，回傳 Podcasting 2.0 的章節清單"""
+        spans = self.align()
+        chapters = []
+        for position, title in self.chapters:
+            index = next((i for i, (start, _) in enumerate(spans) if start >= position), None)
+            if index is None:
+                continue
+            start = round(self.words[index][0] + offset, 3)
+            if not chapters or start > chapters[-1]['startTime']:
+                chapters.append({'startTime': start, 'title': title})
+        header = SESSION_TITLES.get(session)
+        if header:
+            if chapters and chapters[0]['startTime'] < HEADER_MIN_SECONDS:
+                chapters[0] = {'startTime': 0, 'title': f"{header}｜{chapters[0]['title']}"}
+            else:
+                chapters.insert(0, {'startTime': 0, 'title': header})
+        return chapters
+
+def find_chapters(raw_text, cleaned_text, normalize):
+    """以經文出處切分原文，將各段正規化後的開頭對應到朗讀文字的位置，回傳 [[位置, 出處], ...]"""
+    chapters = []
+    cursor = 0
+    start = 0
+    for match in REFERENCE_PATTERN.finditer(raw_text):
+        probe = normalize(raw_text[start:match.start()]).strip()[:CHAPTER_PROBE_CHARS]
+        start = match.end()
+        if not probe:
+            continue
+        position = cleaned_text.find(probe, cursor)
+        if position < 0:
+            continue
+        chapters.append([position, match.group(1).strip()])
+        cursor = position + len(probe)
+    return chapters
+
+def _timestamp(seconds, separator='.'):
+    millis = int(round(max(0.0, seconds) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+def to_vtt(cues):
+    lines = ['WEBVTT', '']
+    for start, end, text in cues:
+        lines += [f"{_timestamp(start)} --> {_timestamp(end)}", text, '']
+    return '\n'.join(lines)
+
+def to_srt(cues):
+    lines = []
+    for number, (start, end, text) in enumerate(cues, 1):
+        lines += [str(number), f"{_timestamp(start, ',')} --> {_timestamp(end, ',')}", text, '']
+    return '\n'.join(lines)
+
+def marks_path(audio_path):
+    return f"{os.path.splitext(audio_path)[0]}.marks.json"
+
+def output_paths(audio_path):
+    """音檔旁的字幕與章節檔：morning.vtt、morning.srt、morning.chapters.json"""
+    base = os.path.splitext(audio_path)[0]
+    return {'vtt': f"{base}.vtt", 'srt': f"{base}.srt", 'chapters': f"{base}.chapters.json"}
+
+def _write_text(path, text):
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def render(marks, audio_path, offset=0.0, config=None):
+    """寫出音檔旁的 WebVTT、SRT 與章節 JSON；offset 為片頭等插在 TTS 音訊前的秒數"""
+    marks_config = (config or load_config()).get('tts', {}).get('marks', {})
+    cues = marks.cues(offset, int(marks_config.get('max_cue_chars', DEFAULT_MAX_CUE_CHARS)),
+                      float(marks_config.get('max_cue_seconds', DEFAULT_MAX_CUE_SECONDS)))
+    if not cues:
+        return None
+    session = os.path.splitext(os.path.basename(audio_path))[0]
+    paths = output_paths(audio_path)
+    _write_text(paths['vtt'], to_vtt(cues))
+    _write_text(paths['srt'], to_srt(cues))
+    chapters = {'version': CHAPTERS_VERSION, 'chapters': marks.chapter_times(offset, session)}
+    _write_text(paths['chapters'], json.dumps(chapters, ensure_ascii=False, indent=1))
+    log_message(f"已產生字幕與章節: {paths['vtt']}（{len(cues)} 句，{len(chapters['chapters'])} 章）")
+    return paths
+
+def rerender(audio_path, offset, config=None):
+    """後製改變音訊開頭（加入片頭）後，以新的偏移量重寫字幕與章節；沒有時間標記時回傳 None"""
+    path = marks_path(audio_path)
+    if not os.path.exists(path):
+        return None
+    return render(SpeechMarks.load(path), audio_path, offset, config)
+
+# ===== Podcasting 2.0 命名空間（feedgen 擴充） =====
+class PodcastIndexExtension(BaseExtension):
+    def extend_ns(self):
+        return {'podcast': PODCAST_NS}
+
+class PodcastIndexEntryExtension(BaseEntryExtension):
+    """單集的 podcast:transcript 與 podcast:chapters"""
+
+    def __init__(self):
+        self._transcripts = []
+        self._chapters = None
+
+    def transcript(self, url, mime_type, language='zh-TW'):
+        self._transcripts.append({'url': url, 'type': mime_type, 'language': language})
+
+    def chapters(self, url, mime_type='application/json+chapters'):
+        self._chapters = {'url': url, 'type': mime_type}
+
+    def extend_rss(self, entry):
+        for transcript in self._transcripts:
+            etree.SubElement(entry, f'{{{PODCAST_NS}}}transcript', **transcript)
+        if self._chapters:
+            etree.SubElement(entry, f'{{{PODCAST_NS}}}chapters', **self._chapters)
+        return entry
@@ -0,0 +1,130 @@
+# scripts/stream_upload.py
+import io
+import os
+import queue
+import asyncio
+from utils import log_message
+
+# b2sdk 要求每個分段不得小於 5 MB，兩個緩衝區即足以邊收邊傳
+PART_SIZE = 5 * 1024 * 1024
+DEFAULT_MAX_CHUNKS = 64
+# 佇列滿時每隔這麼久確認一次上傳端是否仍在讀取
+PUT_POLL_SECONDS = 0.05
+
+class ChunkStream(io.RawIOBase):
+    """有界佇列包裝成唯讀串流：合成端 put 音訊區塊，上傳執行緒以 read 取用"""
+
+    def __init__(self, max_chunks=DEFAULT_MAX_CHUNKS):
+        super().__init__()
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._pending = b''
+        self._eof = False
+        self._error = None
+        # 執行 upload_unbound_stream 的 Future；上傳端結束後不再有人讀取佇列
+        self.consumer = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._eof:
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, BaseException):
+                raise item
+            else:
+                self._pending = item
+        if self._eof and not self._pending:
+            return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def drain(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def consumer_error(self):
+        """上傳端已結束時回傳其例外（正常結束也視為錯誤，因為仍有區塊未送出），否則回傳 None"""
+        if self.consumer is None or not self.consumer.done():
+            return None
+        if self.consumer.cancelled():
+            return RuntimeError("串流上傳已取消")
+        return self.consumer.exception() or RuntimeError("串流上傳提前結束")
+
+    async def put(self, item):
+        """放入一個區塊；佇列滿時與上傳端的結束競速等待，上傳端失敗時清空佇列並拋出其例外，不會永久阻塞"""
+        while True:
+            error = self.consumer_error()
+            if error is not None:
+                self.drain()
+                raise error
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                if self.consumer is None:
+                    await asyncio.sleep(PUT_POLL_SECONDS)
+                else:
+                    await asyncio.wait({self.consumer}, timeout=PUT_POLL_SECONDS)
+
+    async def finish(self):
+        await self.put(None)
+
+    async def abort(self, error):
+        """通知上傳端中止；上傳端已結束時只清空佇列"""
+        try:
+            await self.put(error)
+        except BaseException:
+            pass
+
+async def stream_synthesize_and_upload(communicate, output_path, bucket, remote_path,
+                                       max_chunks=DEFAULT_MAX_CHUNKS, file_info=None, boundaries=None):
+    """消費 Communicate.stream() 的音訊區塊，同時寫入本機檔案並串流上傳至 B2，回傳上傳的位元組數；
+    傳入 boundaries 清單時一併收集 WordBoundary 事件"""
+    stream = ChunkStream(max_chunks)
+    loop = asyncio.get_running_loop()
+    upload = loop.run_in_executor(None, lambda: bucket.upload_unbound_stream(
+        stream,
+        remote_path,
+        content_type='audio/mpeg',
+        file_info=file_info or {'source': 'podcast_generator'},
+        min_part_size=PART_SIZE,
+        recommended_upload_part_size=PART_SIZE,
+        buffer_size=PART_SIZE,
+        buffers_count=2
+    ))
+    stream.consumer = upload
+
+    size = 0
+    tmp_path = f"{output_path}.part"
+    try:
+        with open(tmp_path, 'wb') as f:
+            async for chunk in communicate.stream():
+                if chunk['type'] != 'audio':
+                    if boundaries is not None and chunk['type'] == 'WordBoundary':
+                        boundaries.append(chunk)
+                    continue
+                f.write(chunk['data'])
+                size += len(chunk['data'])
+                await stream.put(chunk['data'])
+        await stream.finish()
+    except BaseException as e:
+        await stream.abort(RuntimeError(f"語音合成中斷: {str(e)}"))
+        try:
+            await upload
+        except Exception:
+            pass
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    await upload
+    os.replace(tmp_path, output_path)
+    log_message(f"串流上傳完成: {remote_path}（{size / 1024:.1f} KB）")
+    return size
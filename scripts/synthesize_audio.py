@@ -6,6 +6,7 @@ import platform
 from datetime import datetime
 import logging
 import sys
+from tts_cache import TTSCache
 
 logging.basicConfig(level=os.getenv("PYTHON_LOG_LEVEL", "INFO"), format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -13,29 +14,38 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.getenv("BASE_DIR", "docs")
 AUDIO_DIR = os.path.join(BASE_DIR, "audio")
 VOICE = os.getenv("TTS_VOICE", "zh-TW-YunJheNeural")
+RATE = "+0%"
+VOLUME = "+0%"
 
-async def synthesize_text(input_path, output_path):
+async def synthesize_text(input_path, output_path, cache=None):
     with open(input_path, "r", encoding="utf-8") as f:
         text = f.read().strip()
     if not text:
         text = "今日無內容，請明日再收聽。"
-    communicate = edge_tts.Communicate(text, VOICE)
+    cache = cache or TTSCache.from_config()
+    cache_key = TTSCache.make_key(text, VOICE, RATE, VOLUME)
+    if cache.fetch(cache_key, output_path):
+        return
+    communicate = edge_tts.Communicate(text, VOICE, rate=RATE, volume=VOLUME)
     logger.info(f"合成語音：{output_path}")
     await communicate.save(output_path)
+    cache.store(cache_key, output_path)
 
 def main():
     tz = pytz.timezone("Asia/Taipei")
     today = datetime.now(tz).strftime("%Y%m%d")
     audio_dir = os.path.join(AUDIO_DIR, today)
     os.makedirs(audio_dir, exist_ok=True)
+    cache = TTSCache.from_config()
 
     for time_of_day in ["morning", "evening"]:
         input_path = os.path.join(BASE_DIR, "podcast", today, f"{time_of_day}.txt")
         output_path = os.path.join(audio_dir, f"{time_of_day}.mp3")
         if os.path.exists(input_path):
-            asyncio.run(synthesize_text(input_path, output_path))
+            asyncio.run(synthesize_text(input_path, output_path, cache))
         else:
             logger.warning(f"找不到 {time_of_day} 逐字稿，跳過語音合成")
+    cache.log_stats()
 
 if platform.system() == "Emscripten":
     asyncio.ensure_future(main())
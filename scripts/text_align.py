@@ -0,0 +1,244 @@
+# scripts/text_align.py
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from utils import parse_date_args, log_message
+
+# 超過此編輯距離即放棄細部比對，整段視為不同，避免品質極差的 OCR 拖慢批次
+DEFAULT_MAX_D = 1000
+# 比對時忽略空白，並將常見全半形標點視為相同
+PUNCTUATION_MAP = str.maketrans({',': '，', ';': '；', ':': '：', '?': '？', '!': '！',
+                                 '(': '（', ')': '）', '．': '。', '•': '・', '‧': '・'})
+SEGMENT_PATTERN = re.compile(r'[^。！？\n]+[。！？]*')
+
+# ===== Myers 差異演算法（線性記憶體） =====
+def _bisect(a, b, a_lo, a_hi, b_lo, b_hi, max_d):
+    """Myers 雙向搜尋中段蛇形，回傳分割點 (x, y)；編輯距離超過 max_d 時回傳 None"""
+    n, m = a_hi - a_lo, b_hi - b_lo
+    max_d = min(max_d, (n + m + 1) // 2)
+    offset = max_d + 1
+    size = 2 * offset + 1
+    v1 = [-1] * size
+    v2 = [-1] * size
+    v1[offset + 1] = 0
+    v2[offset + 1] = 0
+    delta = n - m
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+    for d in range(max_d + 1):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[a_lo + x1] == b[b_lo + y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and v2[k2_offset] != -1 and x1 >= n - v2[k2_offset]:
+                    return a_lo + x1, b_lo + y1
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[a_hi - x2 - 1] == b[b_hi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    if x1 >= n - x2:
+                        return a_lo + x1, b_lo + x1 - (k1_offset - offset)
+    return None
+
+def diff(a, b, max_d=DEFAULT_MAX_D):
+    """回傳 difflib 格式的 opcodes [(tag, i1, i2, j1, j2)]，tag 為 equal/replace/delete/insert"""
+    ops = []
+    # 以堆疊取代遞迴；各區段互不重疊，最後依位置排序即為輸出順序
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        start_a, start_b = a_lo, b_lo
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        if a_lo > start_a:
+            ops.append(('equal', start_a, a_lo, start_b, b_lo))
+        end_a, end_b = a_hi, b_hi
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+        if a_hi < end_a:
+            ops.append(('equal', a_hi, end_a, b_hi, end_b))
+
+        if a_lo == a_hi and b_lo == b_hi:
+            continue
+        if a_lo == a_hi:
+            ops.append(('insert', a_lo, a_hi, b_lo, b_hi))
+        elif b_lo == b_hi:
+            ops.append(('delete', a_lo, a_hi, b_lo, b_hi))
+        else:
+            split = _bisect(a, b, a_lo, a_hi, b_lo, b_hi, max_d)
+            if split is None:
+                ops.append(('replace', a_lo, a_hi, b_lo, b_hi))
+            else:
+                x, y = split
+                stack.append((a_lo, x, b_lo, y))
+                stack.append((x, a_hi, y, b_hi))
+    ops.sort(key=lambda op: (op[1], op[3]))
+    return _merge(ops)
+
+def _merge(ops):
+    """合併相鄰同類 opcode，並將相鄰的 delete + insert 合併為 replace"""
+    merged = []
+    for op in ops:
+        tag, i1, i2, j1, j2 = op
+        if i1 == i2 and j1 == j2:
+            continue
+        if merged:
+            ptag, pi1, pi2, pj1, pj2 = merged[-1]
+            if ptag == tag or (ptag != 'equal' and tag != 'equal'):
+                new_tag = tag if ptag == tag else 'replace'
+                merged[-1] = (new_tag, pi1, i2, pj1, j2)
+                continue
+        merged.append(op)
+    return merged
+
+# ===== 校正稿對齊 =====
+def _normalize(text):
+    """去除空白並統一標點，回傳 (比對用字串, 對應原文位置)"""
+    chars = []
+    positions = []
+    for i, ch in enumerate(text.translate(PUNCTUATION_MAP)):
+        if not ch.isspace():
+            chars.append(ch)
+            positions.append(i)
+    return ''.join(chars), positions
+
+def align(draft, ocr_text, max_d=DEFAULT_MAX_D, min_missing=20):
+    """以校正稿為準對齊 OCR 結果，回傳校正後文字稿、逐句信心度與差異報告"""
+    a, a_pos = _normalize(draft)
+    b, _ = _normalize(ocr_text)
+    ops = diff(a, b, max_d)
+
+    # 校正稿每個字元是否與 OCR 一致
+    matched = [False] * len(draft)
+    differences = []
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == 'equal':
+            for i in range(i1, i2):
+                matched[a_pos[i]] = True
+        elif tag != 'insert' or j2 - j1 >= min_missing:
+            differences.append({
+                'type': tag,
+                'position': a_pos[i1] if i1 < len(a_pos) else len(draft),
+                'draft': a[i1:i2],
+                'ocr': b[j1:j2],
+            })
+
+    segments = []
+    for match in SEGMENT_PATTERN.finditer(draft):
+        counted = [matched[i] for i in range(match.start(), match.end()) if not draft[i].isspace()]
+        if not counted:
+            continue
+        segments.append({
+            'start': match.start(),
+            'text': match.group().strip(),
+            'confidence': round(sum(counted) / len(counted), 4),
+        })
+
+    equal_chars = sum(i2 - i1 for tag, i1, i2, _, _ in ops if tag == 'equal')
+    return {
+        # 校正稿與 OCR 不一致處一律採用校正稿
+        'corrected': draft,
+        'similarity': round(2 * equal_chars / (len(a) + len(b)), 4) if a or b else 1.0,
+        'segments': segments,
+        'differences': differences,
+        # OCR 有而校正稿沒有的長段文字，可能是校正稿漏打
+        'possibly_missing': [d['ocr'] for d in differences if d['type'] == 'insert'],
+    }
+
+def format_report(date_str, session, result):
+    lines = [f"# {date_str} {session} 相似度 {result['similarity']:.2%}"]
+    for diff_item in result['differences']:
+        lines.append(f"[{diff_item['type']}] @{diff_item['position']} 校正稿「{diff_item['draft']}」 OCR「{diff_item['ocr']}」")
+    low = [s for s in result['segments'] if s['confidence'] < 0.8]
+    if low:
+        lines.append("## 低信心句子")
+        lines.extend(f"{s['confidence']:.0%} {s['text']}" for s in low)
+    return '\n'.join(lines) + '\n'
+
+def align_session(output_dir, date_str, session, draft):
+    """對齊單一時段並寫出 align_{session}.json 與 align_{session}.txt，沒有 OCR 結果時回傳 None"""
+    ocr_path = os.path.join(output_dir, f'ocr_{session}.txt')
+    if not os.path.exists(ocr_path):
+        return None
+    with open(ocr_path, 'r', encoding='utf-8') as f:
+        ocr_text = f.read()
+    result = align(draft, ocr_text)
+    with open(os.path.join(output_dir, f'align_{session}.json'), 'w', encoding='utf-8') as f:
+        json.dump({k: v for k, v in result.items() if k != 'corrected'}, f, ensure_ascii=False, indent=1)
+    with open(os.path.join(output_dir, f'align_{session}.txt'), 'w', encoding='utf-8') as f:
+        f.write(format_report(date_str, session, result))
+    return result
+
+def align_date(date_str):
+    """批次模式：以已產生的 morning.txt / evening.txt 為校正稿對齊 OCR 結果"""
+    output_dir = os.path.join('docs', 'podcast', date_str)
+    started = time.perf_counter()
+    similarity = {}
+    for session in ('morning', 'evening'):
+        draft_path = os.path.join(output_dir, f'{session}.txt')
+        if not os.path.exists(draft_path):
+            continue
+        with open(draft_path, 'r', encoding='utf-8') as f:
+            result = align_session(output_dir, date_str, session, f.read())
+        if result:
+            similarity[session] = result['similarity']
+    return date_str, similarity, time.perf_counter() - started
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="比對 OCR 結果與校正稿並產生差異報告")
+    parser.add_argument('--from', dest='date_from', help="起始日期 MMDD")
+    parser.add_argument('--to', dest='date_to', help="結束日期 MMDD（含）")
+    parser.add_argument('--dates', help="以逗號分隔的 MMDD 清單")
+    parser.add_argument('--workers', type=int, default=None, help="工作行程數")
+    args = parser.parse_args()
+
+    try:
+        dates = parse_date_args(args.date_from, args.date_to, args.dates)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for date_str, similarity, seconds in executor.map(align_date, dates):
+                if similarity:
+                    log_message(f"{date_str}: " + '，'.join(f"{k} {v:.1%}" for k, v in similarity.items()) + f"（{seconds * 1000:.0f} ms）")
+        log_message(f"比對 {len(dates)} 天完成，耗時 {time.perf_counter() - started:.2f}s")
+        sys.exit(0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
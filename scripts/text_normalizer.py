@@ -0,0 +1,229 @@
+# scripts/text_normalizer.py
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+from utils import load_config, log_message
+
+DIGITS = '零一二三四五六七八九'
+YEAR_DIGITS = '〇一二三四五六七八九'
+UNITS = ('', '十', '百', '千')
+DEFAULT_SCRIPT = 's2tw'
+
+# 經文出處前的書卷名（全名的末字或簡稱）；撒上、林前等兩字簡稱另列，避免「早上6:00」的「上」被當成書卷
+BOOK_CHARS = '創出利民申書士得拉尼斯伯詩箴傳歌賽耶哀結但何珥摩俄拿彌鴻哈番該亞瑪太可路約徒羅加弗腓西多門來雅猶啟記篇言音錄志紀'
+BOOK_PAIRS = ('撒上', '撒下', '王上', '王下', '代上', '代下', '林前', '林後', '帖前', '帖後', '提前', '提後', '彼前', '彼後')
+BOOK_CONTEXT = rf'(?:(?<=[{BOOK_CHARS}])|' + '|'.join(f'(?<={pair})' for pair in BOOK_PAIRS) + ')'
+# 時刻只在上下文說明是時間時才成立：前方（同一句、相距數字以內）有這些字，或緊接「分」；重點、觀點等不算
+TIME_WORDS = re.compile(r'早上|晚上|上午|下午|中午|凌晨|清晨|傍晚|(?<![重要觀特焦論疑優缺弱起終])點|時')
+TIME_WINDOW = 6
+CN_DATE = r'[〇零一二三四五六七八九十廿卅\d]{1,3}月[〇零一二三四五六七八九十廿卅\d]{1,3}日'
+# 所有規則合併為單一正規表示式，依 lastgroup 分派，整段文字只掃描一次；
+# 開頭的前瞻字元集讓引擎在一般中文字上直接略過，不必逐一嘗試各分支。
+# 標題行與拉丁轉寫行以前一個換行開頭（文字前先補一個換行），避免使用 ^ 破壞前瞻最佳化
+TOKEN_PATTERN = re.compile(r'(?=[\n \t（(\d])(?:' + r'|'.join([
+    r'(?P<bracket>[ \t]*[（(][^（）()\n]*[）)])',
+    rf'(?P<header>\n[ \t]*(?:{CN_DATE})?[ \t]*[•・‧·][ \t]*[晨晚][ \t]*(?=\n|\Z))',
+    r"(?P<latin>\n[ \t]*[A-Za-z][A-Za-z \t'’-]*(?=\n|\Z))",
+    r'(?P<year>\d{4})(?=年)',
+    # 章:節[-節]節；上下文表示時間的 H:MM[分] 讀作時刻（見 _verse）
+    rf'(?P<verse>(?P<book>{BOOK_CONTEXT}[ \t]?)?(?P<chapter>\d+)[:：](?P<verse_no>\d+)'
+    r'(?:[-–~－～—](?P<verse_end>\d+))?(?:(?P<verse_mark>節)|(?P<minute_mark>分))?)',
+    r'(?P<percent>\d+(?:\.\d+)?)[%％]',
+    r'(?P<range>(?P<range_from>\d+)[-~－～—](?P<range_to>\d+))',
+    r'(?P<decimal>\d+\.\d+)',
+    r'(?P<number>\d+)',
+]) + r')')
+
+def _section(n):
+    """0-9999 的中文讀法"""
+    result = ''
+    zero = False
+    for position in range(3, -1, -1):
+        digit = n // 10 ** position % 10
+        if digit == 0:
+            zero = bool(result)
+            continue
+        if zero:
+            result += '零'
+            zero = False
+        result += DIGITS[digit] + UNITS[position]
+    return result
+
+def verbalize_number(digits):
+    """阿拉伯數字轉中文讀法，例如 31 → 三十一、105 → 一百零五；前導零或過長時逐位念出"""
+    if len(digits) > 1 and digits[0] == '0' or len(digits) > 12:
+        return ''.join(DIGITS[int(d)] for d in digits)
+    n = int(digits)
+    if n == 0:
+        return '零'
+    parts = []
+    for unit, value in (('億', n // 10 ** 8), ('萬', n // 10 ** 4 % 10 ** 4), ('', n % 10 ** 4)):
+        if value:
+            if parts and parts[-1] != '零' and value < 1000:
+                parts.append('零')
+            parts.append(_section(value) + unit)
+        elif parts and parts[-1] != '零':
+            parts.append('零')
+    text = ''.join(parts).rstrip('零')
+    # 十至十九念作「十X」而非「一十X」
+    return text[1:] if text.startswith('一十') else text
+
+def verbalize_decimal(text):
+    whole, _, fraction = text.partition('.')
+    return verbalize_number(whole) + '點' + ''.join(DIGITS[int(d)] for d in fraction)
+
+def build_script_table(script):
+    """由 opencc 字典產生單字對照的 str.translate 表；同時是繁體字的簡體字（如「吃」「里」）保持不變"""
+    if script in (None, '', 'none'):
+        return []
+    if script not in ('s2t', 's2tw'):
+        raise ValueError(f"不支援的字形轉換: {script}")
+    try:
+        import opencc
+    except ImportError:
+        log_message("未安裝 opencc，略過簡繁轉換", "WARNING")
+        return []
+    dictionary = os.path.join(os.path.dirname(opencc.__file__), 'dictionary')
+
+    def read(name):
+        with open(os.path.join(dictionary, name), 'r', encoding='utf-8') as f:
+            for line in f:
+                key, _, values = line.rstrip('\n').partition('\t')
+                if len(key) == 1:
+                    yield key, values.split(' ')
+
+    table = {key: values[0] for key, values in read('STCharacters.txt') if key not in values}
+    if script == 's2tw':
+        variants = {key: values[0] for key, values in read('TWVariants.txt')}
+        table = {key: variants.get(value, value) for key, value in table.items()}
+        table.update({key: value for key, value in variants.items() if key not in table})
+    # 以 BMP 大小的序列取代 dict，str.translate 逐字查表快約 2.5 倍；極少見的擴充區字略過
+    lookup = list(range(0x10000))
+    for key, value in table.items():
+        if ord(key) < 0x10000:
+            lookup[ord(key)] = ord(value) if len(value) == 1 else value
+    return lookup
+
+class TextNormalizer:
+    """朗讀前的文字正規化：去括號內容、標題行、拉丁轉寫行，數字與日期轉中文讀法，並轉為繁體"""
+
+    def __init__(self, script=DEFAULT_SCRIPT, verbalize=True):
+        self.verbalize = verbalize
+        self.table = build_script_table(script)
+        self._convertible = frozenset(chr(code) for code, value in enumerate(self.table) if value != code)
+        self._handlers = {
+            'bracket': lambda m: '',
+            'header': lambda m: '',
+            'latin': lambda m: '',
+            'year': lambda m: ''.join(YEAR_DIGITS[int(d)] for d in m.group('year')),
+            'verse': self._verse,
+            'percent': lambda m: '百分之' + self._number(m.group('percent')),
+            'range': lambda m: verbalize_number(m.group('range_from')) + '至' + verbalize_number(m.group('range_to')),
+            'decimal': lambda m: verbalize_decimal(m.group('decimal')),
+            'number': lambda m: verbalize_number(m.group('number')),
+        }
+        if not verbalize:
+            for name in ('year', 'verse', 'percent', 'range', 'decimal', 'number'):
+                self._handlers[name] = lambda m: m.group()
+
+    @classmethod
+    def from_config(cls, config=None):
+        normalizer_config = (config or load_config()).get('tts', {}).get('normalizer', {})
+        script = os.environ.get('TTS_SCRIPT', normalizer_config.get('script', DEFAULT_SCRIPT))
+        return cls(script, normalizer_config.get('verbalize_numbers', True))
+
+    @staticmethod
+    def _verse(match):
+        """3:16 → 三章十六節、3:16-18節 → 三章十六至十八節；早上6:00 → 早上六點、下午3:30 → 下午三點三十分"""
+        chapter, verse_no, verse_end = match.group('chapter', 'verse_no', 'verse_end')
+        if (match.group('book') is None and not match.group('verse_mark') and not verse_end
+                and len(chapter) <= 2 and len(verse_no) == 2 and int(chapter) <= 24 and int(verse_no) < 60
+                and (match.group('minute_mark') or TextNormalizer._time_context(match))):
+            minutes = int(verse_no)
+            text = verbalize_number(chapter) + '點'
+            if minutes:
+                text += ('零' if minutes < 10 else '') + verbalize_number(str(minutes)) + '分'
+            return text
+        text = verbalize_number(chapter) + '章' + verbalize_number(verse_no)
+        if verse_end:
+            text += '至' + verbalize_number(verse_end)
+        return text + '節'
+
+    @staticmethod
+    def _time_context(match):
+        """同一句中緊鄰的前文是否有表示時間的字"""
+        before = match.string[max(0, match.start() - TIME_WINDOW):match.start()]
+        before = re.split(r'[。！？；!?;\n]', before)[-1]
+        return TIME_WORDS.search(before) is not None
+
+    @staticmethod
+    def _number(text):
+        return verbalize_decimal(text) if '.' in text else verbalize_number(text)
+
+    def _dispatch(self, match):
+        return self._handlers[match.lastgroup](match)
+
+    def normalize(self, text):
+        # 多數文字稿已是繁體，先以集合運算確認有需轉換的字才做 translate
+        if self._convertible and not self._convertible.isdisjoint(text):
+            text = text.translate(self.table)
+        return TOKEN_PATTERN.sub(self._dispatch, '\n' + text).strip()
+
+def benchmark(pattern=os.path.join('docs', '**', '*.txt'), repeat=20, script=DEFAULT_SCRIPT):
+    """以 docs/ 全部文字稿測量吞吐量，並與逐段呼叫 opencc 比較"""
+    texts = []
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+    size = sum(len(t.encode('utf-8')) for t in texts)
+    log_message(f"語料: {len(texts)} 個檔案，{size / 1024:.1f} KB，重複 {repeat} 次")
+
+    started = time.perf_counter()
+    normalizer = TextNormalizer(script)
+    log_message(f"建立對照表: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    results = {}
+    candidates = [('normalizer', normalizer.normalize),
+                  ('legacy regex', lambda t: re.sub(r'\s*\(.*?\)|\s*（.*?）', '', t).strip())]
+    try:
+        import opencc
+        converter = opencc.OpenCC('s2t')
+        candidates.append(('opencc s2t', converter.convert))
+    except ImportError:
+        pass
+    for name, func in candidates:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for text in texts:
+                func(text)
+        seconds = time.perf_counter() - started
+        results[name] = size * repeat / seconds / 1024 / 1024
+        log_message(f"{name:<13} {results[name]:8.2f} MB/s")
+    return results
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="朗讀文字正規化")
+    parser.add_argument('files', nargs='*', help="要正規化的文字檔，輸出至標準輸出")
+    parser.add_argument('--bench', action='store_true', help="以 docs/ 全部文字稿測量吞吐量")
+    parser.add_argument('--repeat', type=int, default=20, help="基準測試重複次數")
+    args = parser.parse_args()
+
+    try:
+        if args.bench:
+            benchmark(repeat=args.repeat)
+        else:
+            normalizer = TextNormalizer.from_config()
+            for path in args.files:
+                with open(path, 'r', encoding='utf-8') as f:
+                    print(normalizer.normalize(f.read()))
+        sys.exit(0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,263 @@
 import os
 import re
 import sys
+import asyncio
 from datetime import datetime
-from edge_tts import Communicate
 from utils import load_config, get_date_string, ensure_directory, get_taiwan_time, log_message
+from tts_cache import TTSCache
+from tts_client import TTSClient
+from text_normalizer import TextNormalizer
+from instrumentation import span, count
+from variants import default_variant, load_variants
+from speech_marks import SpeechMarks, find_chapters, marks_path, render
+
+# 句末標點（保留於句尾）或換行視為句界
+SENTENCE_PATTERN = re.compile(r'[^。！？\n]+[。！？]*|[。！？]+')
 
 class TextToSpeechEdge:
-    def __init__(self):
-        self.config = load_config()
+    def __init__(self, date_str=None, uploader=None, config=None, variant=None):
+        self.config = config or load_config()
+        self.date_str = date_str or get_date_string()
         self.tts_config = self.config.get('tts', {})
-        self.voice = os.environ.get('TTS_VOICE', self.tts_config.get('voice', 'zh-TW-HsiaoYuNeural'))
-        self.rate = self.tts_config.get('rate', '+10%')
-        self.volume = self.tts_config.get('volume', '+10%')
-        self.podcast_dir = os.path.join('docs', 'podcast', get_date_string())
-        ensure_directory(self.podcast_dir)
+        self.variant = variant or default_variant(self.config)
+        self.voice = self.variant.voice
+        self.rate = self.variant.rate
+        self.volume = self.variant.volume
+        # single: 整篇一次送出；chunked: 依句切段並行合成後依序合併
+        self.mode = os.environ.get('TTS_MODE', self.tts_config.get('mode', 'single'))
+        self.concurrency = max(1, int(self.tts_config.get('concurrency', 4)))
+        self.min_segment_chars = int(self.tts_config.get('min_segment_chars', 40))
+        self._semaphore = None
+        self.cache = TTSCache.from_config(self.config)
+        # 逾時、重試、備援請求與備用語音
+        self.client = TTSClient(self.voice, self.rate, self.volume, self.config, self.variant.fallback_voice)
+        self.normalizer = TextNormalizer.from_config(self.config)
+        # 同一次 stream() 收集 WordBoundary，產生字幕與章節
+        self.marks_enabled = self.client.word_boundaries
+        # 串流模式：合成的同時寫入本機並上傳至 B2
+        self.stream_upload = os.environ.get('TTS_STREAM_UPLOAD', '1' if self.tts_config.get('stream_upload') else '0') == '1'
+        self.uploader = uploader
+        self.podcast_dir = os.path.join('docs', 'podcast', self.date_str)
+        self.audio_dir = self.variant.audio_dir(self.date_str)
+        ensure_directory(self.audio_dir)
+
+    @property
+    def semaphore(self):
+        """同時進行中的 TTS 請求上限；VariantSynthesizer 會讓所有變體共用同一個"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
 
     def clean_text(self, text):
-        """移除所有括弧內的文字，包括半形 ( ) 和全形（ ）"""
-        cleaned_text = re.sub(r'\s*\(.*?\)|\s*（.*?）', '', text).strip()
+        """朗讀前正規化：移除括弧內文字、標題行與拉丁轉寫，數字轉中文讀法並統一為繁體"""
+        cleaned_text = self.normalizer.normalize(text)
         if not cleaned_text:
             log_message("清理後文本為空，寫入'今日無內容'", "WARNING")
             return "今日無內容"
         return cleaned_text
 
+    def split_sentences(self, text):
+        """依句號、驚嘆號、問號及換行切段，短句合併至 min_segment_chars 以減少請求數"""
+        sentences = [s.strip() for s in SENTENCE_PATTERN.findall(text) if s.strip()]
+        segments = []
+        buffer = []
+        for sentence in sentences:
+            buffer.append(sentence)
+            if sum(len(s) for s in buffer) >= self.min_segment_chars:
+                segments.append('\n'.join(buffer))
+                buffer = []
+        if buffer:
+            segments.append('\n'.join(buffer))
+        return segments
+
+    async def synthesize_segment(self, index, segment, voice):
+        """以指定語音合成單一段落，回傳 (MP3 位元組, WordBoundary 事件, 使用的語音)"""
+        async with self.semaphore:
+            with span('tts.request', mode='chunked') as request_span:
+                try:
+                    data, boundaries, voice = await self.client.synthesize(segment, voice)
+                except Exception as e:
+                    raise RuntimeError(f"第 {index + 1} 段合成失敗: {str(e)}") from e
+                request_span.set(chars=len(segment), bytes=len(data), voice=voice)
+                return data, boundaries, voice
+
+    async def synthesize_chunked(self, cleaned_text, output_path):
+        """分段並行合成，依原順序合併為單一 MP3，回傳 (使用的語音, 時間標記)"""
+        segments = self.split_sentences(cleaned_text)
+        log_message(f"分段合成 {len(segments)} 段，並行上限 {self.concurrency}: {output_path}")
+        voices = self.client.voices
+        for voice in voices:
+            # 同一集的所有段落使用同一個語音：任一段以主語音失敗時，整集改用備用語音重新合成
+            tasks = [asyncio.ensure_future(self.synthesize_segment(i, seg, voice)) for i, seg in enumerate(segments)]
+            try:
+                results = await asyncio.gather(*tasks)
+                break
+            except Exception as e:
+                if voice == voices[-1]:
+                    raise
+                count('tts_fallback')
+                log_message(f"語音 {voice} 無法完成 {output_path}: {str(e)}，整集改用 {voices[-1]}", "WARNING")
+            finally:
+                for task in tasks:
+                    task.cancel()
+        tmp_path = f"{output_path}.part"
+        with open(tmp_path, 'wb') as f:
+            for data, _, _ in results:
+                f.write(data)
+        os.replace(tmp_path, output_path)
+        marks = None
+        if self.marks_enabled:
+            from mp3_tools import MP3File
+            # 各段的邊界時間相對於該段開頭，依前面各段的音框長度平移
+            marks = SpeechMarks(cleaned_text)
+            offset = 0.0
+            for data, boundaries, _ in results:
+                marks.add_boundaries(boundaries, offset)
+                offset += MP3File(data).duration
+        return {voice for _, _, voice in results}, marks
+
+    def get_uploader(self):
+        """延遲建立 B2 上傳器；認證失敗時停用串流模式"""
+        if self.uploader is None:
+            try:
+                from upload_to_b2 import B2Uploader
+                self.uploader = B2Uploader(self.date_str)
+            except SystemExit:
+                log_message("B2 無法使用，改為僅寫入本機檔案", "WARNING")
+                self.stream_upload = False
+        return self.uploader
+
+    async def synthesize_streaming(self, cleaned_text, output_path):
+        """單次 stream() 合成，音訊區塊經有界緩衝直接上傳 B2，同時寫入本機"""
+        from stream_upload import stream_synthesize_and_upload
+        uploader = self.get_uploader()
+        if not self.stream_upload:
+            return await self.save(cleaned_text, output_path)
+        remote_path = f"{uploader.remote_prefix(self.date_str, self.variant)}/{os.path.basename(output_path)}"
+        boundaries = []
+
+        async def request(voice):
+            boundaries.clear()
+            return await stream_synthesize_and_upload(self.client.communicate(cleaned_text, voice), output_path,
+                                                      uploader.bucket, remote_path, boundaries=boundaries)
+
+        async with self.semaphore:
+            with span('tts.request', mode='stream') as request_span:
+                # 串流途中無法改送備援請求；失敗時上傳已中止，可整段重試
+                size, voice = await self.client.with_fallback(request, cleaned_text)
+                request_span.set(chars=len(cleaned_text), bytes=size, voice=voice)
+        return {voice}, self.collect_marks(cleaned_text, boundaries)
+
+    def collect_marks(self, cleaned_text, boundaries):
+        if not self.marks_enabled:
+            return None
+        marks = SpeechMarks(cleaned_text)
+        marks.add_boundaries(boundaries)
+        return marks
+
+    def write_marks(self, marks, output_path):
+        """依文字稿的經文出處定出章節位置，寫出時間標記與字幕、章節檔"""
+        session = os.path.splitext(os.path.basename(output_path))[0]
+        text_file = os.path.join(self.podcast_dir, f'{session}.txt')
+        if os.path.exists(text_file):
+            with open(text_file, 'r', encoding='utf-8') as f:
+                marks.chapters = find_chapters(f.read(), marks.text, self.normalizer.normalize)
+        marks.save(marks_path(output_path))
+        render(marks, output_path, config=self.config)
+
+    async def save(self, cleaned_text, output_path):
+        """整篇一次合成並寫入檔案，回傳 (使用的語音, 時間標記)"""
+        async with self.semaphore:
+            with span('tts.request', mode='single') as request_span:
+                data, boundaries, voice = await self.client.synthesize(cleaned_text)
+                tmp_path = f"{output_path}.part"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, output_path)
+                request_span.set(chars=len(cleaned_text), bytes=len(data), voice=voice)
+        return {voice}, self.collect_marks(cleaned_text, boundaries)
+
+    async def upload_cached(self, output_path):
+        """快取命中時仍需確保 B2 上有相同檔案（內容相同則跳過）"""
+        uploader = self.get_uploader()
+        if not self.stream_upload:
+            return
+        file_path = os.path.relpath(output_path, self.podcast_dir)
+        loop = asyncio.get_running_loop()
+        remote_files = await loop.run_in_executor(None, uploader.list_remote, self.date_str, self.variant)
+        await loop.run_in_executor(None, uploader.upload_file, file_path, os.path.basename(output_path),
+                                   self.date_str, remote_files, self.variant)
+
     async def generate_speech(self, text, output_path):
         """生成語音文件"""
+        log_message(f"原始文本: {text[:50]}...")  # 記錄原始文本
+        cleaned_text = self.clean_text(text)  # 清理文本
+        log_message(f"清理後文本: {cleaned_text[:50]}...")  # 記錄清理後文本
+        return await self.synthesize_text(cleaned_text, output_path)
+
+    async def synthesize_text(self, cleaned_text, output_path):
+        """由已正規化的文字生成語音文件（快取命中時直接複製）"""
         try:
-            log_message(f"原始文本: {text[:50]}...")  # 記錄原始文本
-            cleaned_text = self.clean_text(text)  # 清理文本
-            log_message(f"清理後文本: {cleaned_text[:50]}...")  # 記錄清理後文本
             if not cleaned_text:
                 log_message(f"清理後文本為空，跳過生成: {output_path}", "WARNING")
                 return False
-            communicate = Communicate(text=cleaned_text, voice=self.voice, rate=self.rate, volume=self.volume)
-            await communicate.save(output_path)
+            cache_key = TTSCache.make_key(cleaned_text, self.voice, self.rate, self.volume)
+            if self.cache.fetch(cache_key, output_path):
+                cached_marks = self.cache.fetch_marks(cache_key) if self.marks_enabled else None
+                if cached_marks:
+                    self.write_marks(SpeechMarks.from_dict(cached_marks), output_path)
+                if self.stream_upload:
+                    await self.upload_cached(output_path)
+                return True
+            if self.stream_upload:
+                voices, marks = await self.synthesize_streaming(cleaned_text, output_path)
+            elif self.mode == 'chunked':
+                voices, marks = await self.synthesize_chunked(cleaned_text, output_path)
+            else:
+                voices, marks = await self.save(cleaned_text, output_path)
+            if marks is not None and marks.words:
+                self.write_marks(marks, output_path)
+            if voices == {self.voice}:
+                self.cache.store(cache_key, output_path)
+                if marks is not None and marks.words:
+                    self.cache.store_marks(cache_key, marks.to_dict())
+            else:
+                # 以備用語音合成的結果不寫入主語音的快取，下次執行重新合成
+                log_message(f"使用備用語音 {', '.join(sorted(voices - {self.voice}))} 合成: {output_path}", "WARNING")
             log_message(f"語音文件已生成: {output_path}")
             return True
         except Exception as e:
             log_message(f"語音生成失敗: {str(e)}", "ERROR")
             return False
 
+    def prepare_text(self, session):
+        """讀取並正規化單一時段的文字稿；缺少檔案時回傳 None"""
+        text_file = os.path.join(self.podcast_dir, f'{session}.txt')
+        if not os.path.exists(text_file):
+            log_message(f"缺少 {session}.txt，跳過處理", "ERROR")
+            return None
+        with open(text_file, 'r', encoding='utf-8') as f:
+            text = f.read().strip()
+        log_message(f"原始文本: {text[:50]}...")
+        cleaned_text = self.clean_text(text)
+        log_message(f"清理後文本: {cleaned_text[:50]}...")
+        return cleaned_text
+
+    async def synthesize_session(self, session, cleaned_text=None):
+        """合成單一時段（morning / evening）的音檔；可傳入已正規化的文字以免重複處理"""
+        if cleaned_text is None:
+            cleaned_text = self.prepare_text(session)
+            if cleaned_text is None:
+                return False
+
+        success = await self.synthesize_text(cleaned_text, os.path.join(self.audio_dir, f'{session}.mp3'))
+        label = session if self.variant.primary else f"{self.variant.name} {session}"
+        if success:
+            log_message(f"{label} 音頻生成成功")
+        else:
+            log_message(f"{label} 音頻生成失敗，但繼續執行", "WARNING")
+        return success
+
     async def run(self):
         """主運行邏輯"""
         try:
@@ -51,29 +269,71 @@ class TextToSpeechEdge:
                 log_message(f"缺少 morning.txt 或 evening.txt，跳過處理", "ERROR")
                 return False
 
-            with open(morning_file, 'r', encoding='utf-8') as f:
-                morning_text = f.read().strip()
-            with open(evening_file, 'r', encoding='utf-8') as f:
-                evening_text = f.read().strip()
+            # 生成語音文件：晨、晚兩篇同時排入，共用同一個並行上限
+            await asyncio.gather(self.synthesize_session('morning'), self.synthesize_session('evening'))
+            self.cache.log_stats()
+            self.client.save_stats()
 
-            # 生成語音文件
-            morning_mp3 = os.path.join(self.podcast_dir, 'morning.mp3')
-            evening_mp3 = os.path.join(self.podcast_dir, 'evening.mp3')
+            return True
 
-            success = await self.generate_speech(morning_text, morning_mp3)
-            if success:
-                log_message("morning 音頻生成成功")
-            else:
-                log_message("morning 音頻生成失敗，但繼續執行", "WARNING")
+        except Exception as e:
+            log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+            return False
 
-            success = await self.generate_speech(evening_text, evening_mp3)
-            if success:
-                log_message("evening 音頻生成成功")
-            else:
-                log_message("evening 音頻生成失敗，但繼續執行", "WARNING")
+class VariantSynthesizer:
+    """單日所有語音變體的合成：文字稿只正規化一次，所有變體的請求同時排入並共用同一個並行上限"""
 
-            return True
+    def __init__(self, date_str=None, uploader=None, config=None, variants=None):
+        self.config = config or load_config()
+        self.date_str = date_str or get_date_string()
+        self.variants = variants or load_variants(self.config)
+        self.engines = [TextToSpeechEdge(self.date_str, uploader, self.config, v) for v in self.variants]
+        self._prepared = {}
+        self._shared = False
+
+    def share_resources(self):
+        """在事件迴圈內建立共用的並行上限與備援請求預算，串流模式下共用同一個 B2 上傳器"""
+        if self._shared:
+            return
+        semaphore = asyncio.Semaphore(self.engines[0].concurrency)
+        uploader = self.engines[0].get_uploader() if self.engines[0].stream_upload else None
+        budget = self.engines[0].client.budget
+        for engine in self.engines:
+            engine._semaphore = semaphore
+            # 同一個 Edge TTS 服務：備援請求預算一併共用（斷路器與延遲統計本即依語音、檔案在行程內共用）
+            engine.client.budget = budget
+            if uploader is not None:
+                engine.uploader = uploader
+            engine.stream_upload = self.engines[0].stream_upload
+        self._shared = True
 
+    def prepare(self, session):
+        if session not in self._prepared:
+            self._prepared[session] = self.engines[0].prepare_text(session)
+        return self._prepared[session]
+
+    async def synthesize_session(self, session):
+        """所有變體同時合成同一時段，全部成功才回傳 True"""
+        self.share_resources()
+        cleaned_text = self.prepare(session)
+        if cleaned_text is None:
+            return False
+        results = await asyncio.gather(*(engine.synthesize_session(session, cleaned_text) for engine in self.engines))
+        return all(results)
+
+    def log_stats(self):
+        for engine in self.engines:
+            engine.cache.log_stats()
+        # 所有客戶端共用同一份延遲統計，只需寫入一次
+        self.engines[0].client.save_stats()
+
+    async def run(self):
+        """晨、晚兩個時段與所有變體一併排入"""
+        try:
+            log_message(f"開始語音合成：{len(self.variants)} 個變體（{', '.join(v.name for v in self.variants)}）")
+            results = await asyncio.gather(self.synthesize_session('morning'), self.synthesize_session('evening'))
+            self.log_stats()
+            return all(results)
         except Exception as e:
             log_message(f"主程序執行失敗: {str(e)}", "ERROR")
             return False
@@ -81,7 +341,7 @@ class TextToSpeechEdge:
 async def main():
     """主函數"""
     try:
-        tts = TextToSpeechEdge()
+        tts = VariantSynthesizer()
         success = await tts.run()
 
         if success:
@@ -96,5 +356,4 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
\ No newline at end of file
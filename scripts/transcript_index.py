@@ -0,0 +1,422 @@
+# scripts/transcript_index.py
+import os
+import re
+import sys
+import glob
+import json
+import math
+import mmap
+import time
+import struct
+import hashlib
+import argparse
+from collections import Counter, defaultdict
+from utils import ensure_directory, log_message
+
+INDEX_DIR = os.path.join('docs', 'index')
+INDEX_FILE = 'index.json'
+# 來源：校正稿、每日分段文字稿、daily 文章
+SOURCES = {
+    'img': os.path.join('docs', 'img', '*.txt'),
+    'podcast': os.path.join('docs', 'podcast', '*', '*.txt'),
+    'daily': os.path.join('docs', 'daily', '*.txt'),
+}
+SESSIONS = ('morning', 'evening')
+# 段數超過此值時合併為單一段，避免查詢時開啟過多檔案
+MAX_SEGMENTS = 8
+
+MAGIC = b'TIDX'
+VERSION = 1
+# magic, version, reserved, term_count, doc_count, postings_length
+HEADER = struct.Struct('<4sHHIII')
+# 詞（UTF-32-BE 補零至 3 字，位元組序即字碼序，可直接二分搜尋）、postings 位移、文件數
+TERM_ENTRY = struct.Struct('<12sII')
+TERM_WIDTH = 12
+
+WORD_PATTERN = re.compile(r'\w+')
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# ===== 斷詞與編碼 =====
+def ngrams(text, sizes=(2, 3)):
+    """將文字切成字元二元與三元組；不跨越標點與空白"""
+    for run in WORD_PATTERN.findall(text.lower()):
+        for n in sizes:
+            for i in range(len(run) - n + 1):
+                yield run[i:i + n]
+
+def query_terms(query):
+    """查詢字串的 n-gram：三字以上的片段取三元組，兩字取二元組"""
+    terms = []
+    for run in WORD_PATTERN.findall(query.lower()):
+        n = 3 if len(run) >= 3 else 2
+        terms.extend(run[i:i + n] for i in range(len(run) - n + 1))
+    return list(dict.fromkeys(terms))
+
+def encode_term(term):
+    return term.encode('utf-32-be').ljust(TERM_WIDTH, b'\0')
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varints(data):
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+def write_segment(path, documents):
+    """documents 為 [(doc_key, Counter)]；寫出排序詞典與 (doc 差值, 詞頻) varint postings"""
+    postings = defaultdict(list)
+    for local_id, (_, counts) in enumerate(documents):
+        for term, tf in counts.items():
+            postings[term].append((local_id, tf))
+
+    entries = []
+    blob = bytearray()
+    for key, term in sorted((encode_term(t), t) for t in postings):
+        entries.append(TERM_ENTRY.pack(key, len(blob), len(postings[term])))
+        previous = 0
+        for local_id, tf in postings[term]:
+            encode_varint(local_id - previous, blob)
+            encode_varint(tf, blob)
+            previous = local_id
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(entries), len(documents), len(blob)))
+        f.write(b''.join(entries))
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return len(entries)
+
+class Segment:
+    """以 mmap 開啟的唯讀索引段，詞典以二分搜尋查詢"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.term_count, self.doc_count, self.postings_length = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"不支援的索引格式: {path}")
+        self._postings_base = HEADER.size + self.term_count * TERM_ENTRY.size
+
+    def _find(self, key):
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * TERM_ENTRY.size
+            current = self._mm[offset:offset + TERM_WIDTH]
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def postings(self, term):
+        """回傳 [(段內文件序號, 詞頻)]"""
+        i = self._find(encode_term(term))
+        if i is None:
+            return []
+        _, start, _ = TERM_ENTRY.unpack_from(self._mm, HEADER.size + i * TERM_ENTRY.size)
+        if i + 1 < self.term_count:
+            _, end, _ = TERM_ENTRY.unpack_from(self._mm, HEADER.size + (i + 1) * TERM_ENTRY.size)
+        else:
+            end = self.postings_length
+        values = decode_varints(self._mm[self._postings_base + start:self._postings_base + end])
+        result = []
+        local_id = 0
+        for j in range(0, len(values), 2):
+            local_id += values[j]
+            result.append((local_id, values[j + 1]))
+        return result
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+# ===== 索引 =====
+def describe_source(source, path):
+    """由路徑推得 (doc_key, 日期, 時段)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if source == 'podcast':
+        date_str = os.path.basename(os.path.dirname(path))
+        if stem not in SESSIONS:
+            return None
+        return f"podcast/{date_str}/{stem}", date_str, stem
+    return f"{source}/{stem}", stem, None
+
+def sha1_of_text(data):
+    return hashlib.sha1(data).hexdigest()
+
+class TranscriptIndex:
+    """文字稿 n-gram 倒排索引：新文件寫入新段，index.json 記錄各文件所在段與內容雜湊"""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        self.meta_path = os.path.join(index_dir, INDEX_FILE)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {'version': VERSION, 'next_segment': 0, 'segments': [], 'docs': {}}
+        self._segments = {}
+
+    # ----- 建立 -----
+    def scan_sources(self):
+        for source, pattern in SOURCES.items():
+            for path in sorted(glob.glob(pattern)):
+                described = describe_source(source, path)
+                if described:
+                    yield (source, path) + described
+
+    def update(self, rebuild=False):
+        """索引新增或內容變更的文件，回傳本次索引的文件數"""
+        started = time.perf_counter()
+        docs = {} if rebuild else self.meta['docs']
+        seen = set()
+        pending = []
+        for source, path, key, date_str, session in self.scan_sources():
+            seen.add(key)
+            with open(path, 'rb') as f:
+                data = f.read()
+            sha1 = sha1_of_text(data)
+            if key in docs and docs[key]['sha1'] == sha1:
+                continue
+            text = data.decode('utf-8', errors='replace')
+            pending.append((key, {'path': path.replace('\\', '/'), 'source': source, 'date': date_str,
+                                  'session': session, 'sha1': sha1}, Counter(ngrams(text))))
+        removed = [key for key in docs if key not in seen]
+        for key in removed:
+            del docs[key]
+
+        if rebuild or (pending and len(self.meta['segments']) + 1 > MAX_SEGMENTS):
+            return self._rebuild(started)
+        if not pending and not removed:
+            return 0
+
+        ensure_directory(self.index_dir)
+        if pending:
+            name = self._new_segment_name()
+            write_segment(os.path.join(self.index_dir, name), [(key, counts) for key, _, counts in pending])
+            self.meta['segments'].append({'name': name, 'docs': [key for key, _, _ in pending]})
+            for local_id, (key, info, counts) in enumerate(pending):
+                info.update({'segment': name, 'local': local_id, 'length': sum(counts.values())})
+                docs[key] = info
+        self._drop_empty_segments()
+        self.save()
+        log_message(f"文字稿索引: 新增 {len(pending)} 份、移除 {len(removed)} 份，"
+                    f"共 {len(docs)} 份 {len(self.meta['segments'])} 段（{(time.perf_counter() - started) * 1000:.0f} ms）")
+        return len(pending)
+
+    def _new_segment_name(self):
+        name = f"seg_{self.meta['next_segment']:04d}.idx"
+        self.meta['next_segment'] += 1
+        return name
+
+    def _rebuild(self, started):
+        """全部重建為單一段"""
+        self.close()
+        old_segments = [s['name'] for s in self.meta['segments']]
+        documents = []
+        docs = {}
+        for source, path, key, date_str, session in self.scan_sources():
+            with open(path, 'rb') as f:
+                data = f.read()
+            counts = Counter(ngrams(data.decode('utf-8', errors='replace')))
+            docs[key] = {'path': path.replace('\\', '/'), 'source': source, 'date': date_str,
+                         'session': session, 'sha1': sha1_of_text(data), 'length': sum(counts.values())}
+            documents.append((key, counts))
+
+        ensure_directory(self.index_dir)
+        name = self._new_segment_name()
+        terms = write_segment(os.path.join(self.index_dir, name), documents)
+        for local_id, (key, _) in enumerate(documents):
+            docs[key].update({'segment': name, 'local': local_id})
+        self.meta['docs'] = docs
+        self.meta['segments'] = [{'name': name, 'docs': [key for key, _ in documents]}]
+        self.save()
+        for old in old_segments:
+            path = os.path.join(self.index_dir, old)
+            if old != name and os.path.exists(path):
+                os.remove(path)
+        log_message(f"文字稿索引重建: {len(docs)} 份、{terms} 個詞，"
+                    f"{os.path.getsize(os.path.join(self.index_dir, name)) / 1024:.0f} KB（{time.perf_counter() - started:.2f}s）")
+        return len(docs)
+
+    def _drop_empty_segments(self):
+        """刪除所有文件皆已被取代的段"""
+        live = {(info['segment'], info['local']) for info in self.meta['docs'].values()}
+        kept = []
+        for segment in self.meta['segments']:
+            if any((segment['name'], i) in live for i in range(len(segment['docs']))):
+                kept.append(segment)
+            else:
+                if segment['name'] in self._segments:
+                    self._segments.pop(segment['name']).close()
+                path = os.path.join(self.index_dir, segment['name'])
+                if os.path.exists(path):
+                    os.remove(path)
+        self.meta['segments'] = kept
+
+    def save(self):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.meta_path)
+
+    # ----- 查詢 -----
+    def _segment(self, name):
+        if name not in self._segments:
+            self._segments[name] = Segment(os.path.join(self.index_dir, name))
+        return self._segments[name]
+
+    def postings(self, term, sources=None):
+        """回傳 {doc_key: 詞頻}，只含仍有效（未被新版本取代）的文件"""
+        docs = self.meta['docs']
+        result = {}
+        for segment in self.meta['segments']:
+            keys = segment['docs']
+            for local_id, tf in self._segment(segment['name']).postings(term):
+                key = keys[local_id]
+                info = docs.get(key)
+                if (info and info['segment'] == segment['name'] and info['local'] == local_id
+                        and (sources is None or info['source'] in sources)):
+                    result[key] = tf
+        return result
+
+    def _idf(self, df):
+        total = len(self.meta['docs'])
+        return math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+    def search(self, query, limit=10, sources=None):
+        """回傳依相關度排序的 [{'date', 'session', 'source', 'path', 'score', 'snippet'}]；完整片語命中者優先"""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        docs = self.meta['docs']
+        average = sum(d['length'] for d in docs.values()) / max(1, len(docs))
+        candidates = None
+        scores = defaultdict(float)
+        for term in terms:
+            postings = self.postings(term, sources)
+            idf = self._idf(len(postings))
+            for key, tf in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * docs[key]['length'] / average)
+                scores[key] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            candidates = set(postings) if candidates is None else candidates & set(postings)
+            if not candidates:
+                return []
+
+        phrase = re.compile(r'\W*'.join(map(re.escape, ''.join(WORD_PATTERN.findall(query.lower())))))
+        hits = []
+        for key in candidates:
+            info = docs[key]
+            snippet, found = self.snippet(info['path'], phrase, terms[0])
+            hits.append({'key': key, 'date': info['date'], 'session': info['session'], 'source': info['source'],
+                         'path': info['path'], 'score': round(scores[key], 3), 'exact': found, 'snippet': snippet})
+        hits.sort(key=lambda h: (h['exact'], h['score'], h['date']), reverse=True)
+        return hits[:limit]
+
+    @staticmethod
+    def snippet(path, phrase, fallback, width=24):
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+        except OSError:
+            return '', False
+        lowered = text.lower()
+        match = phrase.search(lowered)
+        start, end = (match.start(), match.end()) if match else (max(0, lowered.find(fallback)), 0)
+        end = max(end, start)
+        snippet = text[max(0, start - width):end + width].replace('\n', ' ')
+        return snippet.strip(), match is not None
+
+    def related(self, key, limit=3, sources=('podcast',), terms=40):
+        """以該文件最具鑑別度的三元組找出內容相近的其他日期，回傳 [(doc_key, 分數)]"""
+        info = self.meta['docs'].get(key)
+        if not info or not os.path.exists(info['path']):
+            return []
+        with open(info['path'], 'r', encoding='utf-8', errors='replace') as f:
+            counts = Counter(ngrams(f.read(), sizes=(3,)))
+        weighted = []
+        for term, tf in counts.items():
+            postings = self.postings(term, sources)
+            # 只出現在本文件的詞無助於找相關集數
+            if len(postings) > 1:
+                weighted.append((tf * self._idf(len(postings)), term, postings))
+        weighted.sort(key=lambda w: w[0], reverse=True)
+
+        scores = defaultdict(float)
+        for weight, _, postings in weighted[:terms]:
+            for other in postings:
+                if self.meta['docs'][other]['date'][-4:] != info['date'][-4:]:
+                    scores[other] += weight
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def close(self):
+        for segment in self._segments.values():
+            segment.close()
+        self._segments = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def update_index(index_dir=INDEX_DIR):
+    """增量更新文字稿索引，失敗時僅記錄警告"""
+    try:
+        with TranscriptIndex(index_dir) as index:
+            return index.update()
+    except Exception as e:
+        log_message(f"文字稿索引更新失敗: {str(e)}", "WARNING")
+        return None
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="文字稿 n-gram 索引與搜尋")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="增量更新索引")
+    build.add_argument('--rebuild', action='store_true', help="全部重建為單一段")
+    search = subparsers.add_parser('search', help="搜尋片語或經文")
+    search.add_argument('query')
+    search.add_argument('--limit', type=int, default=10)
+    search.add_argument('--source', choices=sorted(SOURCES), help="只搜尋指定來源")
+    related = subparsers.add_parser('related', help="列出相關集數")
+    related.add_argument('date')
+    related.add_argument('session', choices=SESSIONS)
+    args = parser.parse_args()
+
+    try:
+        with TranscriptIndex() as index:
+            if args.command == 'build':
+                index.update(rebuild=args.rebuild)
+            elif args.command == 'search':
+                started = time.perf_counter()
+                hits = index.search(args.query, args.limit, {args.source} if args.source else None)
+                for hit in hits:
+                    print(f"{hit['date']}\t{hit['session'] or hit['source']}\t{hit['score']:.2f}\t{hit['snippet']}")
+                log_message(f"找到 {len(hits)} 筆，耗時 {(time.perf_counter() - started) * 1000:.1f} ms")
+            else:
+                for key, score in index.related(f"podcast/{args.date}/{args.session}"):
+                    print(f"{key}\t{score:.2f}")
+        sys.exit(0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# scripts/tts_cache.py
+import os
+import json
+import shutil
+import hashlib
+from utils import load_config, ensure_directory, log_message
+from instrumentation import count
+
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'tts')
+DEFAULT_MAX_MB = 200
+
+class TTSCache:
+    """以 (清理後文本, voice, rate, volume) 雜湊為鍵的 MP3 磁碟快取，超過容量時依 LRU 淘汰"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, enabled=True):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        if self.enabled:
+            ensure_directory(self.cache_dir)
+
+    @classmethod
+    def from_config(cls, config=None):
+        """從 config/podcast_config.json 的 tts.cache 建立快取，環境變量 TTS_CACHE_DIR 優先"""
+        if config is None:
+            config = load_config()
+        cache_config = config.get('tts', {}).get('cache', {})
+        cache_dir = os.environ.get('TTS_CACHE_DIR', cache_config.get('dir', DEFAULT_CACHE_DIR))
+        max_bytes = int(float(cache_config.get('max_mb', DEFAULT_MAX_MB)) * 1024 * 1024)
+        enabled = os.environ.get('TTS_CACHE', '1') != '0' and cache_config.get('enabled', True)
+        return cls(cache_dir, max_bytes, enabled)
+
+    @staticmethod
+    def make_key(text, voice, rate, volume):
+        payload = json.dumps([text, voice, rate, volume], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _marks_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.marks.json")
+
+    def fetch(self, key, output_path):
+        """命中時複製快取檔到 output_path 並回傳 True"""
+        if not self.enabled:
+            return False
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            count('tts_cache', result='miss')
+            return False
+        # 目的檔可能是音檔存放區的硬連結，先寫暫存檔再替換以免改到快取物件
+        shutil.copyfile(path, f"{output_path}.part")
+        os.replace(f"{output_path}.part", output_path)
+        os.utime(path)  # 以 mtime 記錄最近使用時間
+        self.hits += 1
+        count('tts_cache', result='hit')
+        log_message(f"TTS 快取命中: {output_path}")
+        return True
+
+    def store(self, key, source_path):
+        """將新生成的 MP3 寫入快取，並依容量上限淘汰最久未用的項目"""
+        if not self.enabled or not os.path.exists(source_path):
+            return
+        try:
+            tmp_path = f"{self._path(key)}.tmp"
+            shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, self._path(key))
+            self.evict()
+        except OSError as e:
+            log_message(f"寫入 TTS 快取失敗: {str(e)}", "WARNING")
+
+    def fetch_marks(self, key):
+        """取得與快取音檔一同存放的時間標記（字幕與章節用），沒有時回傳 None"""
+        path = self._marks_path(key)
+        if not self.enabled or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_marks(self, key, marks):
+        if not self.enabled:
+            return
+        try:
+            tmp_path = f"{self._marks_path(key)}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(marks, f, ensure_ascii=False)
+            os.replace(tmp_path, self._marks_path(key))
+        except OSError as e:
+            log_message(f"寫入 TTS 快取失敗: {str(e)}", "WARNING")
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.mp3'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            marks = f"{path[:-len('.mp3')]}.marks.json"
+            if os.path.exists(marks):
+                os.remove(marks)
+            total -= size
+            removed += 1
+        if removed:
+            log_message(f"TTS 快取淘汰 {removed} 個項目，目前 {total / 1024 / 1024:.1f} MB")
+
+    def log_stats(self):
+        if self.enabled:
+            log_message(f"TTS 快取統計: 命中 {self.hits}，未命中 {self.misses}")
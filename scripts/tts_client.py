@@ -0,0 +1,258 @@
+# scripts/tts_client.py
+import os
+import json
+import time
+import random
+import asyncio
+from edge_tts import Communicate
+from utils import ensure_directory, log_message
+from instrumentation import count
+
+DEFAULT_STATS_FILE = os.path.join('.cache', 'tts', 'latency.json')
+# 保留最近的首位元組延遲樣本數
+STATS_WINDOW = 200
+
+class LatencyStats:
+    """Edge TTS 首位元組延遲的滑動樣本，存於快取目錄以便跨次執行估計 p95"""
+
+    def __init__(self, path=DEFAULT_STATS_FILE, window=STATS_WINDOW):
+        self.path = path
+        self.window = window
+        self.samples = []
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.samples = [float(s) for s in json.load(f).get('ttfb', [])][-window:]
+            except (ValueError, OSError):
+                self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        if len(self.samples) > self.window:
+            del self.samples[:-self.window]
+
+    def quantile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def save(self):
+        if not self.path:
+            return
+        ensure_directory(os.path.dirname(self.path) or '.')
+        tmp_path = f"{self.path}.part"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'ttfb': [round(s, 4) for s in self.samples]}, f)
+        os.replace(tmp_path, self.path)
+
+class CircuitBreaker:
+    """連續失敗達門檻即斷開；冷卻期後放行一次試探請求（half-open），成功才恢復"""
+
+    def __init__(self, failures=3, reset_seconds=120):
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = 'half_open'
+        return self.state != 'open'
+
+    def success(self):
+        self.state = 'closed'
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                count('tts_breaker_open')
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+class BreakerOpen(Exception):
+    pass
+
+class HedgeBudget:
+    """備援請求的預算：備援次數不超過請求總數的固定比例；同一天所有語音變體的客戶端共用一份"""
+
+    def __init__(self, ratio):
+        self.ratio = ratio
+        self.requests = 0
+        self.hedges = 0
+
+    def allow(self):
+        return self.hedges < self.ratio * self.requests
+
+# 同一行程內的所有 TTSClient 共用各語音的斷路器與延遲統計
+_breakers = {}
+_stats = {}
+
+def breaker_for(voice, failures, reset_seconds):
+    if voice not in _breakers:
+        _breakers[voice] = CircuitBreaker(failures, reset_seconds)
+    return _breakers[voice]
+
+def stats_for(path):
+    if path not in _stats:
+        _stats[path] = LatencyStats(path)
+    return _stats[path]
+
+class TTSClient:
+    """包裝 edge_tts：每次請求有期限、失敗以抖動指數退避重試、首位元組超過 p95 時發出備援請求（先完成者勝出，
+    另一個取消，備援次數受預算限制），主語音斷路時改用備用語音（由呼叫端依語音變體指定）"""
+
+    def __init__(self, voice, rate='+0%', volume='+0%', config=None, fallback_voice=None):
+        client_config = (config or {}).get('tts', {}).get('client', {})
+        self.voice = voice
+        self.rate = rate
+        self.volume = volume
+        self.fallback_voice = fallback_voice if fallback_voice != voice else None
+        self.timeout = float(client_config.get('timeout', 30))
+        self.timeout_per_char = float(client_config.get('timeout_per_char', 0.05))
+        self.retries = int(client_config.get('retries', 3))
+        self.backoff_base = float(client_config.get('backoff_base', 1.0))
+        self.backoff_max = float(client_config.get('backoff_max', 20))
+        self.hedge_quantile = float(client_config.get('hedge_quantile', 0.95))
+        self.hedge_min_samples = int(client_config.get('hedge_min_samples', 20))
+        self.hedge_min_delay = float(client_config.get('hedge_min_delay', 1.0))
+        # 備援請求數不超過請求總數的此比例；VariantSynthesizer 會讓所有變體共用同一份預算
+        self.budget = HedgeBudget(float(client_config.get('hedge_budget', 0.1)))
+        self.breaker_failures = int(client_config.get('breaker_failures', 3))
+        self.breaker_reset = float(client_config.get('breaker_reset', 120))
+        self.stats = stats_for(client_config.get('stats_file', DEFAULT_STATS_FILE))
+        # 要求逐字的 WordBoundary 事件（字幕與章節用），否則為 edge_tts 預設的 SentenceBoundary
+        self.word_boundaries = (config or {}).get('tts', {}).get('marks', {}).get('enabled', False)
+
+    @classmethod
+    def from_config(cls, config, voice=None, rate=None, volume=None):
+        from variants import default_fallback_voice
+        tts_config = config.get('tts', {})
+        return cls(voice or tts_config.get('voice', 'zh-TW-HsiaoYuNeural'), rate or tts_config.get('rate', '+0%'),
+                   volume or tts_config.get('volume', '+0%'), config, default_fallback_voice(config))
+
+    @property
+    def voices(self):
+        """依序嘗試的語音：主語音，以及設定了的備用語音"""
+        return [self.voice] + ([self.fallback_voice] if self.fallback_voice else [])
+
+    def deadline(self, text):
+        return self.timeout + self.timeout_per_char * len(text)
+
+    def hedge_delay(self):
+        """樣本足夠時以首位元組延遲的 p95 作為發出備援請求的門檻，否則不備援"""
+        if len(self.stats.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.stats.quantile(self.hedge_quantile))
+
+    def communicate(self, text, voice):
+        return Communicate(text=text, voice=voice, rate=self.rate, volume=self.volume,
+                           boundary='WordBoundary' if self.word_boundaries else 'SentenceBoundary',
+                           receive_timeout=int(self.timeout))
+
+    async def _attempt(self, text, voice, first_byte):
+        """單次請求，回傳 (MP3 位元組, 邊界事件)"""
+        started = time.perf_counter()
+        chunks = []
+        boundaries = []
+        async for chunk in self.communicate(text, voice).stream():
+            if chunk['type'] != 'audio':
+                if self.word_boundaries and chunk['type'] == 'WordBoundary':
+                    boundaries.append(chunk)
+                continue
+            if not chunks:
+                self.stats.add(time.perf_counter() - started)
+                first_byte.set()
+            chunks.append(chunk['data'])
+        if not chunks:
+            raise RuntimeError("未收到音訊")
+        return b''.join(chunks), boundaries
+
+    async def _hedged(self, text, voice):
+        """發出主要請求；首位元組逾時且預算允許時再發一個相同請求，取先成功者"""
+        primary_first = asyncio.Event()
+        tasks = [asyncio.ensure_future(self._attempt(text, voice, primary_first))]
+        self.budget.requests += 1
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                waiter = asyncio.ensure_future(primary_first.wait())
+                await asyncio.wait([tasks[0], waiter], timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not tasks[0].done() and not primary_first.is_set() and self.budget.allow():
+                    self.budget.hedges += 1
+                    count('tts_hedge')
+                    tasks.append(asyncio.ensure_future(self._attempt(text, voice, asyncio.Event())))
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            count('tts_hedge_won')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, request, text, voice):
+        """以期限、重試與斷路器執行 request(voice)，全部失敗時拋出最後的例外"""
+        breaker = breaker_for(voice, self.breaker_failures, self.breaker_reset)
+        error = None
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise BreakerOpen(f"語音 {voice} 暫停使用（連續失敗 {breaker.failures} 次）")
+            try:
+                result = await asyncio.wait_for(request(voice), timeout=self.deadline(text))
+                breaker.success()
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                breaker.failure()
+                if attempt == self.retries:
+                    break
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                count('tts_retry')
+                message = "逾時" if isinstance(e, asyncio.TimeoutError) else str(e)
+                log_message(f"TTS 請求失敗（{voice}，第 {attempt + 1} 次）: {message}，{delay:.1f}s 後重試", "WARNING")
+                await asyncio.sleep(delay)
+        raise error
+
+    async def with_fallback(self, request, text):
+        """先用主語音，斷路或重試用盡時改用備用語音，回傳 (結果, 實際使用的語音)"""
+        voices = self.voices
+        error = None
+        for voice in voices:
+            try:
+                return await self.call(request, text, voice), voice
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                if voice != voices[-1]:
+                    count('tts_fallback')
+                    log_message(f"語音 {voice} 無法使用: {str(e)}，改用 {voices[-1]}", "WARNING")
+        raise error
+
+    async def synthesize(self, text, voice=None):
+        """合成文字，回傳 (MP3 位元組, WordBoundary 事件, 實際使用的語音)；指定 voice 時只用該語音，不改用備用語音"""
+        if voice is not None:
+            data, boundaries = await self.call(lambda v: self._hedged(text, v), text, voice)
+            return data, boundaries, voice
+        (data, boundaries), voice = await self.with_fallback(lambda voice: self._hedged(text, voice), text)
+        return data, boundaries, voice
+
+    def save_stats(self):
+        try:
+            self.stats.save()
+        except OSError as e:
+            log_message(f"寫入 TTS 延遲統計失敗: {str(e)}", "WARNING")
@@ -1,18 +1,72 @@
 # scripts/upload_to_b2.py
 import os
 import sys
-from b2sdk.v2 import InMemoryAccountInfo, B2Api
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from b2sdk.v2 import InMemoryAccountInfo, B2Api, B2HttpApiConfig, RawSimulator
 from datetime import datetime
 from utils import load_config, get_date_string, ensure_directory, get_taiwan_time, log_message
+from instrumentation import span, count
+from artifact_store import ArtifactStore, B2_BASE
+from variants import load_variants
+
+FILES_TO_UPLOAD = ['morning.mp3', 'evening.mp3', 'morning.txt', 'evening.txt']
+# 其他語音變體只上傳音檔（文字稿相同）
+VARIANT_SESSIONS = ['morning', 'evening']
+
+def sha1_of_file(path, block_size=1024 * 1024):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def remote_sha1(file_version):
+    """取得遠端檔案的 SHA-1；大檔案的 content_sha1 為 none，改讀 large_file_sha1"""
+    sha1 = file_version.content_sha1 or ''
+    if sha1.startswith('unverified:'):
+        sha1 = sha1[len('unverified:'):]
+    if not sha1 or sha1 == 'none':
+        sha1 = (file_version.file_info or {}).get('large_file_sha1', '')
+    return sha1
+
+def create_simulator_bucket(bucket_name):
+    """建立 b2sdk 內建 RawSimulator 的本機替身桶，供離線測試使用"""
+    b2_api = B2Api(InMemoryAccountInfo(), api_config=B2HttpApiConfig(_raw_api_class=RawSimulator))
+    key_id, application_key = b2_api.session.raw_api.create_account()
+    b2_api.authorize_account("production", key_id, application_key)
+    return b2_api.create_bucket(bucket_name, 'allPublic')
 
 class B2Uploader:
-    def __init__(self):
-        self.config = load_config()
-        self.key_id = os.environ.get('B2_KEY_ID', self.config['b2'].get('account_id', ''))
-        self.application_key = os.environ.get('B2_APPLICATION_KEY', self.config['b2'].get('application_key', ''))
-        self.bucket_name = os.environ.get('B2_BUCKET_NAME', self.config['b2'].get('bucket_name', ''))
-        self.bucket_url = os.environ.get('B2_BUCKET_URL', self.config['b2'].get('bucket_url', ''))
-        self.folder_prefix = os.environ.get('B2_FOLDER_PREFIX', self.config['b2'].get('folder_prefix', ''))
+    def __init__(self, date_str=None, bucket=None, config=None):
+        self.config = config or load_config()
+        self.date_str = date_str or get_date_string()
+        b2_config = self.config['b2']
+        self.key_id = os.environ.get('B2_KEY_ID', b2_config.get('account_id', ''))
+        self.application_key = os.environ.get('B2_APPLICATION_KEY', b2_config.get('application_key', ''))
+        self.bucket_name = os.environ.get('B2_BUCKET_NAME', b2_config.get('bucket_name', ''))
+        self.bucket_url = os.environ.get('B2_BUCKET_URL', b2_config.get('bucket_url', ''))
+        self.folder_prefix = os.environ.get('B2_FOLDER_PREFIX', b2_config.get('folder_prefix', ''))
+        self.workers = max(1, int(os.environ.get('B2_UPLOAD_WORKERS', b2_config.get('upload_workers', 4))))
+        self.simulator = os.environ.get('B2_SIMULATOR', '0') == '1' or b2_config.get('simulator', False)
+        self.bytes_uploaded = 0
+        self.bytes_saved = 0
+        # upload_file 於執行緒池（及 pipeline 的 to_thread）中並行執行，計數需加鎖
+        self._stats_lock = threading.Lock()
+        self.artifacts = ArtifactStore(self.config)
+        self.variants = load_variants(self.config)
+
+        if bucket is not None:
+            # 由呼叫端傳入已認證的桶（共用連線或本機替身）
+            self.bucket = bucket
+            return
+
+        if self.simulator:
+            self.bucket_name = self.bucket_name or 'daily-light'
+            self.bucket = create_simulator_bucket(self.bucket_name)
+            log_message(f"使用本機 B2 替身，桶: {self.bucket_name}")
+            return
 
         # 記錄獲取的認證信息（敏感信息屏蔽）
         log_message(f"B2_KEY_ID: {'*' * len(self.key_id) if self.key_id else '缺失'}")
@@ -35,47 +89,100 @@ class B2Uploader:
             log_message(f"B2 認證失敗: {str(e)}，請檢查 B2_KEY_ID 和 B2_APPLICATION_KEY", "ERROR")
             sys.exit(1)
 
-        self.podcast_dir = os.path.join('docs', 'podcast', get_date_string())
-        if not os.path.exists(self.podcast_dir):
-            log_message(f"目錄 {self.podcast_dir} 不存在，跳過上傳", "WARNING")
-            sys.exit(0)
+    def remote_prefix(self, date_str, variant=None):
+        """遠端目錄：folder_prefix/[變體前綴/]日期"""
+        variant_prefix = variant.b2_prefix if variant else ''
+        return '/'.join(p.strip('/') for p in (self.folder_prefix, variant_prefix, date_str) if p.strip('/'))
+
+    def list_remote(self, date_str, variant=None):
+        """以單次列舉取得該日期前綴下所有遠端檔案的 SHA-1 與大小"""
+        remote_files = {}
+        try:
+            for file_version, _ in self.bucket.ls(self.remote_prefix(date_str, variant), recursive=True):
+                remote_files[file_version.file_name] = (remote_sha1(file_version), file_version.size)
+        except Exception as e:
+            log_message(f"列舉遠端文件失敗，將全部上傳: {str(e)}", "WARNING")
+        return remote_files
 
-    def upload_file(self, file_path, file_name):
-        """上傳單個文件到 B2"""
+    def upload_file(self, file_path, file_name, date_str=None, remote_files=None, variant=None):
+        """上傳單個文件到 B2（file_path 相對於 docs/podcast/日期，遠端放在變體前綴下）；
+        遠端已有相同 SHA-1 與大小時跳過，回傳 'uploaded'、'skipped' 或 False"""
+        date_str = date_str or self.date_str
         try:
-            full_path = os.path.join(self.podcast_dir, file_path)
+            full_path = os.path.join('docs', 'podcast', date_str, file_path)
             if not os.path.exists(full_path):
                 log_message(f"文件 {full_path} 不存在，跳過上傳", "WARNING")
                 return False
 
-            remote_path = os.path.join(self.folder_prefix, get_date_string(), file_name).replace('\\', '/')
-            self.bucket.upload_local_file(
-                local_file=full_path,
-                file_name=remote_path,
-                file_infos={'source': 'podcast_generator'}
-            )
+            remote_path = f"{self.remote_prefix(date_str, variant)}/{file_name}"
+            size = os.path.getsize(full_path)
+            sha1 = sha1_of_file(full_path)
+            if remote_files and remote_files.get(remote_path) == (sha1, size):
+                with self._stats_lock:
+                    self.bytes_saved += size
+                count('b2_upload', result='skipped')
+                log_message(f"遠端內容相同，跳過上傳: {remote_path}")
+                self.record_artifact(date_str, file_path, variant, sha1, size)
+                return 'skipped'
+
+            with span('b2.upload', kind=os.path.splitext(file_name)[1].lstrip('.')) as upload_span:
+                self.bucket.upload_local_file(
+                    local_file=full_path,
+                    file_name=remote_path,
+                    file_info={'source': 'podcast_generator'},
+                    sha1_sum=sha1
+                )
+                upload_span.set(bytes=size, date=date_str)
+            with self._stats_lock:
+                self.bytes_uploaded += size
             log_message(f"文件已上傳: {remote_path}")
-            return True
+            self.record_artifact(date_str, file_path, variant, sha1, size)
+            return 'uploaded'
         except Exception as e:
             log_message(f"文件 {file_path} 上傳失敗: {str(e)}", "ERROR")
             return False
 
-    def run(self):
-        """主運行邏輯"""
+    def public_url(self, remote_path):
+        return f"{(self.bucket_url or B2_BASE).rstrip('/')}/{remote_path}"
+
+    def record_artifact(self, date_str, file_path, variant=None, sha1=None, size=None):
+        """音檔存放區模式下，將已在 B2 上的音檔登錄至清單（文字稿仍提交至儲存庫）；
+        清單鍵為 日期/相對路徑，例如 0808/tw/morning.mp3"""
+        if not self.artifacts.enabled or not file_path.endswith('.mp3'):
+            return None
+        full_path = os.path.join('docs', 'podcast', date_str, file_path)
+        remote_path = f"{self.remote_prefix(date_str, variant)}/{os.path.basename(file_path)}"
+        return self.artifacts.record(date_str, file_path, full_path, self.public_url(remote_path), sha1, size)
+
+    def upload_variant(self, date_str, variant):
+        """上傳非預設變體的晨、晚音檔至其 B2 前綴"""
+        remote_files = self.list_remote(date_str, variant)
+        return [self.upload_file(variant.audio_name(session), f'{session}.mp3', date_str, remote_files, variant)
+                for session in VARIANT_SESSIONS]
+
+    def run(self, date_str=None):
+        """主運行邏輯：以執行緒池並行上傳，目錄不存在時回傳 None"""
+        date_str = date_str or self.date_str
         try:
-            log_message("開始上傳到 B2...")
-            files_to_upload = [
-                ('morning.mp3', 'morning.mp3'),
-                ('evening.mp3', 'evening.mp3'),
-                ('morning.txt', 'morning.txt'),
-                ('evening.txt', 'evening.txt')
-            ]
-
-            success = False
-            for file_path, file_name in files_to_upload:
-                if self.upload_file(file_path, file_name):
-                    success = True
-
+            podcast_dir = os.path.join('docs', 'podcast', date_str)
+            if not os.path.exists(podcast_dir):
+                log_message(f"目錄 {podcast_dir} 不存在，跳過上傳", "WARNING")
+                return None
+
+            log_message(f"開始上傳到 B2（{date_str}，{self.workers} 個執行緒）...")
+            remote_files = self.list_remote(date_str)
+            saved_before = self.bytes_saved
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(
+                    lambda name: self.upload_file(name, name, date_str, remote_files), FILES_TO_UPLOAD))
+                for variant_results in executor.map(lambda v: self.upload_variant(date_str, v),
+                                                    [v for v in self.variants if not v.primary]):
+                    results += variant_results
+
+            uploaded = results.count('uploaded')
+            skipped = results.count('skipped')
+            log_message(f"上傳 {uploaded} 個、跳過 {skipped} 個未變更文件，節省 {(self.bytes_saved - saved_before) / 1024:.1f} KB")
+            success = uploaded + skipped > 0
             if success:
                 log_message("B2 上傳至少一個文件成功")
             else:
@@ -93,7 +200,9 @@ def main():
         uploader = B2Uploader()
         success = uploader.run()
 
-        if success:
+        if success is None:
+            sys.exit(0)
+        elif success:
             log_message("上傳到 B2 完成")
             sys.exit(0)
         else:
@@ -2,7 +2,7 @@
 import os
 import re
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 
 def load_config():
@@ -10,15 +10,46 @@ def load_config():
     with open(config_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+# 時區物件只建立一次，log_message 每次呼叫都會用到
+TAIWAN_TZ = pytz.timezone('Asia/Taipei')
+
 def get_taiwan_time():
-    tz = pytz.timezone('Asia/Taipei')
-    return datetime.now(tz)
+    return datetime.now(TAIWAN_TZ)
 
 def get_date_string(date_obj=None):
     if not date_obj:
         date_obj = get_taiwan_time()
     return date_obj.strftime('%m%d')
 
+def date_range(start_mmdd, end_mmdd):
+    """回傳 start 到 end（含）的 MMDD 清單，end 早於 start 時視為跨年"""
+    year = get_taiwan_time().year
+    start = datetime.strptime(f"{year}{start_mmdd}", '%Y%m%d')
+    end = datetime.strptime(f"{year}{end_mmdd}", '%Y%m%d')
+    if end < start:
+        end = end.replace(year=year + 1)
+    dates = []
+    while start <= end:
+        dates.append(get_date_string(start))
+        start += timedelta(days=1)
+    return dates
+
+def parse_date_args(date_from=None, date_to=None, dates=None):
+    """整合 --from/--to 與 --dates 參數為去重後的 MMDD 清單，皆未指定時回傳今日"""
+    result = []
+    if date_from or date_to:
+        result.extend(date_range(date_from or date_to, date_to or date_from))
+    if dates:
+        for item in re.split(r'[,\s]+', dates.strip()):
+            if not item:
+                continue
+            if not re.fullmatch(r'\d{4}', item) or not validate_date_string(f"{item[:2]}-{item[2:]}"):
+                raise ValueError(f"無效日期: {item}")
+            result.append(item)
+    if not result:
+        result.append(get_date_string())
+    return list(dict.fromkeys(result))
+
 def ensure_directory(path):
     os.makedirs(path, exist_ok=True)
 
@@ -0,0 +1,78 @@
+# scripts/variants.py
+import os
+
+DEFAULT_VARIANT = 'default'
+DEFAULT_FEED = os.path.join('docs', 'rss', 'podcast_light.xml')
+DEFAULT_EPISODE_MANIFEST = os.path.join('docs', 'rss', 'episodes.json')
+
+class Variant:
+    """一組語音設定（voice／rate／volume）及其輸出位置；名為 default 的變體沿用原本的路徑、B2 前綴與 Feed，
+    其他變體的音檔放在 docs/podcast/MMDD/<name>/，集數清單為 docs/rss/episodes_<name>.json。
+    fallback_voice 為主語音無法使用時整集改用的語音；None 表示不改用其他語音（該集合成失敗，下次重試）"""
+
+    def __init__(self, name, voice, rate='+0%', volume='+0%', b2_prefix='', feed=None, title=None,
+                 fallback_voice=None):
+        self.name = name
+        self.voice = voice
+        self.rate = rate
+        self.volume = volume
+        self.b2_prefix = b2_prefix.strip('/')
+        self.feed = feed or (DEFAULT_FEED if name == DEFAULT_VARIANT else os.path.join('docs', 'rss', f'podcast_{name}.xml'))
+        self.title = title
+        self.fallback_voice = fallback_voice if fallback_voice != voice else None
+
+    @property
+    def primary(self):
+        return self.name == DEFAULT_VARIANT
+
+    @property
+    def episode_manifest(self):
+        return DEFAULT_EPISODE_MANIFEST if self.primary else os.path.join('docs', 'rss', f'episodes_{self.name}.json')
+
+    def audio_name(self, session):
+        """音檔相對於 docs/podcast/MMDD 的路徑"""
+        return f'{session}.mp3' if self.primary else f'{self.name}/{session}.mp3'
+
+    def audio_dir(self, date_str):
+        base = os.path.join('docs', 'podcast', date_str)
+        return base if self.primary else os.path.join(base, self.name)
+
+    def __repr__(self):
+        return f"Variant({self.name}, {self.voice}, {self.rate})"
+
+def default_fallback_voice(config):
+    """tts.client.fallback_voice（環境變量 TTS_FALLBACK_VOICE 優先），只套用於 default 變體"""
+    client_config = config.get('tts', {}).get('client', {})
+    return os.environ.get('TTS_FALLBACK_VOICE', client_config.get('fallback_voice') or '') or None
+
+def default_variant(config):
+    """未設定 variants 時，由 tts 區塊（環境變量 TTS_VOICE 優先）組成單一變體"""
+    tts_config = config.get('tts', {})
+    return Variant(DEFAULT_VARIANT,
+                   os.environ.get('TTS_VOICE', tts_config.get('voice', 'zh-TW-HsiaoYuNeural')),
+                   tts_config.get('rate', '+10%'), tts_config.get('volume', '+10%'),
+                   fallback_voice=default_fallback_voice(config))
+
+def load_variants(config):
+    """讀取 config 的 variants 矩陣（略過 enabled 為 false 者）；環境變量 TTS_VARIANTS 可指定要執行的名稱"""
+    entries = config.get('variants')
+    if not entries:
+        return [default_variant(config)]
+    tts_config = config.get('tts', {})
+    selected = {n.strip() for n in os.environ.get('TTS_VARIANTS', '').split(',') if n.strip()}
+    variants = []
+    for entry in entries:
+        if selected and entry['name'] not in selected:
+            continue
+        if not selected and not entry.get('enabled', True):
+            continue
+        voice = entry.get('voice', tts_config.get('voice', 'zh-TW-HsiaoYuNeural'))
+        # 其他變體的 Feed 標明朗讀者，只在自己的設定有 fallback_voice 時才改用其他語音
+        fallback_voice = entry.get('fallback_voice')
+        if entry['name'] == DEFAULT_VARIANT:
+            voice = os.environ.get('TTS_VOICE', voice)
+            fallback_voice = entry.get('fallback_voice', default_fallback_voice(config))
+        variants.append(Variant(entry['name'], voice, entry.get('rate', tts_config.get('rate', '+10%')),
+                                entry.get('volume', tts_config.get('volume', '+10%')), entry.get('b2_prefix', ''),
+                                entry.get('feed'), entry.get('title'), fallback_voice))
+    return variants or [default_variant(config)]
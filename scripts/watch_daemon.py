@@ -0,0 +1,308 @@
+# scripts/watch_daemon.py
+import os
+import re
+import sys
+import time
+import errno
+import struct
+import signal
+import asyncio
+import argparse
+import ctypes
+import ctypes.util
+from utils import load_config, log_message
+from instrumentation import span, get_recorder
+
+IMG_DIR = os.path.join('docs', 'img')
+# docs/img 下的校正稿或頁面影像：MMDD.txt、MMDD.jpg（或 YYYYMMDD）
+DRAFT_PATTERN = re.compile(r'^(\d{4}(?:\d{4})?)\.(txt|jpe?g|png)$', re.IGNORECASE)
+DEFAULT_DEBOUNCE_SECONDS = 5.0
+DEFAULT_MAX_WAIT_SECONDS = 60.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def date_from_name(name):
+    match = DRAFT_PATTERN.match(name)
+    return match.group(1) if match else None
+
+class InotifyWatcher:
+    """以 ctypes 呼叫 inotify 監看目錄內寫入完成（IN_CLOSE_WRITE）與移入（IN_MOVED_TO）的檔案"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "此平台不支援 inotify")
+        self.directory = directory
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失敗")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"無法監看 {directory}")
+
+    def read_names(self):
+        """讀出目前累積的事件，回傳檔名清單；事件佇列溢位時回傳 None（呼叫端需全目錄重掃）"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names = []
+        position = 0
+        while position + INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = INOTIFY_EVENT.unpack_from(data, position)
+            position += INOTIFY_EVENT.size
+            name = data[position:position + length].rstrip(b'\0')
+            position += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def start(self, loop, callback):
+        loop.add_reader(self.fd, lambda: callback(self.read_names()))
+
+    def close(self, loop):
+        loop.remove_reader(self.fd)
+        os.close(self.fd)
+
+class PollingWatcher:
+    """無 inotify 時（非 Linux 或超過監看上限）定期比對目錄內檔案的 mtime 與大小"""
+
+    def __init__(self, directory, interval=DEFAULT_POLL_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.snapshot = self.scan()
+        self._task = None
+
+    def scan(self):
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    async def _poll(self, callback):
+        while True:
+            await asyncio.sleep(self.interval)
+            current = self.scan()
+            changed = [name for name, info in current.items() if self.snapshot.get(name) != info]
+            self.snapshot = current
+            if changed:
+                callback(changed)
+
+    def start(self, loop, callback):
+        self._task = loop.create_task(self._poll(callback))
+
+    def close(self, loop):
+        if self._task:
+            self._task.cancel()
+
+class WatchDaemon:
+    """常駐監看 docs/img：新的校正稿或影像於一段靜止時間（debounce）後，只對受影響的日期執行 Pipeline；
+    B2 連線、OCR 引擎與後製器跨批次保留，處理完成後可執行發布指令（例如 git commit／push）"""
+
+    def __init__(self, config=None, img_dir=IMG_DIR, skip=(), debounce=None, max_wait=None,
+                 poll=False, publish_command=None):
+        self.config = config or load_config()
+        watch_config = self.config.get('watch', {})
+        self.img_dir = img_dir
+        self.skip = skip
+        self.debounce = float(debounce if debounce is not None
+                              else watch_config.get('debounce_seconds', DEFAULT_DEBOUNCE_SECONDS))
+        # 持續有新檔案時最多延後這麼久就開始處理
+        self.max_wait = float(max_wait if max_wait is not None
+                              else watch_config.get('max_wait_seconds', DEFAULT_MAX_WAIT_SECONDS))
+        self.poll_interval = float(watch_config.get('poll_interval', DEFAULT_POLL_INTERVAL))
+        self.poll = poll
+        self.publish_command = (publish_command if publish_command is not None
+                                else os.environ.get('WATCH_PUBLISH_COMMAND', watch_config.get('publish_command', '')))
+        self.shared = {}
+        self.queue = None
+        self.pending = {}  # 日期 -> 第一次偵測到的時間
+        self.batches = 0
+        self._last_event = None
+        self._wake = None
+        self._stop = None
+
+    def on_names(self, names):
+        if names is None:
+            log_message("inotify 事件佇列溢位，重新掃描目錄", "WARNING")
+            names = os.listdir(self.img_dir)
+        now = time.monotonic()
+        dates = {date_from_name(name) for name in names} - {None}
+        for date_str in dates:
+            self.pending.setdefault(date_str, now)
+        if dates:
+            self._last_event = now
+            log_message(f"偵測到 {', '.join(sorted(dates))} 的新檔案，{self.debounce:.0f}s 內無新檔案即開始處理")
+            self._wake.set()
+
+    def catch_up(self):
+        """啟動時排入影像或校正稿比文字稿新的日期（補處理停機期間上傳的檔案）"""
+        for name in os.listdir(self.img_dir):
+            date_str = date_from_name(name)
+            if not date_str:
+                continue
+            output = os.path.join('docs', 'podcast', date_str, 'morning.txt')
+            if not os.path.exists(output) or os.path.getmtime(output) < os.path.getmtime(os.path.join(self.img_dir, name)):
+                self.pending.setdefault(date_str, time.monotonic())
+        if self.pending:
+            self._last_event = time.monotonic()
+            self._wake.set()
+
+    def start_watcher(self, loop):
+        if not self.poll:
+            try:
+                watcher = InotifyWatcher(self.img_dir)
+                watcher.start(loop, self.on_names)
+                log_message(f"以 inotify 監看 {self.img_dir}")
+                return watcher
+            except OSError as e:
+                log_message(f"inotify 無法使用（{str(e)}），改為每 {self.poll_interval:.0f}s 輪詢", "WARNING")
+        watcher = PollingWatcher(self.img_dir, self.poll_interval)
+        watcher.start(loop, self.on_names)
+        log_message(f"以輪詢監看 {self.img_dir}")
+        return watcher
+
+    def warm_up(self):
+        """預先載入各階段的模組與常駐資源，第一批檔案不必承擔冷啟動"""
+        import pipeline  # noqa: F401
+        import text_to_speech_edge  # noqa: F401
+        import generate_rss  # noqa: F401
+        if self.config.get('ocr', {}).get('enabled', True) and 'ocr' not in self.skip:
+            from ocr_engine import OCREngine
+            try:
+                self.shared['ocr_engine'] = OCREngine(config=self.config)
+            except (ImportError, ValueError) as e:
+                log_message(f"OCR 引擎無法載入，僅處理校正稿: {str(e)}", "WARNING")
+
+    async def wait_quiet(self):
+        """等到 debounce 秒內沒有新檔案，或最早的檔案已等待 max_wait 秒"""
+        while not self._stop.is_set():
+            now = time.monotonic()
+            quiet_at = self._last_event + self.debounce
+            deadline = min(self.pending.values()) + self.max_wait
+            if now >= quiet_at or now >= deadline:
+                return
+            await asyncio.sleep(min(quiet_at, deadline) - now)
+
+    async def build_ahead(self, date_str):
+        """未來日期排入建置佇列並只建置（不含 rss），到預定時間由 build_queue.py publish 發布"""
+        from build_queue import BuildQueue
+        if self.queue is None:
+            self.queue = BuildQueue(self.config, shared=self.shared)
+        self.queue.enqueue_date(date_str)
+        _, failed = await self.queue.build(skip=self.skip, dates=[date_str])
+        return failed == 0
+
+    async def process(self, batch):
+        from pipeline import Pipeline
+        from build_queue import is_future
+        failed = []
+        with span('watch.batch') as batch_span:
+            for date_str in sorted(batch):
+                if is_future(date_str, self.config):
+                    ok = await self.build_ahead(date_str)
+                else:
+                    ok = await Pipeline(date_str, skip=self.skip, config=self.config, shared=self.shared).run()
+                if not ok:
+                    failed.append(date_str)
+            published = await self.publish(sorted(set(batch) - set(failed)))
+            latency = time.monotonic() - min(batch.values())
+            batch_span.set(dates=len(batch), failed=len(failed), latency=round(latency, 3))
+            if failed:
+                batch_span.fail(f"{len(failed)} 個日期失敗")
+        self.batches += 1
+        status = "已發布" if published else "未發布"
+        log_message(f"批次完成（{', '.join(sorted(batch))}）：失敗 {len(failed)} 個，{status}，"
+                    f"自偵測到檔案起 {latency:.1f}s")
+        recorder = get_recorder()
+        if recorder.enabled and recorder.owner:
+            # 常駐行程不會結束，每批次更新一次指標檔
+            recorder.write_textfile()
+
+    async def publish(self, dates):
+        if not self.publish_command or not dates:
+            return False
+        env = dict(os.environ, WATCH_DATES=','.join(dates))
+        process = await asyncio.create_subprocess_shell(self.publish_command, env=env)
+        code = await process.wait()
+        if code != 0:
+            log_message(f"發布指令失敗（結束碼 {code}）: {self.publish_command}", "ERROR")
+            return False
+        return True
+
+    async def run(self, catch_up=False):
+        loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+        self.warm_up()
+        watcher = self.start_watcher(loop)
+        if catch_up:
+            self.catch_up()
+        log_message(f"watch 模式啟動：debounce {self.debounce:.0f}s，發布指令 {self.publish_command or '（無）'}")
+        try:
+            while not self._stop.is_set():
+                await self._wake.wait()
+                self._wake.clear()
+                if self._stop.is_set() or not self.pending:
+                    continue
+                await self.wait_quiet()
+                if self._stop.is_set():
+                    break
+                batch, self.pending = self.pending, {}
+                await self.process(batch)
+                if self.pending:
+                    self._wake.set()
+        finally:
+            watcher.close(loop)
+            if self.queue is not None:
+                self.queue.close()
+            engine = self.shared.get('ocr_engine')
+            if engine is not None:
+                engine.close()
+            log_message(f"watch 模式結束，共處理 {self.batches} 批")
+
+    def stop(self):
+        log_message("收到結束信號，處理中的批次完成後結束")
+        self._stop.set()
+        self._wake.set()
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="常駐監看 docs/img，新檔案上傳後立即產生並發布該日節目")
+    parser.add_argument('--debounce', type=float, help="最後一個新檔案後等待的秒數")
+    parser.add_argument('--max-wait', type=float, help="持續有新檔案時最多延後的秒數")
+    parser.add_argument('--poll', action='store_true', help="不使用 inotify，改為輪詢")
+    parser.add_argument('--publish', help="每批次完成後執行的指令（環境變量 WATCH_DATES 為處理的日期）")
+    parser.add_argument('--skip', default='', help="略過的 pipeline 階段，以逗號分隔")
+    parser.add_argument('--catch-up', action='store_true', help="啟動時先處理影像或校正稿比文字稿新的日期")
+    args = parser.parse_args()
+
+    try:
+        daemon = WatchDaemon(skip=[s.strip() for s in args.skip.split(',') if s.strip()], debounce=args.debounce,
+                             max_wait=args.max_wait, poll=args.poll, publish_command=args.publish)
+        asyncio.run(daemon.run(catch_up=args.catch_up))
+        sys.exit(0)
+    except Exception as e:
+        log_message(f"主程序執行失敗: {str(e)}", "ERROR")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()